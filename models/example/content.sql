@@ -8,13 +8,17 @@ WITH transformed_data AS (
         ad.article_content,
         ad.article_content_pos_counts,
         a.article_publishedAt,
-        CAST(JSON_EXTRACT_SCALAR(ad.article_content_pos_counts, '$.NOUN') AS INT64) AS noun_count,
-        CAST(JSON_EXTRACT_SCALAR(ad.article_content_pos_counts, '$.ADJ') AS INT64) AS adj_count,
-        CAST(JSON_EXTRACT_SCALAR(ad.article_content_pos_counts, '$.VERB') AS INT64) AS verb_count,
-        CAST(JSON_EXTRACT_SCALAR(ad.article_content_pos_counts, '$.PROPN') AS INT64) AS propn_count
+        -- NULL when the tag is absent from the text, as JSON_EXTRACT_SCALAR
+        -- returned, so the averages only take the texts with the tag
+        pc.NOUN AS noun_count,
+        pc.ADJ AS adj_count,
+        pc.VERB AS verb_count,
+        pc.PROPN AS propn_count
     FROM {{ source('newsanalytics', 'DimArticleContent') }} AS ad
     LEFT OUTER JOIN {{ source('newsanalytics', 'DimArticle') }} AS a
         ON ad.article_content_id = a.article_content_id
+    LEFT OUTER JOIN {{ source('newsanalytics', 'TextPosCounts') }} AS pc
+        ON ad.article_content_id = pc.text_id
     WHERE EXTRACT(MONTH FROM CAST(a.article_publishedAt AS TIMESTAMP)) = 10
       AND EXTRACT(YEAR FROM CAST(a.article_publishedAt AS TIMESTAMP)) = EXTRACT(YEAR FROM CURRENT_DATE())
       AND CAST(a.article_publishedAt AS TIMESTAMP) <= CURRENT_TIMESTAMP()
@@ -0,0 +1,68 @@
+""" Benchmark of the accumulation of fetched pages into a DataFrame.
+
+The per-page pd.concat used by the fetchers before is compared with the
+ArticleBatchBuilder for an increasing number of pages of 100 articles. The
+time per page stays flat for the builder while it grows for pd.concat.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.batch_builder_benchmark --pages 10 100 1000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from datamanagement.datafetch.news.record_batch import (
+    HISTORICAL_ARTICLE_SCHEMA, ArticleBatchBuilder)
+
+PAGE_SIZE = 100
+
+
+def generate_page(page: int) -> list:
+    """ Generate the rows of a synthetic page of articles
+
+    Arguments:
+        - page: the number of the page
+
+    Returns:
+        - list: tuples in the order of HISTORICAL_ARTICLE_SCHEMA
+    """
+    return [(page * PAGE_SIZE + index, "https://example.com", "Author",
+             f"Title {index}", "Summary " * 20, "https://example.com/image.jpg",
+             "2024-10-18 10:00:00", "Text " * 200, "politics", 0.1)
+            for index in range(PAGE_SIZE)]
+
+
+def accumulate_with_concat(n_pages: int) -> pd.DataFrame:
+    """ Accumulate the pages with one pd.concat per page """
+    columns = list(HISTORICAL_ARTICLE_SCHEMA)
+    df = pd.DataFrame(columns=columns)
+    for page in range(n_pages):
+        df = pd.concat([df, pd.DataFrame(data=generate_page(page), columns=columns)])
+    return df
+
+
+def accumulate_with_builder(n_pages: int) -> pd.DataFrame:
+    """ Accumulate the pages in the column buffers of ArticleBatchBuilder """
+    batch = ArticleBatchBuilder(HISTORICAL_ARTICLE_SCHEMA)
+    for page in range(n_pages):
+        batch.extend(generate_page(page))
+    return batch.to_dataframe()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", type=int, default=[10, 100, 500, 1000])
+    arguments = parser.parse_args()
+
+    print(f"{'pages':>8} {'concat (s)':>12} {'builder (s)':>12} {'ms/page concat':>16} {'ms/page builder':>16}")
+    for n_pages in arguments.pages:
+        timings = []
+        for accumulate in (accumulate_with_concat, accumulate_with_builder):
+            start = time.perf_counter()
+            accumulate(n_pages)
+            timings.append(time.perf_counter() - start)
+        print(f"{n_pages:>8} {timings[0]:>12.3f} {timings[1]:>12.3f} "
+              f"{1000 * timings[0] / n_pages:>16.3f} {1000 * timings[1] / n_pages:>16.3f}")
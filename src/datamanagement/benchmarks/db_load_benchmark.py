@@ -0,0 +1,82 @@
+""" Benchmark of the SQLite load of create_and_insert_to_db.
+
+The row-by-row iterrows insert used before is compared with the chunked
+executemany insert of insert_data, with and without the bulk load pragmas.
+The throughput is reported in rows per second.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.db_load_benchmark --rows 10000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from datamanagement.database.db_load import (
+    apply_bulk_load_pragmas, create_tables, insert_data)
+
+
+def generate_articles(n_rows: int) -> pd.DataFrame:
+    """ Generate a synthetic DimArticleContent table
+
+    Arguments:
+        - n_rows: the number of rows
+
+    Returns:
+        - pd.DataFrame: the article_content_id, article_content and
+          article_content_pos_counts columns
+    """
+    pos_counts = json.dumps({"NOUN": 40, "VERB": 20, "ADJ": 10, "PROPN": 12})
+    return pd.DataFrame({
+        "article_content_id": [f"id-{index}" for index in range(n_rows)],
+        "article_content": ["Text of the article " * 100] * n_rows,
+        "article_content_pos_counts": [pos_counts] * n_rows,
+    })
+
+
+def insert_with_iterrows(cursor, table_name, data_frame, columns):
+    """ The row by row insert used before the bulk load """
+    for _, row in data_frame.iterrows():
+        placeholders = ', '.join(['?'] * len(columns))
+        cursor.execute(f'''
+            INSERT INTO {table_name} ({', '.join(columns)})
+            VALUES ({placeholders})
+        ''', tuple(row[col] for col in columns))
+
+
+def time_load(data_frame: pd.DataFrame, insert, bulk_pragmas: bool) -> float:
+    """ Load the rows into a new database and return the rows per second """
+    columns = list(data_frame.columns)
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, "benchmark.db"))
+        if bulk_pragmas:
+            apply_bulk_load_pragmas(conn)
+        cursor = conn.cursor()
+        create_tables(cursor)
+        start = time.perf_counter()
+        insert(cursor, "DimArticleContent", data_frame, columns)
+        conn.commit()
+        seconds = time.perf_counter() - start
+        conn.close()
+    return data_frame.shape[0] / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    arguments = parser.parse_args()
+
+    articles = generate_articles(arguments.rows)
+    results = {
+        "iterrows": time_load(articles, insert_with_iterrows, bulk_pragmas=False),
+        "executemany": time_load(articles, insert_data, bulk_pragmas=False),
+        "executemany + pragmas": time_load(articles, insert_data, bulk_pragmas=True),
+    }
+    for name, rows_per_second in results.items():
+        print(f"{name:>24}: {rows_per_second:>12,.0f} rows/sec")
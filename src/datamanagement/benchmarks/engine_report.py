@@ -0,0 +1,117 @@
+""" Parity and latency report of the inference engines.
+
+Every model in model_configuration is run with the fp32 pytorch engine and
+with the quantized and onnx engines over the bundled sample CSVs. The report
+gives the label agreement rate against fp32 and the latency and throughput
+of each engine.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.engine_report --output engine_report.json
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from datamanagement.datapreprocessing.data_transforming import classify_texts
+from datamanagement.datapreprocessing.inference_engines import (
+    load_pipeline, split_model_configuration)
+from datamanagement.datapreprocessing.model_config import model_configuration
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+SAMPLE_FILES = ["v1-realtime_data-news-api-2024-10-18.csv",
+                "v1-realtime_data-world-news-api-2024-10-18.csv"]
+
+
+def load_sample_texts(column: str, n_rows: int = None) -> list:
+    """ Load the texts of the column from the bundled sample CSVs
+
+    Arguments:
+        - column: the column holding the texts
+        - n_rows: an optional limit on the number of texts
+
+    Returns:
+        - list: the texts of the sample CSVs
+    """
+    texts = []
+    for file_name in SAMPLE_FILES:
+        df = pd.read_csv(os.path.join(DATA_DIR, file_name))
+        texts.extend(df[column].tolist())
+    return texts[:n_rows] if n_rows else texts
+
+
+def run_engine(value: dict, engine: str, texts: list) -> dict:
+    """ Classify the texts with the engine and measure the time taken
+
+    Arguments:
+        - value: a model_configuration entry
+        - engine: one of the inference engines
+        - texts: a list of texts to classify
+
+    Returns:
+        - dict: the labels, load time, latency per text and throughput
+    """
+    pipeline_arguments, batch_size = split_model_configuration(value)
+    start = time.perf_counter()
+    pipe = load_pipeline(pipeline_arguments, engine)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = classify_texts(pipe, texts, batch_size)
+    seconds = time.perf_counter() - start
+    return {
+        "labels": labels,
+        "load_seconds": load_seconds,
+        "latency_ms": 1000 * seconds / max(len(texts), 1),
+        "texts_per_second": len(texts) / seconds if seconds else float("inf"),
+    }
+
+
+def build_report(column: str, engines: list, n_rows: int = None) -> dict:
+    """ Compare the engines against fp32 for every configured model
+
+    Arguments:
+        - column: the column holding the texts
+        - engines: the engines compared against pytorch
+        - n_rows: an optional limit on the number of texts
+
+    Returns:
+        - dict: the agreement rate and timings keyed on feature and engine
+    """
+    texts = load_sample_texts(column, n_rows)
+    report = {"column": column, "n_texts": len(texts), "models": {}}
+    for key, value in model_configuration.items():
+        reference = run_engine(value, "pytorch", texts)
+        results = {"pytorch": {name: metric for name, metric in reference.items()
+                               if name != "labels"}}
+        for engine in engines:
+            try:
+                result = run_engine(value, engine, texts)
+            except Exception as oops:
+                print(f"Error occurred while running {engine} for {key} as {oops}")
+                continue
+            agreement = sum(label == expected for label, expected
+                            in zip(result.pop("labels"), reference["labels"]))
+            result["agreement_rate"] = agreement / max(len(texts), 1)
+            result["speedup"] = result["texts_per_second"] / reference["texts_per_second"]
+            results[engine] = result
+        report["models"][key] = results
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--column", default="article_title")
+    parser.add_argument("--engines", nargs="+", default=["quantized", "onnx"])
+    parser.add_argument("--n-rows", type=int, default=None)
+    parser.add_argument("--output", default="engine_report.json")
+    arguments = parser.parse_args()
+
+    engine_report = build_report(arguments.column, arguments.engines, arguments.n_rows)
+    with open(arguments.output, "w") as file:
+        json.dump(engine_report, file, indent=2)
+    print(json.dumps(engine_report, indent=2))
@@ -0,0 +1,165 @@
+""" Benchmark of the resident inference server under concurrent jobs.
+
+Several client threads, standing for the realtime, historical and
+reprocessing jobs of a node, send requests of a few texts to an
+InferenceServer at once. The throughput in texts per second and the p50,
+p95 and p99 latency of the requests are reported with micro-batching and
+without it (max_batch_size of 1).
+
+The model is the tiny randomly initialized classifier of the pipeline
+benchmark, so it runs offline. When transformers is not installed the
+simulated model is used instead: its cost is a fixed overhead per batch
+plus a cost per text, which is the shape micro-batching is meant for; its
+numbers only show the behaviour of the batching, not the speed of a model.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.inference_server_benchmark --clients 8 --requests 50
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from datamanagement.benchmarks.pipeline_benchmark import FEATURE_COLUMNS, build_tiny_text_classifier
+from datamanagement.benchmarks.synthetic_corpus import generate_corpus
+from datamanagement.datapreprocessing.inference_server import InferenceClient, InferenceServer
+
+MODELS = ("tiny", "simulated")
+
+
+def simulated_classifier(batch_overhead: float = 0.005, text_cost: float = 0.0005):
+    """ Build a classify function costing a fixed overhead per batch plus a
+    cost per text
+
+    Arguments:
+        - batch_overhead: the seconds of every batch
+        - text_cost: the seconds of every text of a batch
+
+    Returns:
+        - function: a classify(key, texts) labelling the texts by length
+    """
+    def classify(key: str, texts: list) -> list:
+        time.sleep(batch_overhead + text_cost * len(texts))
+        return [f"LABEL_{len(text or '') % 3}" for text in texts]
+    return classify
+
+
+def run_clients(client: InferenceClient, key: str, texts: list, n_clients: int,
+                n_requests: int, request_size: int) -> dict:
+    """ Send requests from concurrent threads and measure their latency
+
+    Arguments:
+        - client: the client shared by the threads
+        - key: the model requested
+        - texts: the texts the requests are drawn from
+        - n_clients: the number of concurrent threads
+        - n_requests: the number of requests of every thread
+        - request_size: the number of texts of every request
+
+    Returns:
+        - dict: the throughput and latency percentiles
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def send(thread_number: int):
+        thread_latencies = []
+        for number in range(n_requests):
+            offset = (thread_number * n_requests + number) * request_size % len(texts)
+            request = texts[offset:offset + request_size]
+            start = time.perf_counter()
+            client.classify(key, request)
+            thread_latencies.append(time.perf_counter() - start)
+        client.close()
+        with lock:
+            latencies.extend(thread_latencies)
+
+    threads = [threading.Thread(target=send, args=(number,)) for number in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    n_texts = n_clients * n_requests * request_size
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"texts": n_texts, "seconds": round(seconds, 3),
+            "texts_per_second": round(n_texts / seconds, 1),
+            "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2)}
+
+
+def run_benchmark(model: str = "tiny", n_clients: int = 8, n_requests: int = 50,
+                  request_size: int = 4, max_batch_size: int = 64,
+                  max_latency_ms: float = 10) -> list:
+    """ Benchmark the server with and without micro-batching
+
+    Arguments:
+        - model: "tiny" or "simulated"
+        - n_clients: the number of concurrent threads
+        - n_requests: the number of requests of every thread
+        - request_size: the number of texts of every request
+        - max_batch_size: the micro-batch size of the batched server
+        - max_latency_ms: the latency window of the batched server
+
+    Returns:
+        - list: the measures of every configuration
+    """
+    corpus = generate_corpus(max(2000, n_clients * n_requests * request_size), seed=0)
+    texts = corpus[FEATURE_COLUMNS[0]].fillna("").tolist()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        classify = None
+        configuration = {"simulated": {}}
+        if model == "tiny":
+            try:
+                configuration = build_tiny_text_classifier(directory, texts[:10000])
+            except ImportError as oops:
+                print(f"The tiny model needs transformers ({oops}), the simulated model is used")
+                model = "simulated"
+        if model == "simulated":
+            classify = simulated_classifier()
+        key = next(iter(configuration))
+
+        for name, batch_size, latency_ms in [("unbatched", 1, 0),
+                                             ("micro-batched", max_batch_size, max_latency_ms)]:
+            server = InferenceServer(configuration, max_batch_size=batch_size,
+                                     max_latency_ms=latency_ms, classify=classify)
+            host, port = server.start_in_thread()
+            try:
+                measures = run_clients(InferenceClient(host=host, port=port), key, texts,
+                                       n_clients, n_requests, request_size)
+            finally:
+                server.stop()
+            measures.update({"model": model, "configuration": name, "clients": n_clients,
+                             "request_size": request_size,
+                             "mean_batch_size": round(server.statistics()[key]["mean_batch_size"], 1)})
+            print(f"{name:>14} {measures['texts_per_second']:>10,.0f} texts/s "
+                  f"p50 {measures['p50_ms']:>8.2f} ms  p95 {measures['p95_ms']:>8.2f} ms  "
+                  f"p99 {measures['p99_ms']:>8.2f} ms  mean batch {measures['mean_batch_size']}")
+            results.append(measures)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=MODELS, default="tiny")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--request-size", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-latency-ms", type=float, default=10)
+    parser.add_argument("--output", help="an optional JSON file of the results")
+    arguments = parser.parse_args()
+
+    results = run_benchmark(arguments.model, arguments.clients, arguments.requests,
+                            arguments.request_size, arguments.max_batch_size,
+                            arguments.max_latency_ms)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
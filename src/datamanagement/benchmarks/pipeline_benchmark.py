@@ -0,0 +1,289 @@
+""" Benchmark suite of every stage of the pipeline on synthetic corpora.
+
+For every corpus size the stages are timed one after the other on a
+synthetic corpus drawn from the bundled samples:
+
+    - fetch: WorldNewsAPI.retrieve_historical_data against a local stub
+    - clean: clean_historical_news
+    - deduplicate: assign_duplicate_clusters
+    - model_features: create_features_from_pretrained_models with a tiny
+      randomly initialized classifier built locally, so it runs offline
+    - part_of_speech: retrieve_counts_on_part_of_speech with en_core_web_sm,
+      or a blank english spacy pipeline when it is not installed
+    - load: create_and_insert_to_db into a temporary SQLite database
+    - export: export_sqlite of that database into Parquet files
+
+The throughput in rows per second and the peak resident memory of every
+stage are written to a JSON file. A stage whose dependencies are missing is
+reported as skipped. Two result files can be compared, the stages slower or
+heavier than the baseline beyond the tolerance are flagged and the exit code
+is 1.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.pipeline_benchmark --rows 1000 10000 --output current.json
+    python -m datamanagement.benchmarks.pipeline_benchmark --compare baseline.json current.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from datamanagement.benchmarks.stub_news_server import StubNewsServer
+from datamanagement.benchmarks.synthetic_corpus import CorpusProfile, generate_corpus
+from datamanagement.database.db_load import UPOS_TAGS, create_and_insert_to_db
+from datamanagement.datafetch.news.WorldNewsApi import WorldNewsAPI
+from datamanagement.datapreprocessing.data_cleaning import clean_historical_news
+from datamanagement.datapreprocessing.deduplication import assign_duplicate_clusters
+from datamanagement.datawarehouse.data_load import ParquetSink, export_sqlite
+from datamanagement.instrumentation import PeakRssSampler
+
+STAGES = ["fetch", "clean", "deduplicate", "model_features", "part_of_speech", "load", "export"]
+TEXT_COLUMNS = ["article_content", "article_description", "article_title"]
+FEATURE_COLUMNS = ["article_description", "article_title"]
+
+
+def time_stage(stage: str, n_rows: int, function) -> tuple:
+    """ Run a stage and measure its time and memory
+
+    Arguments:
+        - stage: the name of the stage
+        - n_rows: the number of rows given to the stage
+        - function: the stage, called without arguments
+
+    Returns:
+        - tuple: (the result of the stage or None, the measures as a dict)
+    """
+    measures = {"stage": stage, "rows": n_rows}
+    try:
+        with PeakRssSampler(interval=0.005) as sampler:
+            start = time.perf_counter()
+            output = function()
+            seconds = time.perf_counter() - start
+    except (ImportError, OSError) as oops:
+        measures["skipped"] = str(oops)
+        print(f"{stage:>16} {n_rows:>10} skipped: {oops}")
+        return None, measures
+    measures.update({
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(n_rows / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(sampler.peak_mb, 1),
+        "rss_increase_mb": round(sampler.peak_mb - sampler.baseline_mb, 1),
+    })
+    print(f"{stage:>16} {n_rows:>10} {seconds:>10.3f} s {measures['rows_per_second']:>14,.0f} rows/s "
+          f"{measures['rss_increase_mb']:>10.1f} MB")
+    return output, measures
+
+
+def build_tiny_text_classifier(directory: str, texts: list) -> dict:
+    """ Build a tiny randomly initialized BERT text classifier on disk
+
+    The labels are meaningless, the model only stands in for the real ones
+    so the inference stage can be timed offline.
+
+    Arguments:
+        - directory: the directory the model and tokenizer are saved to
+        - texts: texts the vocabulary of the tokenizer is taken from
+
+    Returns:
+        - dict: the model_configuration of the tiny classifier
+    """
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    words = sorted({word.lower() for text in texts if isinstance(text, str)
+                    for word in text.split()})[:5000]
+    vocab_path = os.path.join(directory, "vocab.txt")
+    with open(vocab_path, "w") as file:
+        file.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path)
+    config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=64, max_position_embeddings=512,
+                        num_labels=3)
+    BertForSequenceClassification(config).save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+    return {"tiny_classifier": {"task": "text-classification", "model": directory,
+                                "device": -1, "truncation": True, "batch_size": 32}}
+
+
+def synthetic_pos_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """ Add part of speech counts proportional to the length of the texts,
+    for the load when the part of speech stage was skipped """
+    for column in TEXT_COLUMNS:
+        df[f"{column}_pos_counts"] = [
+            {tag: len(str(text).split()) // len(UPOS_TAGS) for tag in UPOS_TAGS}
+            for text in df[column]]
+    return df
+
+
+def run_suite(sizes: list, stages: list = STAGES, seed: int = 0,
+              max_fetch_rows: int = 100000) -> list:
+    """ Run the stages on a synthetic corpus of every size
+
+    Arguments:
+        - sizes: the numbers of rows of the corpora
+        - stages: the stages to run
+        - seed: the seed of the corpora
+        - max_fetch_rows: the number of rows above which the fetch is
+          timed on the first max_fetch_rows rows only
+
+    Returns:
+        - list: the measures of every stage and size
+    """
+    profile = CorpusProfile()
+    results = []
+    for n_rows in sizes:
+        corpus = generate_corpus(n_rows, seed=seed, profile=profile)
+        with tempfile.TemporaryDirectory() as directory:
+            if "fetch" in stages:
+                fetched = corpus.iloc[:max_fetch_rows]
+                with StubNewsServer(fetched) as stub:
+                    news_api = WorldNewsAPI(base_url=stub.url)
+                    _, measures = time_stage("fetch", fetched.shape[0],
+                                             lambda: news_api.retrieve_historical_data())
+                    news_api.fetch_engine.close()
+                results.append(measures)
+
+            data = corpus.copy()
+            if "clean" in stages:
+                cleaned, measures = time_stage("clean", n_rows, lambda: clean_historical_news(data))
+                results.append(measures)
+                data = cleaned if cleaned is not None else data
+            if "deduplicate" in stages:
+                _, measures = time_stage("deduplicate", data.shape[0],
+                                         lambda: assign_duplicate_clusters(data))
+                results.append(measures)
+            if "model_features" in stages:
+                results.append(_time_model_features(data, directory))
+            if "part_of_speech" in stages:
+                results.append(_time_part_of_speech(data))
+            if f"{TEXT_COLUMNS[0]}_pos_counts" not in data:
+                data = synthetic_pos_counts(data)
+
+            db_name = os.path.join(directory, "benchmark")
+            if "load" in stages:
+                _, measures = time_stage("load", data.shape[0], lambda: create_and_insert_to_db(
+                    data, db_name=db_name, bulk_pragmas=True, mode="replace"))
+                results.append(measures)
+            if "export" in stages and os.path.exists(f"{db_name}.db"):
+                sink = ParquetSink(os.path.join(directory, "export"))
+                _, measures = time_stage("export", data.shape[0], lambda: export_sqlite(
+                    f"{db_name}.db", sink, full_refresh=True))
+                results.append(measures)
+    return results
+
+
+def _time_model_features(data: pd.DataFrame, directory: str) -> dict:
+    """ Time the tiny classifier over the feature columns, the model is
+    loaded before the timing starts """
+    try:
+        from datamanagement.datapreprocessing.data_transforming import (
+            create_features_from_pretrained_models)
+        from datamanagement.datapreprocessing.model_registry import ModelRegistry
+        model_directory = os.path.join(directory, "tiny_classifier")
+        os.makedirs(model_directory, exist_ok=True)
+        configuration = build_tiny_text_classifier(
+            model_directory, data[FEATURE_COLUMNS[0]].head(10000).tolist())
+    except ImportError as oops:
+        return time_stage("model_features", data.shape[0], lambda: _raise(oops))[1]
+    registry = ModelRegistry()
+    for key, value in configuration.items():
+        registry.get(key, value)
+    return time_stage("model_features", data.shape[0], lambda: create_features_from_pretrained_models(
+        configuration, data, FEATURE_COLUMNS, registry=registry))[1]
+
+
+def _time_part_of_speech(data: pd.DataFrame) -> dict:
+    """ Time the part of speech counts, the spacy pipeline is loaded before
+    the timing starts """
+    try:
+        import spacy
+        from datamanagement.datapreprocessing.data_transforming import (
+            load_spacy_pipeline, retrieve_counts_on_part_of_speech)
+        try:
+            nlp = load_spacy_pipeline()
+        except OSError:
+            # en_core_web_sm is not installed, the tokenizer alone is timed
+            nlp = spacy.blank("en")
+    except ImportError as oops:
+        return time_stage("part_of_speech", data.shape[0], lambda: _raise(oops))[1]
+    return time_stage("part_of_speech", data.shape[0], lambda: retrieve_counts_on_part_of_speech(
+        data, TEXT_COLUMNS, nlp=nlp))[1]
+
+
+def _raise(error: Exception):
+    raise error
+
+
+def compare_runs(baseline: dict, current: dict, tolerance: float = 0.1,
+                 min_memory_mb: float = 10.0) -> list:
+    """ Compare two result files and return the regressions
+
+    Arguments:
+        - baseline: the results of the reference run
+        - current: the results of the run compared
+        - tolerance: the relative loss of throughput or growth of memory
+          tolerated
+        - min_memory_mb: memory increases below it are noise
+
+    Returns:
+        - list: a message per stage and size which regressed
+    """
+    reference = {(measures["stage"], measures["rows"]): measures
+                 for measures in baseline["results"] if "skipped" not in measures}
+    regressions = []
+    for measures in current["results"]:
+        key = (measures["stage"], measures["rows"])
+        if "skipped" in measures or key not in reference:
+            continue
+        before = reference[key]
+        if measures["rows_per_second"] < before["rows_per_second"] * (1 - tolerance):
+            regressions.append(f"{key[0]} ({key[1]} rows): {before['rows_per_second']:,.0f} -> "
+                               f"{measures['rows_per_second']:,.0f} rows/s")
+        if measures["rss_increase_mb"] > max(before["rss_increase_mb"] * (1 + tolerance),
+                                             before["rss_increase_mb"] + min_memory_mb):
+            regressions.append(f"{key[0]} ({key[1]} rows): {before['rss_increase_mb']:.1f} -> "
+                               f"{measures['rss_increase_mb']:.1f} MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-fetch-rows", type=int, default=100000)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        runs = []
+        for path in arguments.compare:
+            with open(path) as file:
+                runs.append(json.load(file))
+        regressions = compare_runs(*runs, tolerance=arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions beyond {arguments.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    results = run_suite(arguments.rows, arguments.stages, arguments.seed, arguments.max_fetch_rows)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": arguments.seed,
+        "results": results,
+    }
+    with open(arguments.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {arguments.output}")
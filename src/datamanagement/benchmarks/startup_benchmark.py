@@ -0,0 +1,122 @@
+""" Benchmark of the startup time of the entry points of the pipeline.
+
+Every entry point is imported in a fresh interpreter with python -X importtime,
+and the report gives the wall time of the interpreter, the cumulative import
+time of the entry point, its heaviest top-level imports and whether one of
+the heavy optional dependencies (torch, transformers, spacy, the BigQuery
+client) was loaded. The exit code is 1 when an entry point fails to import
+or exceeds the budget.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.startup_benchmark --budget 1.0
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = [
+    "datamanagement.datafetch.news.WorldNewsApi",
+    "datamanagement.datafetch.news.NewsOrgApi",
+    "datamanagement.datapreprocessing.data_cleaning",
+    "datamanagement.datapreprocessing.data_transforming",
+    "datamanagement.database.db_load",
+    "datamanagement.database.queries",
+    "datamanagement.datawarehouse.data_load",
+    "datamanagement.staging",
+    "datamanagement.pipeline.stages",
+]
+
+HEAVY_MODULES = ["torch", "transformers", "spacy", "google.cloud.bigquery", "optimum"]
+
+
+def parse_importtime(output: str) -> dict:
+    """ Parse the -X importtime lines into the cumulative time per module
+
+    Arguments:
+        - output: the stderr of python -X importtime
+
+    Returns:
+        - dict: (cumulative microseconds, nesting level) per module
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(cumulative), level)
+    return modules
+
+
+def measure_entry_point(module: str, repeat: int = 3, top: int = 5) -> dict:
+    """ Import the module in fresh interpreters and measure the startup
+
+    Arguments:
+        - module: the module to import
+        - repeat: the number of interpreters started, the fastest is kept
+        - top: the number of heaviest imports reported
+
+    Returns:
+        - dict: the wall and import seconds, heaviest imports and heavy
+          dependencies loaded
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   capture_output=True, text=True)
+        wall_seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1]
+            return {"module": module, "error": error}
+        if best is None or wall_seconds < best[0]:
+            best = (wall_seconds, completed.stderr)
+
+    wall_seconds, output = best
+    modules = parse_importtime(output)
+    # The imports made directly by the interpreter or the entry point
+    top_level = sorted(((cumulative, name) for name, (cumulative, level) in modules.items()
+                        if level <= 1 and name != module), reverse=True)[:top]
+    return {
+        "module": module,
+        "wall_seconds": round(wall_seconds, 3),
+        "import_seconds": round(modules.get(module, (0, 0))[0] / 1e6, 3),
+        "heaviest_imports": {name: round(cumulative / 1e6, 3) for cumulative, name in top_level},
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in modules],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="maximum wall seconds of the startup of an entry point")
+    parser.add_argument("--output", help="an optional JSON file of the results")
+    arguments = parser.parse_args()
+
+    results = [measure_entry_point(module, arguments.repeat) for module in arguments.modules]
+    over_budget = []
+    failed = []
+    for result in results:
+        if "error" in result:
+            print(f"{result['module']:<52} failed: {result['error']}")
+            failed.append(result["module"])
+            continue
+        heavy = ", ".join(result["heavy_modules_loaded"]) or "-"
+        print(f"{result['module']:<52} {result['wall_seconds']:>7.3f} s wall "
+              f"{result['import_seconds']:>7.3f} s import  heavy: {heavy}")
+        if result["wall_seconds"] > arguments.budget:
+            over_budget.append(result["module"])
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if failed:
+        print(f"Failed to import: {', '.join(failed)}")
+    if over_budget:
+        print(f"Over the {arguments.budget} s budget: {', '.join(over_budget)}")
+    sys.exit(1 if failed or over_budget else 0)
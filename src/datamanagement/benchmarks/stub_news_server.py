@@ -0,0 +1,222 @@
+""" A local stub of the WorldNewsAPI and NewsAPI.org endpoints.
+
+The stub serves the articles of a DataFrame (e.g. a synthetic corpus) in the
+json of the real apis, so the fetchers can be benchmarked and tested
+offline by giving its url as their base_url:
+
+    - /search-news and /top-news of WorldNewsAPI
+    - /everything and /top-headlines of NewsAPI.org
+
+Every response carries the X-API-Quota-Left header read by the FetchEngine,
+and fail_next makes the next requests fail to exercise its retries.
+Articles may be added while the stub runs, the top news endpoints serve the
+latest ones.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+
+def _value(value):
+    """ Return the value as a json scalar, None for the missing values """
+    return None if pd.isna(value) else value
+
+
+class StubNewsServer:
+    """ Serve the articles of a DataFrame on a local port
+
+    Arguments:
+        - articles: a DataFrame with the article columns of the fetchers
+        - page_size: the maximum number of articles per response
+        - latency: the seconds every response is delayed by
+        - quota: the quota reported in X-API-Quota-Left
+        - filter_dates: whether /search-news keeps only the articles of the
+          earliest and latest publish dates asked for, off so a benchmark
+          serves the whole corpus whatever its dates
+    """
+
+    def __init__(self, articles: pd.DataFrame = None, page_size: int = 100,
+                 latency: float = 0.0, quota: float = 1_000_000,
+                 filter_dates: bool = False):
+        self.page_size = page_size
+        self.filter_dates = filter_dates
+        self.latency = latency
+        self.quota = quota
+        self.n_requests = 0
+        self.failures = []
+        self.lock = threading.Lock()
+        self.articles = []
+        if articles is not None:
+            self.add_articles(articles)
+        self.server = None
+
+    def add_articles(self, articles: pd.DataFrame):
+        """ Add the articles to the ones served
+
+        Arguments:
+            - articles: a DataFrame with the article columns of the fetchers
+        """
+        records = [{column: _value(value) for column, value in record.items()}
+                   for record in articles.to_dict("records")]
+        with self.lock:
+            self.articles.extend(records)
+
+    def fail_next(self, n_requests: int, status: int = 503, retry_after: float = None):
+        """ Answer the next requests with an error and a non json body
+
+        Arguments:
+            - n_requests: the number of requests failed
+            - status: the status code of the failed responses
+            - retry_after: the Retry-After header of the failed responses,
+              not sent when None
+        """
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * n_requests)
+
+    def _next_failure(self):
+        """ Return the (status, retry_after) of the next failed request, None
+        when the request is answered """
+        with self.lock:
+            if not self.failures:
+                return None
+            self.n_requests += 1
+            return self.failures.pop(0)
+
+    @staticmethod
+    def _world_news_article(article: dict) -> dict:
+        return {
+            "id": article.get("source_id"),
+            "title": article.get("article_title"),
+            "text": article.get("article_content"),
+            "summary": article.get("article_description"),
+            "image": article.get("article_urlToImage"),
+            "publish_date": article.get("article_publishedAt"),
+            "authors": [article.get("author_name")],
+            "author": article.get("source_name"),
+            "url": article.get("source_name"),
+            "category": article.get("article_category"),
+            "sentiment": article.get("article_sentiment"),
+        }
+
+    @staticmethod
+    def _news_api_article(article: dict) -> dict:
+        return {
+            "source": {"id": article.get("source_id"), "name": article.get("source_name")},
+            "author": article.get("author_name"),
+            "title": article.get("article_title"),
+            "description": article.get("article_description"),
+            "urlToImage": article.get("article_urlToImage"),
+            "publishedAt": article.get("article_publishedAt"),
+            "content": article.get("article_content"),
+        }
+
+    def respond(self, path: str, query: dict) -> dict:
+        """ Build the json of a request to the stub
+
+        Arguments:
+            - path: the endpoint requested
+            - query: the query parameters, as parsed by parse_qs
+
+        Returns:
+            - dict: the json of the response, None for an unknown endpoint
+        """
+        with self.lock:
+            self.n_requests += 1
+            articles = list(self.articles)
+        latest = articles[-self.page_size:]
+        if path == "/search-news":
+            if self.filter_dates:
+                articles = self._published_between(articles, query)
+            offset = int(query.get("offset", ["0"])[0])
+            number = min(int(query.get("number", [self.page_size])[0]), self.page_size)
+            page = articles[offset:offset + number]
+            return {"offset": offset, "number": number, "available": len(articles),
+                    "news": [self._world_news_article(article) for article in page]}
+        if path == "/top-news":
+            return {"top_news": [{"news": [self._world_news_article(article)
+                                           for article in latest]}]}
+        if path in ("/everything", "/top-headlines"):
+            if path == "/everything":
+                page = int(query.get("page", ["1"])[0])
+                latest = articles[(page - 1) * self.page_size:page * self.page_size]
+            return {"status": "ok", "totalResults": len(articles),
+                    "articles": [self._news_api_article(article) for article in latest]}
+        return None
+
+    @staticmethod
+    def _published_between(articles: list, query: dict) -> list:
+        """ Keep the articles of the earliest and latest publish dates of the
+        query, in publish order when it is sorted on the publish time """
+        earliest = query.get("earliest-publish-date", [None])[0]
+        latest = query.get("latest-publish-date", [None])[0]
+        articles = [article for article in articles
+                    if (earliest is None or (article.get("article_publishedAt") or "") >= earliest)
+                    and (latest is None or (article.get("article_publishedAt") or "")[:len(latest)] <= latest)]
+        if query.get("sort", [None])[0] == "publish-time":
+            articles.sort(key=lambda article: article.get("article_publishedAt") or "")
+        return articles
+
+    def start(self) -> str:
+        """ Start serving in a background thread and return the base url """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *arguments):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if stub.latency:
+                    threading.Event().wait(stub.latency)
+                failure = stub._next_failure()
+                if failure is not None:
+                    status, retry_after = failure
+                    data = b"Service Unavailable"
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header("Retry-After", str(retry_after))
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.send_header("X-API-Quota-Left", str(stub.quota))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                body = stub.respond(url.path, parse_qs(url.query))
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-API-Quota-Left", str(stub.quota))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        """ The base url of the stub, to give to the fetchers """
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        """ Stop serving """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
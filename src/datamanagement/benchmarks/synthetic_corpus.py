@@ -0,0 +1,157 @@
+""" Synthetic news corpora of any size for the benchmarks.
+
+The sources, authors, missing values and text lengths follow the bundled
+v1-realtime_data-*.csv samples, and the texts are drawn from the word
+frequencies of the samples. A share of the articles are copies of earlier
+articles with a small edit, like the wire stories republished across
+sources.
+
+Usage (from the src directory):
+
+    python -m datamanagement.benchmarks.synthetic_corpus --rows 100000 --output corpus.csv
+"""
+import argparse
+import datetime
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+SAMPLE_FILES = ["v1-realtime_data-news-api-2024-10-18.csv",
+                "v1-realtime_data-world-news-api-2024-10-18.csv"]
+TEXT_COLUMNS = ["article_title", "article_description", "article_content"]
+# Texts are drawn as random sequences of a pool of phrases of a few words
+PHRASE_WORDS = 8
+PHRASE_POOL_SIZE = 50000
+CATEGORIES = ["politics", "business", "technology", "health", "science", "sports",
+              "entertainment"]
+
+
+def load_samples() -> pd.DataFrame:
+    """ Load the bundled sample CSVs into a single DataFrame """
+    return pd.concat([pd.read_csv(os.path.join(DATA_DIR, file_name), index_col=0)
+                      for file_name in SAMPLE_FILES], ignore_index=True)
+
+
+class CorpusProfile:
+    """ The distributions of the sample articles the corpora are drawn from
+
+    Arguments:
+        - samples: the sample articles, the bundled CSVs by default
+    """
+
+    def __init__(self, samples: pd.DataFrame = None):
+        if samples is None:
+            samples = load_samples()
+        sources = samples[["source_id", "source_name"]].astype(str).value_counts(normalize=True)
+        self.sources = list(sources.index)
+        self.source_probabilities = sources.to_numpy()
+        authors = samples["author_name"].value_counts(normalize=True, dropna=False)
+        self.authors = list(authors.index)
+        self.author_probabilities = authors.to_numpy()
+
+        words = Counter()
+        self.lengths = {}
+        self.missing_rates = {}
+        for column in TEXT_COLUMNS:
+            texts = samples[column].dropna().astype(str)
+            self.lengths[column] = np.array([len(text.split()) for text in texts] or [1])
+            self.missing_rates[column] = samples[column].isna().mean()
+            for text in texts:
+                words.update(text.split())
+        self.words = np.array(list(words), dtype=object)
+        counts = np.array(list(words.values()), dtype=float)
+        self.word_probabilities = counts / counts.sum()
+        published_at = pd.to_datetime(samples["article_publishedAt"], errors="coerce",
+                                      utc=True, format="ISO8601").dropna()
+        self.latest_publish_time = published_at.max().tz_localize(None).to_pydatetime() \
+            if not published_at.empty else datetime.datetime(2024, 10, 18)
+
+
+def _draw_phrases(profile: CorpusProfile, generator: np.random.Generator) -> np.ndarray:
+    """ Draw the pool of phrases of PHRASE_WORDS words the texts are made of """
+    words = generator.choice(profile.words, size=(PHRASE_POOL_SIZE, PHRASE_WORDS),
+                             p=profile.word_probabilities)
+    return np.array([" ".join(phrase) for phrase in words], dtype=object)
+
+
+def _draw_texts(profile: CorpusProfile, phrases: np.ndarray, column: str, n_rows: int,
+                generator: np.random.Generator) -> list:
+    """ Draw n_rows texts of the column, of the lengths of the samples
+
+    A text is a sequence of random phrases of the pool, which keeps the
+    generation of millions of long texts cheap while the texts stay distinct.
+    """
+    n_phrases = np.maximum(generator.choice(profile.lengths[column], size=n_rows)
+                           // PHRASE_WORDS, 1)
+    drawn = phrases[generator.integers(0, phrases.size, size=int(n_phrases.sum()))]
+    texts = [" ".join(text_phrases) for text_phrases in np.split(drawn, np.cumsum(n_phrases)[:-1])]
+    missing = generator.random(n_rows) < profile.missing_rates[column]
+    return [None if is_missing else text for text, is_missing in zip(texts, missing)]
+
+
+def generate_corpus(n_rows: int, seed: int = 0, duplicate_rate: float = 0.1,
+                    days: int = 30, profile: CorpusProfile = None) -> pd.DataFrame:
+    """ Generate a synthetic corpus of articles
+
+    Arguments:
+        - n_rows: the number of articles
+        - seed: the seed of the random draws, the same seed gives the same
+          corpus
+        - duplicate_rate: the share of articles which are edited copies of
+          an earlier article
+        - days: the number of days before the latest sample article over
+          which the publish times are spread
+        - profile: the distributions to draw from, the bundled samples by
+          default
+
+    Returns:
+        - pd.DataFrame: the articles, with the columns of the historical
+          fetch of WorldNewsAPI
+    """
+    profile = profile or CorpusProfile()
+    generator = np.random.default_rng(seed)
+    phrases = _draw_phrases(profile, generator)
+    sources = generator.choice(len(profile.sources), size=n_rows, p=profile.source_probabilities)
+    authors = generator.choice(len(profile.authors), size=n_rows, p=profile.author_probabilities)
+    seconds = generator.integers(0, days * 24 * 3600, size=n_rows)
+    latest = profile.latest_publish_time
+    corpus = pd.DataFrame({
+        "source_id": [profile.sources[index][0] for index in sources],
+        "source_name": [profile.sources[index][1] for index in sources],
+        "author_name": [profile.authors[index] for index in authors],
+        "article_title": _draw_texts(profile, phrases, "article_title", n_rows, generator),
+        "article_description": _draw_texts(profile, phrases, "article_description", n_rows, generator),
+        "article_urlToImage": [f"https://example.com/images/{index}.jpg" for index in range(n_rows)],
+        "article_publishedAt": [(latest - datetime.timedelta(seconds=int(second)))
+                                .strftime("%Y-%m-%d %H:%M:%S") for second in seconds],
+        "article_content": _draw_texts(profile, phrases, "article_content", n_rows, generator),
+        "article_category": generator.choice(CATEGORIES, size=n_rows),
+        "article_sentiment": np.round(generator.uniform(-1, 1, size=n_rows), 3),
+    })
+
+    # Edited copies of earlier articles, under another source and time
+    copies = np.flatnonzero(generator.random(n_rows) < duplicate_rate)
+    copies = copies[copies > 0]
+    originals = (generator.random(copies.size) * copies).astype(int)
+    for column in TEXT_COLUMNS:
+        values = corpus[column].to_numpy(dtype=object)
+        values[copies] = [None if text is None else f"{text} (updated)"
+                          for text in values[originals]]
+        corpus[column] = values
+    return corpus
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--output", default="synthetic_corpus.csv")
+    arguments = parser.parse_args()
+
+    generate_corpus(arguments.rows, arguments.seed, arguments.duplicate_rate) \
+        .to_csv(arguments.output)
@@ -1,26 +1,107 @@
+import ast
+import hashlib
+import json
 import sqlite3
 import pandas as pd
 import uuid
 
+from ..instrumentation import instrumented
+
 def load_csv_to_dataframe(csv_file_path):
     """Load a CSV file into a pandas DataFrame."""
     return pd.read_csv(csv_file_path)
 
-def generate_uuids(data):
-    """Generate UUIDs for each required column in the DataFrame."""
-    data['article_id'] = [str(uuid.uuid4()) for _ in range(data.shape[0])]
-    data['article_title_id'] = [str(uuid.uuid4()) for _ in range(data.shape[0])]
-    data['article_description_id'] = [str(uuid.uuid4()) for _ in range(data.shape[0])]
-    data['article_content_id'] = [str(uuid.uuid4()) for _ in range(data.shape[0])]
+def load_staging_to_dataframe(staging_root, start_date=None, end_date=None, source_api=None):
+    """Load the articles of the Parquet staging dataset into a pandas DataFrame.
+
+    The publish dates are real timestamps and the _pos_counts columns dicts,
+    so nothing is re-parsed from text.
+    """
+    from ..staging import read_staging
+    return read_staging(staging_root, start_date=start_date, end_date=end_date,
+                        source_api=source_api)
+
+# Namespace of the deterministic keys, fixed so that the same article
+# gets the same keys on every run
+ARTICLE_NAMESPACE = uuid.UUID('6f1c3c9e-2d8b-5b8e-9a51-4b7e0c2f9d13')
+
+# Tables of the star schema with their columns and primary key
+TABLES = [
+    ('FactNews', ['article_id', 'source_id', 'source_name', 'author_name'], 'article_id'),
+    ('DimArticle', ['article_id', 'article_title_id', 'article_description_id', 'article_content_id', 'article_urlToImage', 'article_publishedAt'], 'article_id'),
+    ('DimArticleTitle', ['article_title_id', 'article_title', 'article_title_pos_counts'], 'article_title_id'),
+    ('DimArticleDescription', ['article_description_id', 'article_description', 'article_description_pos_counts'], 'article_description_id'),
+    ('DimArticleContent', ['article_content_id', 'article_content', 'article_content_pos_counts'], 'article_content_id'),
+]
+
+def text_hash(text):
+    """Return the sha256 hex digest of a text, the key of its dimension row."""
+    return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+def generate_uuids(data, deterministic=False):
+    """Generate UUIDs for each required column in the DataFrame.
+
+    The title, description and content keys are the hash of their text, so
+    a text repeated across articles is stored once in its dimension. With
+    deterministic, the article key is uuid5 over the source, title and
+    publish time of the article, so an article fetched again keeps its key.
+    """
+    if deterministic:
+        natural_keys = zip(data['source_name'], data['article_title'], data['article_publishedAt'])
+        data['article_id'] = [str(uuid.uuid5(ARTICLE_NAMESPACE, '|'.join(map(str, natural_key))))
+                              for natural_key in natural_keys]
+    else:
+        data['article_id'] = [str(uuid.uuid4()) for _ in range(data.shape[0])]
+    data['article_title_id'] = data['article_title'].map(text_hash)
+    data['article_description_id'] = data['article_description'].map(text_hash)
+    data['article_content_id'] = data['article_content'].map(text_hash)
     return data
 
+# Universal POS tags (plus the SPACE tag of spacy), one integer column each
+# in TextPosCounts
+UPOS_TAGS = ['ADJ', 'ADP', 'ADV', 'AUX', 'CCONJ', 'DET', 'INTJ', 'NOUN', 'NUM', 'PART',
+             'PRON', 'PROPN', 'PUNCT', 'SCONJ', 'SYM', 'VERB', 'X', 'SPACE']
+
+# Text fields with their dimension table, the counts of all three are keyed
+# by the text hash of the dimension
+TEXT_DIMENSIONS = [
+    ('article_title', 'DimArticleTitle'),
+    ('article_description', 'DimArticleDescription'),
+    ('article_content', 'DimArticleContent'),
+]
+
+# Column of every loaded table holding the sequence number of the load which
+# last inserted or changed the row, the incremental warehouse exports follow it
+CHANGE_COLUMN = 'change_seq'
+
+# Tables whose rows carry the CHANGE_COLUMN
+CHANGE_TRACKED_TABLES = [table_name for table_name, _, _ in TABLES] + [
+    'TextPosCounts', 'TextOrgCounts', 'ArticleDuplicateCluster']
+
+# Secondary indexes of the star schema, created after the bulk load so the
+# inserts do not maintain them row by row
+INDEXES = [
+    ('idx_dimarticle_publishedat', 'DimArticle', ['article_publishedAt']),
+    ('idx_dimarticle_title_id', 'DimArticle', ['article_title_id']),
+    ('idx_dimarticle_description_id', 'DimArticle', ['article_description_id']),
+    ('idx_dimarticle_content_id', 'DimArticle', ['article_content_id']),
+    ('idx_factnews_source_name', 'FactNews', ['source_name']),
+    ('idx_textorgcounts_org', 'TextOrgCounts', ['org']),
+    ('idx_articleduplicatecluster_cluster_id', 'ArticleDuplicateCluster', ['duplicate_cluster_id']),
+] + [(f'idx_{table_name.lower()}_{CHANGE_COLUMN}', table_name, [CHANGE_COLUMN])
+     for table_name in CHANGE_TRACKED_TABLES]
+
 def create_sqlite_connection(db_name):
     """Create or connect to a SQLite database."""
     return sqlite3.connect(db_name)
 
-def create_tables(cursor):
-    """Create tables in the SQLite database."""
-    cursor.execute('DROP TABLE IF EXISTS FactNews')
+def create_tables(cursor, drop_existing=True):
+    """Create tables in the SQLite database.
+
+    With drop_existing False the existing tables and their rows are kept.
+    """
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS FactNews')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS FactNews (
             article_id TEXT PRIMARY KEY,
@@ -30,7 +111,8 @@ def create_tables(cursor):
         );
     ''')
     
-    cursor.execute('DROP TABLE IF EXISTS DimArticle')
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS DimArticle')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS DimArticle (
             article_id TEXT PRIMARY KEY,
@@ -45,7 +127,8 @@ def create_tables(cursor):
         );
     ''')
     
-    cursor.execute('DROP TABLE IF EXISTS DimArticleTitle')
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS DimArticleTitle')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS DimArticleTitle (
             article_title_id TEXT PRIMARY KEY,
@@ -54,7 +137,8 @@ def create_tables(cursor):
         );
     ''')
     
-    cursor.execute('DROP TABLE IF EXISTS DimArticleDescription')
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS DimArticleDescription')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS DimArticleDescription (
             article_description_id TEXT PRIMARY KEY,
@@ -63,7 +147,8 @@ def create_tables(cursor):
         );
     ''')
     
-    cursor.execute('DROP TABLE IF EXISTS DimArticleContent')
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS DimArticleContent')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS DimArticleContent (
             article_content_id TEXT PRIMARY KEY,
@@ -72,45 +157,335 @@ def create_tables(cursor):
         );
     ''')
 
-def insert_data(cursor, table_name, data_frame, columns):
-    """Insert data from a DataFrame into the specified table."""
-    for _, row in data_frame.iterrows():
-        placeholders = ', '.join(['?'] * len(columns))
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS TextPosCounts')
+    create_pos_counts_table(cursor, 'TextPosCounts')
+
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS TextOrgCounts')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TextOrgCounts (
+            text_id TEXT,
+            org TEXT,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (text_id, org)
+        );
+    ''')
+
+    if drop_existing:
+        cursor.execute('DROP TABLE IF EXISTS ArticleDuplicateCluster')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ArticleDuplicateCluster (
+            article_id TEXT PRIMARY KEY,
+            duplicate_cluster_id TEXT NOT NULL,
+            is_cluster_representative BOOLEAN NOT NULL
+        );
+    ''')
+
+    create_count_views(cursor, drop_existing)
+
+def create_pos_counts_table(cursor, table_name, extra_columns=()):
+    """Create the table of the part of speech counts, one column per UPOS tag.
+
+    A tag absent from a text is NULL rather than 0, as JSON_EXTRACT_SCALAR
+    returned on the _pos_counts JSON, so the AVG and COUNT of the dbt
+    models only take the texts in which the tag occurs.
+    """
+    pos_columns = ',\n'.join(f'            {column}' for column in
+                             [f'{tag} INTEGER' for tag in UPOS_TAGS] + list(extra_columns))
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            text_id TEXT PRIMARY KEY,
+{pos_columns}
+        );
+    ''')
+
+def create_count_views(cursor, drop_existing=True):
+    """Create the views with the typed counts of every text dimension, in the
+    shape the dbt models used to extract from the JSON."""
+    for field, table_name in TEXT_DIMENSIONS:
+        if drop_existing:
+            cursor.execute(f'DROP VIEW IF EXISTS {table_name}Counts')
         cursor.execute(f'''
-            INSERT INTO {table_name} ({', '.join(columns)})
-            VALUES ({placeholders})
-        ''', tuple(row[col] for col in columns))
+            CREATE VIEW IF NOT EXISTS {table_name}Counts AS
+            SELECT
+                dim.{field}_id,
+                dim.{field},
+                dim.{field}_pos_counts,
+                pos.NOUN AS noun_count,
+                pos.ADJ AS adj_count,
+                pos.VERB AS verb_count,
+                pos.PROPN AS propn_count
+            FROM {table_name} AS dim
+            LEFT JOIN TextPosCounts AS pos ON pos.text_id = dim.{field}_id;
+        ''')
 
-def create_and_insert_to_db(data, db_name="newsdb"):
-    """ Create and insert to the database """
-    # Load and process data
-    data = generate_uuids(data)
+def make_pos_counts_nullable(cursor, change_seq):
+    """Rebuild a TextPosCounts table whose tag columns were created NOT NULL
+    DEFAULT 0, turning the zeros back into NULL.
+
+    The counts only hold the tags found in a text, so a stored 0 always
+    stands for an absent tag. The rebuilt rows carry the change sequence of
+    the load so the warehouse exports pick the NULLs up.
+    """
+    columns = cursor.execute('PRAGMA table_info(TextPosCounts)').fetchall()
+    if not any(row[1] in UPOS_TAGS and row[3] for row in columns):
+        return
+    for _, table_name in TEXT_DIMENSIONS:
+        cursor.execute(f'DROP VIEW IF EXISTS {table_name}Counts')
+    create_pos_counts_table(cursor, 'TextPosCountsNullable',
+                            [f'{CHANGE_COLUMN} INTEGER NOT NULL DEFAULT 0'])
+    tags = ', '.join(UPOS_TAGS)
+    nullable_tags = ', '.join(f'NULLIF({tag}, 0)' for tag in UPOS_TAGS)
+    cursor.execute(f'''
+        INSERT INTO TextPosCountsNullable (text_id, {tags}, {CHANGE_COLUMN})
+        SELECT text_id, {nullable_tags}, ? FROM TextPosCounts
+    ''', (change_seq,))
+    cursor.execute('DROP TABLE TextPosCounts')
+    cursor.execute('ALTER TABLE TextPosCountsNullable RENAME TO TextPosCounts')
+    create_count_views(cursor, drop_existing=False)
 
-    # Create data frames for different tables
-    fact_news_df = data[['article_id', 'source_id', 'source_name', 'author_name']].drop_duplicates()
-    dim_article_df = data[['article_id', 'article_title_id', 'article_description_id', 'article_content_id', 'article_urlToImage', 'article_publishedAt']].drop_duplicates()
-    dim_article_title_df = data[['article_title_id', 'article_title', 'article_title_pos_counts']].drop_duplicates()
-    dim_article_description_df = data[['article_description_id', 'article_description', 'article_description_pos_counts']].drop_duplicates()
-    dim_article_content_df = data[['article_content_id', 'article_content', 'article_content_pos_counts']].drop_duplicates()
+def add_change_columns(cursor):
+    """Add the CHANGE_COLUMN to the tracked tables which do not have it yet,
+    e.g. the tables of a database loaded before it existed."""
+    for table_name in CHANGE_TRACKED_TABLES:
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table_name})')]
+        if CHANGE_COLUMN not in columns:
+            cursor.execute(f'ALTER TABLE {table_name} ADD COLUMN {CHANGE_COLUMN} INTEGER NOT NULL DEFAULT 0')
 
+def start_load(cursor, new_generation):
+    """Record a load in the LoadMetadata table and return its change sequence.
+
+    Every load gets the next change sequence number. The generation is a
+    random id replaced by every load rebuilding the tables, so an export can
+    tell that the rows it exported before are gone.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LoadMetadata (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    ''')
+    metadata = dict(cursor.execute('SELECT name, value FROM LoadMetadata').fetchall())
+    change_seq = int(metadata.get('change_seq', 0)) + 1
+    generation = metadata.get('generation')
+    if new_generation or generation is None:
+        generation = str(uuid.uuid4())
+    cursor.executemany('INSERT OR REPLACE INTO LoadMetadata (name, value) VALUES (?, ?)',
+                       [('change_seq', str(change_seq)), ('generation', generation)])
+    return change_seq
+
+def read_load_state(conn):
+    """Return the generation and change sequence of the last load, or
+    (None, 0) for a database loaded before they were recorded."""
+    try:
+        metadata = dict(conn.execute('SELECT name, value FROM LoadMetadata').fetchall())
+    except sqlite3.OperationalError:
+        return None, 0
+    return metadata.get('generation'), int(metadata.get('change_seq', 0))
+
+def create_indexes(cursor, analyze=True):
+    """Create the secondary indexes and refresh the planner statistics.
+
+    A full ANALYZE reads every table, so it is only worth it after a full
+    reload. Without analyze, PRAGMA optimize refreshes the statistics of the
+    tables which changed enough since they were last analyzed.
+    """
+    for index_name, table_name, columns in INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({", ".join(columns)})')
+    cursor.execute('ANALYZE' if analyze else 'PRAGMA optimize')
+
+def apply_bulk_load_pragmas(conn, journal_mode="TRUNCATE", synchronous="OFF",
+                            cache_size=-64000):
+    """Tune the SQLite connection for a batch load.
+
+    A single large transaction into fresh tables is fastest with a rollback
+    journal, WAL writes every page twice (log and checkpoint) and is better
+    kept for concurrent readers. cache_size follows the SQLite convention,
+    negative values are in KiB.
+    """
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    conn.execute(f'PRAGMA cache_size={cache_size}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+def parse_counts(value):
+    """Return the counts of a _pos_counts or _org_counts value as a dict.
+
+    The counts are dicts after the NLP stage, JSON text once loaded and
+    python dict reprs once written to CSV by pandas.
+    """
+    if isinstance(value, dict):
+        return value
+    if not isinstance(value, str) or not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        try:
+            counts = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return {}
+        return counts if isinstance(counts, dict) else {}
+
+def build_count_tables(data):
+    """Build the TextPosCounts and TextOrgCounts rows of every text.
+
+    Returns a tuple of DataFrames, one row per distinct text with a column per
+    UPOS tag, and one row per (text_id, org) with its count.
+    """
+    pos_rows = {}
+    org_rows = {}
+    for field, _ in TEXT_DIMENSIONS:
+        ids = data[f'{field}_id'].tolist()
+        if f'{field}_pos_counts' in data:
+            for text_id, value in zip(ids, data[f'{field}_pos_counts'].tolist()):
+                if text_id not in pos_rows:
+                    counts = parse_counts(value)
+                    # The tags absent from the text stay NULL
+                    pos_rows[text_id] = [text_id] + [None if counts.get(tag) is None
+                                                     else int(counts[tag]) for tag in UPOS_TAGS]
+        if f'{field}_org_counts' in data:
+            for text_id, value in zip(ids, data[f'{field}_org_counts'].tolist()):
+                for org, count in parse_counts(value).items():
+                    org_rows.setdefault((text_id, org), [text_id, org, int(count)])
+    pos_df = pd.DataFrame(list(pos_rows.values()), columns=['text_id'] + UPOS_TAGS) \
+        .astype({tag: 'Int64' for tag in UPOS_TAGS})
+    org_df = pd.DataFrame(list(org_rows.values()), columns=['text_id', 'org', 'count'])
+    return pos_df, org_df
+
+def sql_values(series):
+    """Convert a column into python values sqlite can bind.
+
+    Datetimes are written as ISO text ('YYYY-MM-DD HH:MM:SS'), so they
+    compare in time order, and dicts such as the _pos_counts as JSON.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is not None:
+            # Stored as naive UTC, like the timestamps loaded from CSV
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        return [None if pd.isna(value) else value.isoformat(sep=' ') for value in series]
+    if not pd.api.types.is_object_dtype(series):
+        # Categorical and Arrow string columns hold NaN/pd.NA for missing values
+        series = series.astype(object).where(series.notna(), None)
+    # tolist converts the numpy scalars into the python types sqlite binds
+    return [json.dumps(value) if isinstance(value, (dict, list)) else value
+            for value in series.tolist()]
+
+def insert_data(cursor, table_name, data_frame, columns, chunk_size=10000, upsert_key=None,
+                change_column=None):
+    """Insert data from a DataFrame into the specified table.
+
+    The rows are bound with executemany in chunks of chunk_size rows so the
+    tuples of a single chunk only are held in memory. With upsert_key (a
+    column or a list of columns), a row whose key exists already is updated
+    only when one of its values changed. The change_column is not compared,
+    it is only updated along with a row which changed.
+    """
+    placeholders = ', '.join(['?'] * len(columns))
+    query = f'''
+        INSERT INTO {table_name} ({', '.join(columns)})
+        VALUES ({placeholders})
+    '''
+    if upsert_key is not None:
+        keys = [upsert_key] if isinstance(upsert_key, str) else list(upsert_key)
+        updated_columns = [col for col in columns if col not in keys]
+        compared_columns = [col for col in updated_columns if col != change_column]
+        query += f'''
+        ON CONFLICT({', '.join(keys)}) DO UPDATE SET
+            {', '.join(f'{col} = excluded.{col}' for col in updated_columns)}
+        WHERE {' OR '.join(f'{col} IS NOT excluded.{col}' for col in compared_columns)}
+        '''
+    for start in range(0, data_frame.shape[0], chunk_size):
+        chunk = data_frame.iloc[start:start + chunk_size]
+        cursor.executemany(query, zip(*(sql_values(chunk[col]) for col in columns)))
+
+@instrumented("sqlite_load", rows_argument="data")
+def create_and_insert_to_db(data, db_name="newsdb", bulk_pragmas=False, chunk_size=10000, mode="replace"):
+    """ Create and insert to the database
+
+    mode "replace" rebuilds the tables with random keys on every run. mode
+    "upsert" keeps the existing rows, derives the keys from the articles and
+    writes only the new or changed rows. Either way the rows written carry
+    the change sequence of the load (see start_load).
+
+    bulk_pragmas turns the durability of the connection down for a one-shot
+    batch load (see apply_bulk_load_pragmas): a crash during the load can
+    corrupt the database, so it is only meant for a database which is
+    rebuilt from the staging data anyway, never for the upserts of the sinks.
+    """
+    if mode not in ("replace", "upsert"):
+        raise ValueError(f"Unknown mode {mode}, expected 'replace' or 'upsert'")
+    upsert = mode == "upsert"
+
+    # Load and process data
+    data = generate_uuids(data, deterministic=upsert)
+
+    conn = None
     try:
         # Connect to SQLite and create tables
         conn = create_sqlite_connection(f'{db_name}.db')
+        if bulk_pragmas:
+            apply_bulk_load_pragmas(conn)
         cursor = conn.cursor()
-        create_tables(cursor)
-
-        # Insert data
-        insert_data(cursor, 'FactNews', fact_news_df, ['article_id', 'source_id', 'source_name', 'author_name'])
-        insert_data(cursor, 'DimArticle', dim_article_df, ['article_id', 'article_title_id', 'article_description_id', 'article_content_id', 'article_urlToImage', 'article_publishedAt'])
-        insert_data(cursor, 'DimArticleTitle', dim_article_title_df, ['article_title_id', 'article_title', 'article_title_pos_counts'])
-        insert_data(cursor, 'DimArticleDescription', dim_article_description_df, ['article_description_id', 'article_description',  'article_description_pos_counts'])
-        insert_data(cursor, 'DimArticleContent', dim_article_content_df, ['article_content_id', 'article_content', 'article_content_pos_counts'])
+        create_tables(cursor, drop_existing=not upsert)
+        add_change_columns(cursor)
+
+        # Insert data in a single transaction
+        cursor.execute('BEGIN')
+        # The rows inserted or changed by this load carry its change sequence
+        change_seq = start_load(cursor, new_generation=not upsert)
+        if upsert:
+            make_pos_counts_nullable(cursor, change_seq)
+        data[CHANGE_COLUMN] = change_seq
+        for table_name, columns, key in TABLES:
+            # Create data frames for different tables
+            table_df = data[columns + [CHANGE_COLUMN]].drop_duplicates(subset=key)
+            insert_data(cursor, table_name, table_df, columns + [CHANGE_COLUMN], chunk_size,
+                        upsert_key=key if upsert else None, change_column=CHANGE_COLUMN)
+        # Typed counts so that the aggregations need no JSON parsing
+        pos_counts_df, org_counts_df = build_count_tables(data)
+        for table_name, counts_df, key in [('TextPosCounts', pos_counts_df, 'text_id'),
+                                           ('TextOrgCounts', org_counts_df, ['text_id', 'org'])]:
+            counts_df[CHANGE_COLUMN] = change_seq
+            insert_data(cursor, table_name, counts_df, list(counts_df.columns), chunk_size,
+                        upsert_key=key if upsert else None, change_column=CHANGE_COLUMN)
+        # Near-duplicate clusters, when the articles went through the dedup stage
+        if 'duplicate_cluster_id' in data:
+            cluster_columns = ['article_id', 'duplicate_cluster_id', 'is_cluster_representative', CHANGE_COLUMN]
+            insert_data(cursor, 'ArticleDuplicateCluster', data[cluster_columns].drop_duplicates(subset='article_id'),
+                        cluster_columns, chunk_size, upsert_key='article_id' if upsert else None,
+                        change_column=CHANGE_COLUMN)
+        # The tables of a full reload are new, their indexes are built once
+        # after the load instead of maintained row by row, and analyzed. The
+        # small upserts of the sinks leave the statistics to PRAGMA optimize.
+        create_indexes(cursor, analyze=not upsert)
     except Exception as oops:
         print("Error occurred while inserting the table as ", oops)
+        if conn is not None:
+            conn.rollback()
+            conn.close()
         return False
 
     # Commit and close the connection
     conn.commit()
     conn.close()
     print("Data successfully loaded into the SQLite database!")
-    return True
\ No newline at end of file
+    return True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the SQLite database from the staging "
+                                                 "dataset or a CSV in a one-shot bulk load.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--staging", help="directory of the staging dataset")
+    source.add_argument("--csv", help="CSV file of the enriched articles")
+    parser.add_argument("--db", default="newsdb", help="SQLite database, without .db")
+    arguments = parser.parse_args()
+
+    if arguments.staging:
+        articles = load_staging_to_dataframe(arguments.staging)
+    else:
+        articles = load_csv_to_dataframe(arguments.csv)
+    create_and_insert_to_db(articles, db_name=arguments.db, bulk_pragmas=True, mode="replace")
@@ -0,0 +1,71 @@
+import sqlite3
+import pandas as pd
+
+# Articles with their dimensions joined. The publish time range is served by
+# idx_dimarticle_publishedat and the joins to the text dimensions by their
+# primary keys.
+ARTICLES_QUERY = '''
+    SELECT
+        a.article_id,
+        f.source_id,
+        f.source_name,
+        f.author_name,
+        a.article_publishedAt,
+        a.article_urlToImage,
+        t.article_title,
+        t.article_title_pos_counts,
+        d.article_description,
+        d.article_description_pos_counts,
+        c.article_content,
+        c.article_content_pos_counts
+    FROM DimArticle AS a
+    JOIN FactNews AS f ON f.article_id = a.article_id
+    LEFT JOIN DimArticleTitle AS t ON t.article_title_id = a.article_title_id
+    LEFT JOIN DimArticleDescription AS d ON d.article_description_id = a.article_description_id
+    LEFT JOIN DimArticleContent AS c ON c.article_content_id = a.article_content_id
+    WHERE a.article_publishedAt >= ? AND a.article_publishedAt < ?
+'''
+
+SOURCE_FILTER = '''
+      AND f.source_name = ?
+'''
+
+def _articles_query(source_name=None):
+    """Build the articles query and whether it filters on the source."""
+    query = ARTICLES_QUERY
+    if source_name is not None:
+        query += SOURCE_FILTER
+    return query + '    ORDER BY a.article_publishedAt'
+
+def articles_in_time_range(conn, start, end, source_name=None, chunk_size=None):
+    """Select the articles published in [start, end) with their dimensions.
+
+    start and end compare as text with article_publishedAt, e.g. '2024-10-01'
+    or '2024-10-01 12:00:00'. With chunk_size, an iterator of DataFrames of
+    at most chunk_size rows is returned instead of a single DataFrame.
+    """
+    params = [str(start), str(end)]
+    if source_name is not None:
+        params.append(source_name)
+    return pd.read_sql_query(_articles_query(source_name), conn, params=params,
+                             chunksize=chunk_size)
+
+def explain_query_plan(conn, query, params=()):
+    """Return the detail lines of the SQLite query plan of a query."""
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+
+def explain_articles_in_time_range(conn, start, end, source_name=None):
+    """Return the query plan of articles_in_time_range, e.g. to check that it
+    searches idx_dimarticle_publishedat instead of scanning DimArticle."""
+    params = [str(start), str(end)]
+    if source_name is not None:
+        params.append(source_name)
+    return explain_query_plan(conn, _articles_query(source_name), params)
+
+if __name__ == "__main__":
+    conn = sqlite3.connect('newsdb.db')
+    for line in explain_articles_in_time_range(conn, '2024-10-01', '2024-11-01'):
+        print(line)
+    for chunk in articles_in_time_range(conn, '2024-10-01', '2024-11-01', chunk_size=1000):
+        print(chunk.shape)
+    conn.close()
@@ -1,17 +1,73 @@
 """ The functionalities of the newsorg api.
 For further details check out 
 https://newsapi.org/
+
+Usage (from the src directory), staging the historical and realtime
+articles into datamanagement/data/staging:
+
+    python -m datamanagement.datafetch.news.NewsOrgApi
 """
-from newsapi import NewsApiClient
-import pandas as pd
+from __future__ import annotations
+
 import os
-from dotenv import load_dotenv
 import datetime
-load_dotenv()
+from .fetch_engine import FetchEngine, QuotaExhausted, instrumented_fetch
+from .record_batch import ARTICLE_SCHEMA, ArticleBatchBuilder
 
 class NewsORGAPI:
 
-    newsapi = NewsApiClient(api_key=os.getenv("NEWS_ORG_API"))
+    BASE_URL = "https://newsapi.org/v2"
+
+    def __init__(self, base_url: str = BASE_URL, fetch_engine: FetchEngine = None):
+        """ Initialize the api client
+
+        Arguments:
+            - base_url: the url of the api, e.g. a local stub server
+            - fetch_engine: a FetchEngine shared between the clients, a new
+              one with the default concurrency is created on the first
+              request when not given
+        """
+        self.base_url = base_url
+        self._fetch_engine = fetch_engine
+        self._headers = None
+
+    @property
+    def fetch_engine(self) -> FetchEngine:
+        """ The FetchEngine of the client, created on the first request """
+        if self._fetch_engine is None:
+            self._fetch_engine = FetchEngine()
+        return self._fetch_engine
+
+    @property
+    def headers(self) -> dict:
+        """ The headers of the requests, the api key is read on the first
+        request so the jobs which never call the api need no key """
+        if self._headers is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self._headers = {'X-Api-Key': os.getenv("NEWS_ORG_API")}
+        return self._headers
+
+    def _get_json(self, endpoint: str, params: dict) -> dict:
+        """ Call the endpoint of the api and return the json of the response
+
+        Arguments:
+            - endpoint: the endpoint of the api such as "everything"
+            - params: the query parameters of the request
+
+        Returns:
+            - dict: the json of the response, with a failed status when the
+              request could not be made
+        """
+        try:
+            response = self.fetch_engine.get(f"{self.base_url}/{endpoint}",
+                                             headers=self.headers, params=params)
+        except QuotaExhausted as oops:
+            return {"status": "failed", "message": str(oops)}
+        if response.status_code != 200:
+            # The body of an error left after the retries may not be json
+            return {"status": "failed", "message": f"status {response.status_code}"}
+        return response.json()
 
     def _format_articles_into_list(self, all_articles: dict):
         """ Converts the json from the newsapi.org into the list.
@@ -42,6 +98,7 @@ class NewsORGAPI:
                 article_description,article_urlToImage,article_publishedAt, article_content)
            
  
+    @instrumented_fetch("newsapi_historical")
     def retrieve_past_data_for_category(self,
                                         from_date: str,
                                         categories: list) -> pd.DataFrame:
@@ -56,41 +113,37 @@ class NewsORGAPI:
             - Pandas DataFrame: A dataframe with news information
         
         """
-        # Create the default pandas dataframe with the features
-        df = pd.DataFrame(columns=["source_id", "source_name", "author_name", "article_title",
-                   "article_description","article_urlToImage","article_publishedAt", "article_content"])
+        # Collect the articles of all the pages into column buffers
+        batch = ArticleBatchBuilder(ARTICLE_SCHEMA)
         try:
             # Fetch api for each category
             for each_category in categories:
                 # Until Page 5 could be accessed for the Free API version
                 for page in range(1, 6):
                     # Retrieve every news on the particular category
-                    all_articles = self.newsapi.get_everything(q=each_category,
-                                                    sources="",
-                                                    domains="",
-                                                    from_param=from_date,
-                                                    language="en",
-                                                    sort_by="relevancy",
-                                                    page=page)
+                    if isinstance(from_date, (datetime.date, datetime.datetime)):
+                        from_date = from_date.strftime("%Y-%m-%d")
+                    all_articles = self._get_json("everything",
+                                                  params={"q": each_category,
+                                                          "from": from_date,
+                                                          "language": "en",
+                                                          "sortBy": "relevancy",
+                                                          "page": page})
                     # Checks if the information are retrieved successfully
                     status = all_articles.get("status", "failed")
                     if status == "ok":
                         all_articles = all_articles.get("articles", [])
                         print(all_articles[0])
-                        # articles from the api are converted to the list
-                        converted_articles = list(self._format_articles_into_list(all_articles))
-                        # Create a new Dataframe with converted list
-                        new_df = pd.DataFrame(data=converted_articles, columns=["source_id", "source_name", "author_name", "article_title", 
-                                "article_description","article_urlToImage","article_publishedAt", "article_content"])
-                        # Concat the default dataframe with the new dataframe
-                        df = pd.concat([df, new_df])
+                        # articles from the api are appended to the buffers
+                        batch.extend(self._format_articles_into_list(all_articles))
                     break
                 break
         except Exception as oops:
             print(f"Erorr occurred as {oops}")
 
-        return df
+        return batch.to_dataframe()
     
+    @instrumented_fetch("newsapi_realtime")
     def retrieve_real_time_data(self, categories: list) -> pd.DataFrame:
         """ Fetch data from all the categories and store it in dataframe
 
@@ -103,27 +156,31 @@ class NewsORGAPI:
             - pd.Dataframe: A pandas Dataframe with the latest news information
 
         """           
-        df = pd.DataFrame(columns=["source_id", "source_name", "author_name", "article_title", 
-                    "article_description","article_urlToImage","article_publishedAt", "article_content"])
-        for category in categories:
-            top_headlines = self.newsapi.get_top_headlines(q='',
-                                                    language='en',
-                                                    category=category,
-                                                    page_size=100
-                                                    )
+        batch = ArticleBatchBuilder(ARTICLE_SCHEMA)
+        # Retrieval of the headlines for all the categories concurrently
+        responses = self.fetch_engine.get_many([
+            {"url": f"{self.base_url}/top-headlines",
+             "headers": self.headers,
+             "params": {"language": "en", "category": category, "pageSize": 100}}
+            for category in categories])
+        for response in responses:
+            # Whether the response is successful
+            if response is None or response.status_code != 200:
+                print(f"Error: {getattr(response, 'status_code', 'quota exhausted')}")
+                continue
+            top_headlines = response.json()
             status = top_headlines.get("status", "failed")
             if status == 'ok':
 
                 all_articles = top_headlines.get("articles", [])
-                converted_articles = list(self._format_articles_into_list(all_articles))
-                new_df = pd.DataFrame(data=converted_articles, columns=["source_id", "source_name", "author_name", "article_title", 
-                        "article_description","article_urlToImage","article_publishedAt", "article_content"])
-                df = pd.concat([df, new_df])
+                batch.extend(self._format_articles_into_list(all_articles))
                 print("Information stored successfully into the dataframe")
-        return df
+        return batch.to_dataframe()
 
 
 if __name__ == "__main__":
+    from ...staging import STAGING_DIR, write_staging
+
     categories =  ["business","entertainment","general","health","science","sports","technology"]
     date_30_days_ago = datetime.datetime.today() - datetime.timedelta(days=30)
     date_30_days_ago_str = date_30_days_ago.strftime("%Y-%m-%d")
@@ -137,13 +194,13 @@ if __name__ == "__main__":
         historical_df = news_api.retrieve_past_data_for_category(
                         from_date=date_30_days_ago,
                         categories=news_categories)
-        historical_df.to_csv("historical_news_data.csv")
+        write_staging(historical_df, STAGING_DIR, source_api="newsapi")
     except Exception as oops:
         print(f"Error occurred while storing historical data as {oops}")
 
     try:
         df = news_api.retrieve_real_time_data(categories=news_categories)
-        df.to_csv("realtime.csv")
+        write_staging(df, STAGING_DIR, source_api="newsapi")
     except Exception as oops:
         print(f"Error occurred while storing realtime data as {oops}")
 
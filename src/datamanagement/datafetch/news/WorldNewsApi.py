@@ -1,22 +1,57 @@
 """ The functionalities of the WorldNewsAPI
 For further details check out https://worldnewsapi.com
+
+Usage (from the src directory), staging the historical articles into
+datamanagement/data/staging:
+
+    python -m datamanagement.datafetch.news.WorldNewsApi
 """
+from __future__ import annotations
 
-import pandas as pd
 import os
-import requests
-from dotenv import load_dotenv
 import datetime
-import time
+from ...instrumentation import instrumentation
+from .fetch_engine import FetchEngine, QuotaExhausted, instrumented_fetch
+from .checkpoint_store import CheckpointStore
+from .record_batch import ARTICLE_SCHEMA, HISTORICAL_ARTICLE_SCHEMA, ArticleBatchBuilder
 
-load_dotenv()
+# Query parameters of the historical search other than the category and dates
+HISTORICAL_QUERY = "language=en&number=100&source-country=us"
 
 class WorldNewsAPI:
 
-    WORLD_NEWS_API = os.getenv("WORLD_NEWS_API")
-    HEADERS = {
-        'x-api-key': WORLD_NEWS_API
-    }
+    BASE_URL = "https://api.worldnewsapi.com"
+
+    def __init__(self, base_url: str = BASE_URL, fetch_engine: FetchEngine = None):
+        """ Initialize the api client
+
+        Arguments:
+            - base_url: the url of the api, e.g. a local stub server
+            - fetch_engine: a FetchEngine shared between the clients, a new
+              one with the default concurrency is created on the first
+              request when not given
+        """
+        self.base_url = base_url
+        self._fetch_engine = fetch_engine
+        self._headers = None
+
+    @property
+    def fetch_engine(self) -> FetchEngine:
+        """ The FetchEngine of the client, created on the first request """
+        if self._fetch_engine is None:
+            self._fetch_engine = FetchEngine()
+        return self._fetch_engine
+
+    @property
+    def headers(self) -> dict:
+        """ The headers of the requests, the api key is read on the first
+        request so the jobs which never call the api need no key """
+        if self._headers is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self._headers = {'x-api-key': os.getenv("WORLD_NEWS_API")}
+        return self._headers
+
     def _format_articles_into_list(self, top_news: dict):
         """ Converts the json from the worldnewsapi.org into the list.
 
@@ -73,6 +108,7 @@ class WorldNewsAPI:
                    article_content, category, sentiment)
 
 
+    @instrumented_fetch("worldnewsapi_realtime")
     def retrieve_real_time_data(self,
                          country_codes: list,
                          language_code: str = "en") -> pd.DataFrame:
@@ -88,101 +124,133 @@ class WorldNewsAPI:
             - pd.Dataframe: A pandas Dataframe with the latest news information
 
         """
-        # Create the default pandas dataframe with the features
-        df = pd.DataFrame(columns=["source_id", "source_name", "author_name", "article_title",
-                 "article_description","article_urlToImage","article_publishedAt", "article_content"])
+        # Collect the articles of all the countries into column buffers
+        batch = ArticleBatchBuilder(ARTICLE_SCHEMA)
         # Get the current date in YYYY-MM-DD format
         current_date = datetime.datetime.today().strftime("%Y-%m-%d")
         try:
-            # Retrieval of data for specific country
-            for country_code in country_codes:
-                url = f"https://api.worldnewsapi.com/top-news?source-country={country_code}&language={language_code}&date={current_date}"
-                # Make the api call the get the real time news data
-                response = requests.get(url, headers=self.HEADERS, timeout=10)
+            # Retrieval of data for all the countries concurrently
+            responses = self.fetch_engine.get_many([
+                {"url": f"{self.base_url}/top-news?source-country={country_code}"
+                        f"&language={language_code}&date={current_date}",
+                 "headers": self.headers}
+                for country_code in country_codes])
+            for response in responses:
                 # Whether the response is successful
-                if response.status_code == 200:
+                if response is not None and response.status_code == 200:
                     # news data in json format
                     data = response.json()
                     top_news = data.get("top_news", [])
-                    # articles from the api are converted to the list
-                    converted_articles = list(self._format_articles_into_list(top_news))
-                    # Create a new Dataframe with converted list
-                    new_df = pd.DataFrame(data=converted_articles, 
-                            columns=["source_id", "source_name", "author_name", "article_title",
-                            "article_description","article_urlToImage","article_publishedAt",
-                             "article_content"])
-                    # Concat the default dataframe with the new dataframe
-                    df = pd.concat([df, new_df])
+                    # articles from the api are appended to the buffers
+                    batch.extend(self._format_articles_into_list(top_news))
         except Exception as oops:
             print(f"Error occurred while retrieval of real time data as {oops}")
-        return df
+        return batch.to_dataframe()
 
+    @instrumented_fetch("worldnewsapi_historical")
     def retrieve_historical_data(self,
                                  categories: list = ["politics"],
                                  start_date: str = "2024-10-05",
                                  end_date: str = "2024-11-05",
                                  offset: int = 0,
-                                 n_post = None
-                                 ) -> bool:
-        """ Retrieve Historical Data from for the category and date given"""
-        df = pd.DataFrame(columns=["source_id", "source_name", "author_name", "article_title",
-                                   "article_description", "article_urlToImage","article_publishedAt",
-                                   "article_content", "article_category", "article_sentiment"])
+                                 n_post = None,
+                                 checkpoint_store: CheckpointStore = None
+                                 ) -> pd.DataFrame:
+        """ Retrieve Historical Data from for the category and date given
+
+        With a checkpoint_store, the fetch of a category resumes from the
+        offset at which the previous run stopped, or only asks for the
+        articles published after the latest publish_date already ingested.
+        The progress of the fetch is only staged in the store: the caller
+        commits it once the articles returned are stored, or discards it, so
+        a run whose articles were lost fetches them again.
+        """
+        batch = ArticleBatchBuilder(HISTORICAL_ARTICLE_SCHEMA)
         for category in categories:
             print("Scraping the data of the current category ", category)
-            url = "https://api.worldnewsapi.com/search-news?"
-            url += f"categories={category}&language=en&earliest-publish-date={start_date}"
-            url += f"&number=100&source-country=us&latest-publish-date={end_date}"
+            category_start_date, category_offset = start_date, offset
+            if checkpoint_store is not None:
+                category_start_date, category_offset = checkpoint_store.resume_point(
+                    category, HISTORICAL_QUERY, start_date, end_date)
+            url = f"{self.base_url}/search-news?"
+            url += f"categories={category}&{HISTORICAL_QUERY}"
+            url += f"&earliest-publish-date={category_start_date}&latest-publish-date={end_date}"
+            if checkpoint_store is not None:
+                # A stable order keeps the offsets valid between the runs
+                url += "&sort=publish-time&sort-direction=ASC"
 
-            response = requests.get(url, headers=self.HEADERS)
-            if response.status_code != 200 or float(response.headers.get("X-API-Quota-Left", 0)) <= 2:
+            def save_checkpoint(next_offset: int, complete: bool):
+                if checkpoint_store is not None:
+                    checkpoint_store.stage(category, HISTORICAL_QUERY, start_date, end_date,
+                                           next_offset, watermark, complete,
+                                           query_start_date=category_start_date)
+
+            watermark = None
+            try:
+                response = self.fetch_engine.get(url + f"&offset={category_offset}",
+                                                 headers=self.headers)
+            except QuotaExhausted as oops:
+                print(f"Error: {oops}")
+                save_checkpoint(category_offset, complete=False)
+                return batch.to_dataframe()
+            if response.status_code != 200:
                 print(f"Error: {response.status_code}")
-                return df
+                save_checkpoint(category_offset, complete=False)
+                return batch.to_dataframe()
 
             data = response.json()
-            # articles from the api are converted to the list
-            converted_articles = list(self._format_historic_news_into_list(data))
+            # articles from the api are appended to the buffers
+            watermark = self._extend_with_historic_news(batch, data, watermark)
 
             available_posts = data.get("available", 0)
             print(available_posts, " available_posts")
-            if available_posts <= 100:
-                # Create a new Dataframe with converted list
-                new_df = pd.DataFrame(data=converted_articles, 
-                        columns=["source_id", "source_name", "author_name", "article_title",
-                                "article_description", "article_urlToImage","article_publishedAt",
-                                "article_content", "article_category", "article_sentiment"])
-                # Concat the default dataframe with the new dataframe
-                df = pd.concat([df, new_df])
-
-                continue
-
             if (n_post is not None ) and (n_post <= available_posts):
                 available_posts = n_post
             print(f"The available_news is {available_posts}")
-            for num in range(100, int(available_posts), 100):
+            instrumentation.current.gauge("available_posts", available_posts)
+            # The offsets are fetched concurrently, the fetch engine paces the
+            # requests on the responses of the api
+            offsets = list(range(category_offset + 100, int(available_posts), 100))
+            responses = self.fetch_engine.get_many([
+                {"url": url + f"&offset={num}", "headers": self.headers}
+                for num in offsets])
+            for num, response in zip(offsets, responses):
                 print(f"Current offset is {num}")
-                time.sleep(1)
-
-                offset_url = url + f"&offset={num}"
-                response = requests.get(offset_url, headers=self.HEADERS)
-                if response.status_code != 200 or float(response.headers.get("X-API-Quota-Left",0)) <= 2:
-                    print(f"Error: {response.status_code}")
-                    return df
-                
+                if response is None or response.status_code != 200:
+                    print(f"Error: {getattr(response, 'status_code', 'quota exhausted')}")
+                    save_checkpoint(num, complete=False)
+                    return batch.to_dataframe()
+
                 data = response.json()
-                converted_articles = list(self._format_historic_news_into_list(data))
+                watermark = self._extend_with_historic_news(batch, data, watermark)
+
+            save_checkpoint(max(category_offset + 100, int(available_posts)), complete=True)
 
-                new_df = pd.DataFrame(data=converted_articles, 
-                        columns=["source_id", "source_name", "author_name", "article_title",
-                                "article_description", "article_urlToImage","article_publishedAt",
-                                "article_content", "article_category", "article_sentiment"])
-                # Concat the default dataframe with the new dataframe
-                df = pd.concat([df, new_df])
+        return batch.to_dataframe()
 
-        return df
+    def _extend_with_historic_news(self, batch: ArticleBatchBuilder,
+                                   data: dict, watermark: str) -> str:
+        """ Append the articles of a page to the batch and return the latest
+        publish date seen so far
+
+        Arguments:
+            - batch: the ArticleBatchBuilder collecting the articles
+            - data: the json of a page of the search-news endpoint
+            - watermark: the latest publish date seen before the page
+
+        Returns:
+            - str: the latest publish date including the page
+        """
+        rows = list(self._format_historic_news_into_list(data))
+        batch.extend(rows)
+        # article_publishedAt is the seventh value of the row
+        publish_dates = [row[6] for row in rows if row[6]]
+        return max(publish_dates + ([watermark] if watermark else []), default=None)
 
     # data = (my_custom_function())
 if __name__ == "__main__":
+    from ...staging import STAGING_DIR, write_staging
+
     country_codes_based_on_continents = ["ke", "ng", "cn", "in",
                                         "ru", "de", "uk", "ca", "us",
                                         "ir", "jp", "tw", "sg" ]
@@ -199,8 +267,14 @@ if __name__ == "__main__":
     date_30_days_ago = datetime.datetime.today() - datetime.timedelta(days=31)
     date_30_days_ago_str = date_30_days_ago.strftime("%Y-%m-%d")
 
+    checkpoint_store = CheckpointStore(os.path.join(os.path.dirname(STAGING_DIR),
+                                                    "fetch_checkpoints.json"))
     try:
-        realtime_data = world_news_api.retrieve_historical_data(start_date="2024-10-05")
-        realtime_data.to_csv("../data/realtime_world_news.csv")
+        realtime_data = world_news_api.retrieve_historical_data(
+            start_date="2024-10-05", checkpoint_store=checkpoint_store)
+        write_staging(realtime_data, STAGING_DIR, source_api="worldnewsapi")
+        # The fetch resumes after these articles only once they are staged
+        checkpoint_store.commit()
     except Exception as oops:
+        checkpoint_store.discard()
         print(f"Error occurred while storing historical data as {oops}")
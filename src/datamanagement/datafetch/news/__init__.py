@@ -1,2 +1,14 @@
-from .NewsOrgApi import NewsORGAPI
-from .WorldNewsApi import WorldNewsAPI
\ No newline at end of file
+""" The clients of the news apis, imported on first use so that importing
+one of them does not import the other """
+
+__all__ = ["NewsORGAPI", "WorldNewsAPI"]
+
+
+def __getattr__(name):
+    if name == "NewsORGAPI":
+        from .NewsOrgApi import NewsORGAPI
+        return NewsORGAPI
+    if name == "WorldNewsAPI":
+        from .WorldNewsApi import WorldNewsAPI
+        return WorldNewsAPI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,134 @@
+""" A checkpoint store of the historical fetch of the news apis.
+
+For every category and query the store records the window fetched, the next
+offset to fetch and the latest publish date already ingested. A run which
+stopped early (quota guard, failed page) is resumed from its offset, and a
+run after a complete one only asks for the articles published since the
+watermark.
+
+The progress of a fetch is staged and only written by commit once its
+articles are stored, so a run which fails to store them fetches them again.
+"""
+import json
+import os
+
+
+class CheckpointStore:
+    """ Persist the fetch progress per category and query in a JSON file
+
+    Arguments:
+        - path: the path of the JSON file holding the checkpoints
+    """
+
+    def __init__(self, path: str = "fetch_checkpoints.json"):
+        self.path = path
+        self.checkpoints = {}
+        self.pending = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.checkpoints = json.load(file)
+
+    @staticmethod
+    def _key(category: str, query: str) -> str:
+        return f"{category}|{query}"
+
+    def get(self, category: str, query: str) -> dict:
+        """ Return the checkpoint of the category and query, None if unknown
+
+        Arguments:
+            - category: the category fetched
+            - query: the query parameters of the fetch other than the dates
+        """
+        return self.checkpoints.get(self._key(category, query))
+
+    def stage(self, category: str, query: str, start_date: str, end_date: str,
+              next_offset: int, watermark: str, complete: bool, query_start_date: str = None):
+        """ Record the progress of a fetch whose articles are not stored yet,
+        it is written to disk by commit once they are
+
+        Arguments:
+            - category: the category fetched
+            - query: the query parameters of the fetch other than the dates
+            - start_date: the earliest publish date requested
+            - end_date: the latest publish date of the window fetched
+            - next_offset: the offset of the next page to fetch
+            - watermark: the latest publish date ingested so far
+            - complete: whether all the pages of the window were fetched
+            - query_start_date: the earliest publish date of the query the
+              offsets belong to, e.g. the watermark resumed from, start_date
+              when not given
+        """
+        previous = self.get(category, query) or {}
+        if previous.get("start_date") and previous["start_date"] <= start_date:
+            # The window of the previous runs is extended, not replaced
+            start_date = previous["start_date"]
+        watermark = max(filter(None, [watermark, previous.get("watermark")]), default=None)
+        self.pending[self._key(category, query)] = {
+            "start_date": start_date,
+            "query_start_date": query_start_date or start_date,
+            "end_date": end_date,
+            "next_offset": next_offset,
+            "watermark": watermark,
+            "complete": complete,
+        }
+
+    def commit(self):
+        """ Write the progress staged since the last commit, once the
+        articles fetched are stored """
+        if not self.pending:
+            return
+        self.checkpoints.update(self.pending)
+        self.pending = {}
+        # Write to a temporary file first so a crash never leaves a
+        # truncated store behind
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self.checkpoints, file, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def discard(self):
+        """ Forget the progress staged since the last commit, e.g. when the
+        articles fetched could not be stored """
+        self.pending = {}
+
+    def save(self, category: str, query: str, start_date: str, end_date: str,
+             next_offset: int, watermark: str, complete: bool, query_start_date: str = None):
+        """ Record the progress of the fetch and write the store to disk
+
+        Arguments:
+            - category, query, start_date, end_date, next_offset, watermark,
+              complete, query_start_date: as in stage
+        """
+        self.stage(category, query, start_date, end_date, next_offset, watermark, complete,
+                   query_start_date)
+        self.commit()
+
+    def resume_point(self, category: str, query: str,
+                     start_date: str, end_date: str) -> tuple:
+        """ Return the window start and the offset at which the fetch resumes
+
+        The offset and the watermark are only used when the window of the
+        checkpoint covers start_date, a backfill of an earlier window is
+        fetched from its start.
+
+        Arguments:
+            - category: the category fetched
+            - query: the query parameters of the fetch other than the dates
+            - start_date: the earliest publish date requested
+            - end_date: the latest publish date requested
+
+        Returns:
+            - tuple: (earliest publish date, offset) of the fetch
+        """
+        checkpoint = self.get(category, query)
+        if checkpoint is None or checkpoint["start_date"] > start_date:
+            return start_date, 0
+        if not checkpoint["complete"] and checkpoint["end_date"] == end_date:
+            # Resume the interrupted fetch of the same window
+            return checkpoint.get("query_start_date", checkpoint["start_date"]), \
+                checkpoint["next_offset"]
+        watermark = checkpoint.get("watermark")
+        if watermark and watermark > start_date:
+            # Only the articles published after the last ingested article
+            return watermark, 0
+        return start_date, 0
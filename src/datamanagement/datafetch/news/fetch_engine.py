@@ -0,0 +1,198 @@
+""" A concurrent fetch engine shared by the news api clients.
+
+The requests go through a single requests.Session whose keep-alive connection
+pool is sized to the number of workers. The engine is rate limited by the
+responses of the api: a 429 or 5xx pauses every worker for the Retry-After
+period (or an exponential backoff) and no request is sent once the
+X-API-Quota-Left header falls to the minimum quota.
+"""
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ...instrumentation import instrumentation
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class QuotaExhausted(Exception):
+    """ Raised when the api quota left has reached the minimum quota """
+
+
+class RateLimiter:
+    """ Pause all the workers after a throttled response and track the quota
+    reported by the api
+
+    Arguments:
+        - min_quota: the quota left at which no request is sent anymore
+    """
+
+    def __init__(self, min_quota: float = 2):
+        self.min_quota = min_quota
+        self.quota_left = None
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ Block until the pause is over, raise QuotaExhausted when the quota
+        has reached the minimum quota """
+        if self.quota_exhausted:
+            raise QuotaExhausted(f"Quota left is {self.quota_left}")
+        with self.lock:
+            delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """ Pause all the workers for the given seconds
+
+        Arguments:
+            - seconds: the time to wait before the next request
+        """
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def update(self, response: requests.Response):
+        """ Record the quota left reported in the headers of the response
+
+        Arguments:
+            - response: a response of the api
+        """
+        quota_left = response.headers.get("X-API-Quota-Left")
+        if quota_left is None:
+            return
+        with self.lock:
+            self.quota_left = float(quota_left)
+
+    @property
+    def quota_exhausted(self) -> bool:
+        return self.quota_left is not None and self.quota_left <= self.min_quota
+
+
+class FetchEngine:
+    """ Fetch urls concurrently over a shared connection pool
+
+    Arguments:
+        - max_workers: the maximum number of requests in flight
+        - max_retries: the number of retries of a throttled or failed request
+        - backoff_factor: the base of the exponential backoff in seconds
+        - min_quota: the quota left at which no request is sent anymore
+        - timeout: the timeout of a single request in seconds
+    """
+
+    def __init__(self, max_workers: int = 8, max_retries: int = 3,
+                 backoff_factor: float = 1.0, min_quota: float = 2,
+                 timeout: float = 10):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(min_quota=min_quota)
+        self.n_requests = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """ Return the delay before retrying, Retry-After has precedence over
+        the exponential backoff """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_factor * 2 ** attempt
+
+    def get(self, url: str, headers: dict = None, params: dict = None) -> requests.Response:
+        """ Send a GET request, retrying the throttled and failed requests
+
+        Arguments:
+            - url: the url to fetch
+            - headers: the headers of the request
+            - params: the query parameters of the request
+
+        Returns:
+            - requests.Response: the last response received
+        """
+        response = None
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.get(url, headers=headers, params=params,
+                                            timeout=self.timeout)
+            except requests.RequestException as oops:
+                if attempt == self.max_retries:
+                    raise
+                print(f"Error occurred while fetching {url} as {oops}")
+                self.rate_limiter.pause(self._retry_delay(None, attempt))
+                continue
+            finally:
+                # The workers count their requests under the lock of the
+                # rate limiter they share
+                with self.rate_limiter.lock:
+                    self.n_requests += 1
+
+            self.rate_limiter.update(response)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            self.rate_limiter.pause(self._retry_delay(response, attempt))
+        return response
+
+    def get_many(self, requests_arguments: list) -> list:
+        """ Send the GET requests concurrently
+
+        Arguments:
+            - requests_arguments: a list of dicts of the arguments of get
+
+        Returns:
+            - list: the responses in the order of the requests, None for a
+              request not sent because the quota was exhausted
+        """
+        def get_or_none(arguments: dict):
+            try:
+                return self.get(**arguments)
+            except QuotaExhausted as oops:
+                print(f"Error occurred while fetching {arguments.get('url')} as {oops}")
+                return None
+
+        return list(self.executor.map(get_or_none, requests_arguments))
+
+    @property
+    def quota_left(self):
+        return self.rate_limiter.quota_left
+
+    def close(self):
+        """ Shut down the workers and the connection pool """
+        self.executor.shutdown()
+        self.session.close()
+
+
+def instrumented_fetch(stage: str):
+    """ Decorate a retrieve method of a news api so that every call is
+    measured, with the api calls made and the quota remaining
+
+    Arguments:
+        - stage: the name of the stage
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not instrumentation.enabled:
+                return method(self, *args, **kwargs)
+            with instrumentation.stage(stage) as record:
+                n_requests = self.fetch_engine.n_requests
+                df = method(self, *args, **kwargs)
+                record.rows_out = df.shape[0]
+                record.count("api_calls", self.fetch_engine.n_requests - n_requests)
+                record.gauge("api_quota_remaining", self.fetch_engine.quota_left)
+                return df
+        return wrapper
+    return decorator
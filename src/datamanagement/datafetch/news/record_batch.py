@@ -0,0 +1,61 @@
+""" A columnar accumulator of the articles fetched from the news apis.
+
+The rows yielded by the _format_*_into_list generators are appended to one
+buffer per column and a single DataFrame with a fixed schema is built at the
+end, instead of concatenating a new DataFrame for every page.
+"""
+from __future__ import annotations
+
+ARTICLE_SCHEMA = {
+    "source_id": "object",
+    "source_name": "object",
+    "author_name": "object",
+    "article_title": "object",
+    "article_description": "object",
+    "article_urlToImage": "object",
+    "article_publishedAt": "object",
+    "article_content": "object",
+}
+
+HISTORICAL_ARTICLE_SCHEMA = dict(ARTICLE_SCHEMA,
+                                 article_category="object",
+                                 article_sentiment="object")
+
+
+class ArticleBatchBuilder:
+    """ Collect the article rows into column buffers
+
+    Arguments:
+        - schema: a dict of the column names and their dtypes, in the order
+          of the values of the rows
+    """
+
+    def __init__(self, schema: dict = ARTICLE_SCHEMA):
+        self.schema = schema
+        self.buffers = {column: [] for column in schema}
+
+    def extend(self, rows):
+        """ Append the rows to the column buffers
+
+        Arguments:
+            - rows: an iterable of tuples in the order of the schema
+        """
+        buffers = list(self.buffers.values())
+        for row in rows:
+            for buffer, value in zip(buffers, row):
+                buffer.append(value)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.buffers.values()), []))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ Build the DataFrame of all the rows collected
+
+        Returns:
+            - pd.DataFrame: a dataframe with the columns and dtypes of the schema
+        """
+        # Imported on the first batch built, the clients start without pandas
+        import pandas as pd
+        return pd.DataFrame({column: pd.Series(buffer, dtype=self.schema[column])
+                             for column, buffer in self.buffers.items()},
+                            columns=list(self.schema))
@@ -0,0 +1,106 @@
+""" Multi-core CPU inference for the models in model_configuration.
+
+The texts are split into chunks which are classified by a pool of worker
+processes. Every worker limits the intra-op threads of torch to its share of
+the cores and loads each configured model once, on its first task.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .data_transforming import classify_texts
+from .inference_engines import split_model_configuration
+from .model_registry import ModelRegistry
+
+# Models loaded by the current worker process, keyed on the feature
+_WORKER_REGISTRY = ModelRegistry()
+_WORKER_CONFIGURATION = {}
+
+
+def _initialize_worker(model_configuration: dict, threads_per_worker: int):
+    """ Set the torch threads of the worker and keep the model configuration
+
+    Arguments:
+        - model_configuration: a dict in which the key stats the feature to be
+            extracted values of model parameters in a dict
+        - threads_per_worker: the number of intra-op threads of torch
+    """
+    import torch
+
+    torch.set_num_threads(threads_per_worker)
+    torch.set_num_interop_threads(1)
+    _WORKER_CONFIGURATION.update(model_configuration)
+
+
+def _classify_chunk(key: str, texts: list) -> list:
+    """ Classify the texts with the model of the feature in a worker process
+
+    Arguments:
+        - key: a key of the model_configuration
+        - texts: a list of texts to generate the model response
+
+    Returns:
+        - list: the labels in the same order as the given texts
+    """
+    value = dict(_WORKER_CONFIGURATION[key], device=-1)
+    _, batch_size = split_model_configuration(value)
+    return classify_texts(_WORKER_REGISTRY.get(key, value), texts, batch_size)
+
+
+class CPUInferencePool:
+    """ A pool of worker processes classifying the texts on the CPU
+
+    Arguments:
+        - model_configuration: a dict in which the key stats the feature to be
+            extracted values of model parameters in a dict
+        - n_workers: the number of worker processes, all the cores by default
+        - threads_per_worker: the intra-op threads of torch in each worker,
+            the cores are shared evenly between the workers by default
+        - chunks_per_worker: the number of chunks given to each worker per
+            call, more chunks balance the load of uneven texts
+    """
+
+    def __init__(self, model_configuration: dict, n_workers: int = None,
+                 threads_per_worker: int = None, chunks_per_worker: int = 4):
+        n_cores = os.cpu_count() or 1
+        self.n_workers = n_workers or n_cores
+        self.threads_per_worker = threads_per_worker or max(1, n_cores // self.n_workers)
+        self.chunks_per_worker = chunks_per_worker
+        # torch is not fork safe once its thread pool has started
+        self.executor = ProcessPoolExecutor(
+                            max_workers=self.n_workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                            initializer=_initialize_worker,
+                            initargs=(model_configuration, self.threads_per_worker))
+
+    def classify(self, key: str, texts: list) -> list:
+        """ Classify the texts with the model of the feature across the workers
+
+        Arguments:
+            - key: a key of the model_configuration
+            - texts: a list of texts to generate the model response
+
+        Returns:
+            - list: the labels in the same order as the given texts
+        """
+        if not texts:
+            return []
+        n_chunks = self.n_workers * self.chunks_per_worker
+        chunk_size = max(1, math.ceil(len(texts) / n_chunks))
+        futures = [self.executor.submit(_classify_chunk, key, texts[start:start + chunk_size])
+                   for start in range(0, len(texts), chunk_size)]
+        labels = []
+        for future in futures:
+            labels.extend(future.result())
+        return labels
+
+    def close(self):
+        """ Shut down the worker processes """
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
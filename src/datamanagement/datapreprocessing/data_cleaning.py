@@ -1,32 +1,102 @@
 import pandas as pd
 
+from ..instrumentation import instrumented
+
 # Load Historical and Real-time News Data
 # historical_news_data = pd.read_csv("../data/historical_news_data.csv")
 #realtime_news_data = pd.read_csv("../data/v1-realtime_data-news-api-2024-10-18.csv")
 
+# Explicit dtypes of the cleaned articles: the low-cardinality fields are
+# categoricals, the texts Arrow-backed strings and the publish time a real
+# UTC datetime
+CLEANED_SCHEMA = {
+    "source_id": "category",
+    "source_name": "category",
+    "author_name": "category",
+    "article_category": "category",
+    "article_title": "string[pyarrow]",
+    "article_description": "string[pyarrow]",
+    "article_urlToImage": "string[pyarrow]",
+    "article_content": "string[pyarrow]",
+    "article_publishedAt": "datetime64[ns, UTC]",
+    "article_sentiment": "float32",
+}
+
+# Values replacing the missing ones
+FILL_VALUES = {
+    "author_name": "Unknown",
+    "article_content": "No content available",
+    "source_id": "No Information Available",
+    "article_description": "No Information Available",
+    "article_urlToImage": "No Information Available",
+}
+
+# Text columns whose leading/trailing spaces are removed
+STRIPPED_COLUMNS = ["author_name", "article_title", "article_description"]
+
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    """ Return the memory used by the DataFrame, strings included, in MB """
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def _clean_column(series: pd.Series, column: str) -> pd.Series:
+    """ Strip, fill and convert a column to its dtype of CLEANED_SCHEMA
+
+    The strings are converted to Arrow first, so the strip and the fill
+    run vectorized on the Arrow buffers before the categoricals are built.
+    """
+    dtype = CLEANED_SCHEMA[column]
+    if dtype == "datetime64[ns, UTC]":
+        return pd.to_datetime(series, errors="coerce", utc=True, format="ISO8601")
+    if dtype == "float32":
+        return pd.to_numeric(series, errors="coerce").astype("float32")
+    series = series.astype("string[pyarrow]")
+    if column in STRIPPED_COLUMNS:
+        series = series.str.strip()
+    if column in FILL_VALUES:
+        series = series.fillna(FILL_VALUES[column])
+    return series.astype(dtype) if dtype == "category" else series
+
+
 # Function to clean Historical News Data
-def clean_historical_news(df):
-    # Drop rows where all values are missing
-    df.dropna(how='all', inplace=True)
-    
-    # replacing missing author names with "unknown"
-    df['author_name'].fillna('Unknown', inplace=True)
-    df['article_content'].fillna('No content available', inplace=True)
-    
-    # formatting the date column to datetimetype
-    df['article_publishedAt'] = pd.to_datetime(df['article_publishedAt'], errors='coerce')
-    
-    # dropping any rows with invalid dates
-    df.dropna(subset=['article_publishedAt'], inplace=True)
-    
-    df[["source_id", "article_description", "article_urlToImage"]] = \
-        df[["source_id", "article_description", "article_urlToImage"]]\
-            .fillna("No Information Available")
-    # removing leading/trailing spaces from strings
-    df['author_name'] = df['author_name'].str.strip()
-    df['article_title'] = df['article_title'].str.strip()
-    df['article_description'] = df['article_description'].str.strip()
-    return df
+@instrumented("clean")
+def clean_historical_news(df: pd.DataFrame, report_memory: bool = False) -> pd.DataFrame:
+    """ Clean the historical news into the dtypes of CLEANED_SCHEMA
+
+    The rows without any value or without a valid publish time are dropped,
+    the missing values filled and the texts stripped. Every column is
+    converted once into a new DataFrame, the input DataFrame is left as is.
+
+    Arguments:
+        - df: a pandas DataFrame of the fetched articles
+        - report_memory: whether to print the memory used before and after
+
+    Returns:
+        - pd.DataFrame: the cleaned articles
+    """
+    published_at = _clean_column(df["article_publishedAt"], "article_publishedAt")
+    # Rows without any value have no publish time either
+    keep = published_at.notna().to_numpy()
+    if not keep.all():
+        df = df.loc[keep]
+        published_at = published_at.loc[keep]
+
+    columns = {}
+    for column in df.columns:
+        if column == "article_publishedAt":
+            columns[column] = published_at
+        elif column in CLEANED_SCHEMA:
+            columns[column] = _clean_column(df[column], column)
+        else:
+            columns[column] = df[column]
+    cleaned = pd.DataFrame(columns, index=df.index, copy=False)
+
+    if report_memory:
+        before, after = memory_usage_mb(df), memory_usage_mb(cleaned)
+        print(f"Memory used before cleaning: {before:.2f} MB, "
+              f"after: {after:.2f} MB ({after / before:.0%})")
+    return cleaned
 
 # Function to clean Real-time News Data
 # def clean_realtime_news(df):
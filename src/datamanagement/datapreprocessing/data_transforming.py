@@ -1,129 +1,265 @@
 import pandas as pd
 from collections import Counter
 import os
-import gc
-import torch
-from transformers import pipeline
-import spacy
 from dotenv import load_dotenv
+from ..instrumentation import instrumentation, instrumented
+from .inference_cache import InferenceCache
+from .inference_engines import split_model_configuration
+from .model_registry import ModelRegistry, default_registry
 
 load_dotenv()
 os.environ['CUDA_LAUNCH_BLOCKING'] = '1'
+
+# Components of en_core_web_sm which are not needed to count the part of
+# speech (tagger, attribute_ruler) and the organizations (ner)
+SPACY_DISABLED_COMPONENTS = ["parser", "lemmatizer"]
+
+
+def _extract_label(results) -> str:
+    """ Extract the label from the response of a text-classification pipeline
+
+    Arguments:
+        - results: a list of dicts (single text) or a dict (batched text)
+
+    Returns:
+        - str: the label predicted by the model
+    """
+    if isinstance(results, dict):
+        results = [results]
+    if len(results) <= 0:
+        return " "
+
+    try:
+        label = results[0].get("label")
+    except Exception as oops:
+        print(f"Error occurred while retrieve_model_response as {oops}")
+        label = "None"
+    return label
+
+
+def retrieve_labels_in_batches(pipe, texts: list, batch_size: int) -> list:
+    """ Generate the model labels for the given texts in length bucketed
+    batches and return them in the original order
+
+    The texts are sorted on their length so that every batch holds texts of
+    similar size and the padding added by the tokenizer stays small.
+
+    Arguments:
+        - pipe: a transformers pipeline used to classify the texts
+        - texts: a list of texts to generate the model response
+        - batch_size: the number of texts passed in a single forward pass
+
+    Returns:
+        - list: the labels in the same order as the given texts
+    """
+    texts = [text if isinstance(text, str) else " " for text in texts]
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+    labels = ["None"] * len(texts)
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        results = pipe([texts[index] for index in bucket], batch_size=batch_size)
+        for index, result in zip(bucket, results):
+            labels[index] = _extract_label(result)
+    return labels
+
+
+def retrieve_model_response(pipe, text: str) -> str:
+    """ Generate the model response from the given text and return result
+    generated
+
+    Arguments:
+
+        - pipe: a transformers pipeline used to classify the text
+        - text: a text to generate the model response
+
+    Returns:
+
+        - str: a response of the model generated
+
+    """
+    if not isinstance(text, str):
+        text = " "
+    if text is None:
+        text = " "
+    return _extract_label(pipe(text))
+
+
+def classify_texts(pipe, texts: list, batch_size: int = None) -> list:
+    """ Generate the labels for the given texts one by one or in batches
+
+    Arguments:
+        - pipe: a transformers pipeline used to classify the texts
+        - texts: a list of texts to generate the model response
+        - batch_size: the number of texts in a batch, None for one by one
+
+    Returns:
+        - list: the labels in the same order as the given texts
+    """
+    if batch_size:
+        return retrieve_labels_in_batches(pipe, texts, batch_size)
+    return [retrieve_model_response(pipe, text) for text in texts]
+
+
+@instrumented("model_features", rows_argument="df")
 def create_features_from_pretrained_models(
                         model_configuration: dict,
                         df: pd.DataFrame,
-                        columns: list
+                        columns: list,
+                        cache: InferenceCache = None,
+                        inference_pool=None,
+                        registry: ModelRegistry = None,
+                        raise_errors: bool = False
                         ) -> pd.DataFrame:
     """ Generate features from the pretrained models for the specified columns
     in the given dataframe and return DataFrame
 
     Arguments:
         - model_configuration: a dict in which the key stats the feature to be
-            extracted values of model parameters in a dict
+            extracted values of model parameters in a dict. An optional
+            "batch_size" in the model parameters enables batched inference
+            and an optional "engine" selects the quantized or onnx engine
         - df: a pandas.DataFrame on which the data is stored
         - columns: the features on which the models to be used
+        - cache: an optional InferenceCache, only the texts missing from the
+            cache are given to the model
+        - inference_pool: an optional CPUInferencePool or InferenceClient, the
+            texts are then classified across its worker processes or by the
+            resident inference server and no model is loaded in this process
+        - registry: the ModelRegistry keeping the pipelines resident, the
+            registry shared by the process by default
+        - raise_errors: re-raise the error of a failed feature column, e.g.
+            so a pipeline chunk fails instead of being loaded with "None"
+            labels, otherwise the error is printed, the column keeps "None"
+            and the other features are still generated
 
     Returns:
         - pd.DataFrame: A dataframe with updated features
     """
-    def retrieve_model_response(text: str) -> str:
-        """ Generate the model response from the given text and return result
-        generated
+    if registry is None:
+        registry = default_registry
 
-        Arguments:
-
-            - text: a text to generate the model response
-
-        Returns:
-
-            - str: a response of the model generated
-
-        """
-        if not isinstance(text, str):
-            text = " "
-        if text is None:
-            text = " "
-        results = pipe(text)
-        if len(results) <= 0:
-            return " "
-
-        try:
-            label = results[0].get("label")
-        except Exception as oops:
-            print(f"Error occurred while retrieve_model_response as {oops}")
-            label = "None"
-        return label
-
-    # All the features to be used
+    # Initiate all the features with the None, in the order of the columns
     for column in columns:
-        # Model configuration with model parameters
-        for key, value in model_configuration.items():
+        for key in model_configuration:
+            df[f"{column}_{key}"] = "None"
+
+    # Model configuration with model parameters, every model classifies all
+    # the columns while it is resident
+    for key, value in model_configuration.items():
+        for column in columns:
             # Prefix to be stored as feature in the dataframe
             column_prefix = f"{column}_{key}"
-            # Initiate with the None
-            df[column_prefix] = "None"
             try:
-                # set the model configuration
-                pipe = pipeline(**value)
-                df[column_prefix] = df[column].apply(retrieve_model_response)
-
-                # Delete the unused variables and Empty the cuda cache
-                # to optimize the system
-                del pipe
-                gc.collect()
-                torch.cuda.empty_cache()
+                pipeline_arguments, batch_size = split_model_configuration(value)
+                model = pipeline_arguments.get("model")
+                engine = value.get("engine", "pytorch")
+                revision = pipeline_arguments.get("revision", "main")
+                # Labels of another engine may differ and are cached apart
+                if engine != "pytorch":
+                    revision = f"{revision}+{engine}"
+                texts = df[column].tolist()
+                if cache is not None:
+                    cache.register_model(key, model, revision)
+                    labels = cache.get_many(model, revision, texts)
+                else:
+                    labels = [None] * len(texts)
+
+                missing = [index for index, label in enumerate(labels) if label is None]
+                if missing:
+                    # Repeated texts are classified once
+                    missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+                    instrumentation.current.count("texts_classified", len(missing_texts))
+                    if inference_pool is not None:
+                        missing_labels = inference_pool.classify(key, missing_texts)
+                    else:
+                        pipe = registry.get(key, value)
+                        missing_labels = classify_texts(pipe, missing_texts, batch_size)
+                    classified = dict(zip(missing_texts, missing_labels))
+                    for index in missing:
+                        labels[index] = classified[texts[index]]
+                    if cache is not None:
+                        cache.put_many(model, revision, missing_texts, missing_labels)
+                df[column_prefix] = labels
             except Exception as oops:
-                print(f"error in {df[column_prefix]}")
-                print(f"Error occurred while extracting feature as {oops}")
+                print(f"Error occurred while extracting feature {column_prefix} as {oops}")
+                if raise_errors:
+                    raise
     return df
 
 
+def count_part_of_speech(doc) -> dict:
+    """ Calculates the part of speech for the given parsed text
+
+    Arguments: 
+        - doc: a spacy Doc of the text
+
+    Returns: 
+        - dict: a value counts of part of speech 
+    """
+    return dict(Counter([token.pos_ for token in doc]))
+
+
+def search_all_organization(doc) -> dict:
+    """ Calculates the organization for the given parsed text
+
+    Arguments: 
+        - doc: a spacy Doc of the text
+
+    Returns: 
+        - dict: a value counts of the organizations
+    """
+    return dict(Counter([ent.text for ent in doc.ents if ent.label_ == "ORG"]))
+
+
+def load_spacy_pipeline():
+    """ Load the spacy pipeline of the part of speech and organization counts
+
+    Returns:
+        - spacy.Language: en_core_web_sm without its unused components
+    """
+    import spacy
+
+    return spacy.load("en_core_web_sm", disable=SPACY_DISABLED_COMPONENTS)
+
+
+@instrumented("part_of_speech", rows_argument="df")
 def retrieve_counts_on_part_of_speech(df: pd.DataFrame,
-                                      columns: list) -> pd.DataFrame:
+                                      columns: list,
+                                      batch_size: int = 256,
+                                      n_process: int = 1,
+                                      nlp=None) -> pd.DataFrame:
     """ Retrieve the counts on part of speech of for all the features given 
     dataframe. Return a pandas dataframe with the updated features of part 
     of speech
+
+    Every distinct text is parsed once through nlp.pipe and both the part of
+    speech and the organization counts are taken from the same Doc.
     
     Arguments: 
         - df: a pandas Dataframe
         - columns: a list of features on which the part of speech is
           to be applied
+        - batch_size: the number of texts buffered by spacy per batch
+        - n_process: the number of processes used by spacy to parse
+        - nlp: a loaded spacy pipeline, e.g. kept by a caller processing
+          many chunks, en_core_web_sm is loaded when not given
 
     Returns: 
         - Dataframe: with updated features of part of speech 
 
     """
-
-    def count_part_of_speech(text: str) -> Counter:
-        """ Calculates the part of speech for the given text
-
-        Arguments: 
-            - text: a str to count the part of speech
-
-        Returns: 
-            - Counter: a value counts of part of speech 
-        """
-        tokens = nlp(str(text))
-        pos_counts = dict(Counter([token.pos_ for token in tokens]))
-        return pos_counts
-
-    def search_all_organization(text: str) -> Counter:
-        """ Calculates the organization for the given text
-
-        Arguments: 
-            - text: a str to count the part of speech
-
-        Returns: 
-            - Counter: a value counts of part of speech 
-        """
-        tokens = nlp(str(text))
-        organizations = dict(Counter([ent.text for ent in tokens.ents if ent.label_ == "ORG"]))
-        return organizations
-
-    nlp = spacy.load("en_core_web_sm")
+    if nlp is None:
+        nlp = load_spacy_pipeline()
     for column in columns:
-        df[f"{column}_pos_counts"] = df[column].apply(count_part_of_speech)
-        df[f"{column}_org_counts"] = df[column].apply(search_all_organization)
+        texts = [str(text) for text in df[column]]
+        # Repeated texts (syndicated headlines, placeholders) are parsed once
+        unique_texts = list(dict.fromkeys(texts))
+        counts = {}
+        for text, doc in zip(unique_texts, nlp.pipe(unique_texts, batch_size=batch_size,
+                                                    n_process=n_process)):
+            counts[text] = (count_part_of_speech(doc), search_all_organization(doc))
+        df[f"{column}_pos_counts"] = [counts[text][0] for text in texts]
+        df[f"{column}_org_counts"] = [counts[text][1] for text in texts]
     return df
 
 
@@ -0,0 +1,205 @@
+""" Near-duplicate detection of the articles before the NLP enrichment.
+
+The same wire story is published by many sources with small edits. Every
+article is fingerprinted with a MinHash signature of the word shingles of
+its title, description and content, the signatures are banded into an LSH
+index to find the candidate pairs, and the pairs whose estimated Jaccard
+similarity reaches the threshold are merged into clusters. The model
+labels are then generated once per cluster representative and copied to the
+other members of the cluster, while the features depending on the exact
+text, such as the part of speech counts, are still computed for every
+distinct text.
+"""
+import hashlib
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from .inference_cache import normalize_text
+
+DEDUP_COLUMNS = ["article_title", "article_description", "article_content"]
+
+# Suffixes of the features counted on the exact text, never copied between
+# the members of a cluster
+TEXT_FEATURE_SUFFIXES = ("_pos_counts", "_org_counts")
+
+# Mersenne prime of the universal hash functions of the permutations
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """ Build the set of word shingles of the text
+
+    Arguments:
+        - text: the text of the article
+        - size: the number of words per shingle
+
+    Returns:
+        - set: the crc32 hashes of the lowercased word shingles
+    """
+    words = normalize_text(text).lower().split()
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[index:index + size]).encode("utf-8"))
+            for index in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """ Compute the MinHash signatures of sets of shingles
+
+    Arguments:
+        - num_perm: the number of permutations, the length of the signatures
+        - seed: the seed of the permutations, fixed so that the signatures
+          are comparable between runs
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = generator.randint(1, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self.b = generator.randint(0, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+
+    def signature(self, hashes: set) -> np.ndarray:
+        """ Return the MinHash signature of the shingle hashes
+
+        Arguments:
+            - hashes: the shingle hashes of a text
+
+        Returns:
+            - np.ndarray: the num_perm minimum hash values
+        """
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % _MERSENNE_PRIME
+        # (a * x + b) mod p for every permutation and shingle, a and x are
+        # below 2 ** 31 so the product fits in 64 bits
+        permuted = (np.outer(values, self.a) + self.b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> tuple:
+    """ Choose the number of bands and rows per band of the LSH index
+
+    The bands and rows are chosen so that the similarity at which a pair
+    becomes a candidate with probability 1/2, about (1 / bands) ** (1 / rows),
+    is the closest to the threshold.
+
+    Arguments:
+        - threshold: the Jaccard similarity of the near-duplicates
+        - num_perm: the length of the signatures
+
+    Returns:
+        - tuple: (bands, rows)
+    """
+    candidates = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)
+                  if num_perm % rows == 0]
+    return min(candidates,
+               key=lambda band_rows: abs((1 / band_rows[0]) ** (1 / band_rows[1]) - threshold))
+
+
+def _find(parents: list, index: int) -> int:
+    """ Return the root of the index in the union-find forest """
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def cluster_near_duplicates(texts: list, threshold: float = 0.8, num_perm: int = 128,
+                            shingle_size: int = 3) -> list:
+    """ Cluster the near-duplicate texts
+
+    Arguments:
+        - texts: the texts to compare
+        - threshold: the minimum estimated Jaccard similarity of the word
+          shingles of two near-duplicates
+        - num_perm: the length of the MinHash signatures
+        - shingle_size: the number of words per shingle
+
+    Returns:
+        - list: for every text, the position of the first text of its cluster
+    """
+    hasher = MinHasher(num_perm)
+    signatures = np.vstack([hasher.signature(shingles(text, shingle_size)) for text in texts]) \
+        if texts else np.empty((0, num_perm), dtype=np.uint64)
+    bands, rows = lsh_parameters(threshold, num_perm)
+
+    parents = list(range(len(texts)))
+    for band in range(bands):
+        buckets = {}
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for index, band_signature in enumerate(band_signatures):
+            buckets.setdefault(band_signature.tobytes(), []).append(index)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root, other_root = _find(parents, first), _find(parents, other)
+                if root == other_root:
+                    continue
+                # The candidate pairs are checked on the whole signature
+                similarity = np.mean(signatures[first] == signatures[other])
+                if similarity >= threshold:
+                    parents[max(root, other_root)] = min(root, other_root)
+    return [_find(parents, index) for index in range(len(texts))]
+
+
+def assign_duplicate_clusters(df: pd.DataFrame, columns: list = DEDUP_COLUMNS,
+                              threshold: float = 0.8, num_perm: int = 128) -> pd.DataFrame:
+    """ Assign the articles to their cluster of near-duplicates
+
+    Two columns are added: duplicate_cluster_id, the hash of the text of the
+    cluster representative, and is_cluster_representative, True for the
+    first article of every cluster.
+
+    Arguments:
+        - df: a pandas DataFrame of cleaned articles
+        - columns: the text columns fingerprinted together
+        - threshold: the minimum estimated Jaccard similarity of the
+          near-duplicates
+        - num_perm: the length of the MinHash signatures
+
+    Returns:
+        - pd.DataFrame: the DataFrame with the cluster columns
+    """
+    texts = [" ".join(normalize_text(value) for value in values)
+             for values in zip(*(df[column].tolist() for column in columns))]
+    representatives = cluster_near_duplicates(texts, threshold, num_perm)
+    cluster_ids = {position: hashlib.sha256(texts[position].encode("utf-8")).hexdigest()
+                   for position in set(representatives)}
+    df["duplicate_cluster_id"] = [cluster_ids[position] for position in representatives]
+    df["is_cluster_representative"] = [position == representative
+                                       for position, representative in enumerate(representatives)]
+    n_clusters = len(cluster_ids)
+    print(f"{df.shape[0]} articles in {n_clusters} clusters of near-duplicates")
+    return df
+
+
+def enrich_cluster_representatives(df: pd.DataFrame, enrich) -> pd.DataFrame:
+    """ Run the enrichment on the cluster representatives only and copy the
+    features to the other members of their cluster
+
+    Only the features shared by near-duplicates, the model labels, must be
+    added by enrich: the members of a cluster differ in their text, so the
+    features counted on the exact text, such as the part of speech and the
+    organization counts, are computed on every article after it, e.g. with
+    retrieve_counts_on_part_of_speech which parses every distinct text once.
+
+    Arguments:
+        - df: a pandas DataFrame with the columns of assign_duplicate_clusters
+        - enrich: a function taking a DataFrame and returning it with new
+          label columns, e.g. create_features_from_pretrained_models
+
+    Returns:
+        - pd.DataFrame: the DataFrame with the labels of every article
+    """
+    representatives = enrich(df.loc[df["is_cluster_representative"]].copy())
+    features = [column for column in representatives.columns if column not in df.columns]
+    text_features = [column for column in features
+                     if column.endswith(TEXT_FEATURE_SUFFIXES)]
+    if text_features:
+        raise ValueError(f"The features {text_features} depend on the exact text and "
+                         f"cannot be copied to the members of a cluster")
+    features_by_cluster = representatives.set_index("duplicate_cluster_id")[features]
+    copied = features_by_cluster.reindex(df["duplicate_cluster_id"])
+    for feature in features:
+        df[feature] = copied[feature].to_numpy()
+    return df
@@ -0,0 +1,216 @@
+""" A persistent cache of the labels generated by the pretrained models.
+
+The labels are stored in a SQLite file and keyed on the model name, the model
+revision and the hash of the normalized text, so an article which is fetched
+again on a later day does not go through the transformer a second time.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+def normalize_text(text) -> str:
+    """ Normalize the text before hashing so that whitespace differences do
+    not create new cache entries
+
+    Arguments:
+        - text: a text given to the model
+
+    Returns:
+        - str: the normalized text
+    """
+    if not isinstance(text, str):
+        return " "
+    return " ".join(text.split())
+
+
+def hash_text(text) -> str:
+    """ Generate the sha256 hash of the normalized text
+
+    Arguments:
+        - text: a text given to the model
+
+    Returns:
+        - str: a hex digest of the normalized text
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class InferenceCache:
+    """ On-disk LRU cache of model labels
+
+    The cache may be used from several threads, e.g. by the model stage of
+    the StageScheduler running on its own thread, the connection is shared
+    and every call holds the lock of the cache. The number of labels is
+    counted when the cache is opened and kept up to date by its writes, so
+    the eviction does not count the table on every put_many.
+
+    Arguments:
+        - db_path: a path of the SQLite file in which the labels are stored
+        - max_entries: the maximum number of labels kept, the least recently
+          used labels are evicted once it is exceeded
+    """
+
+    def __init__(self, db_path: str = "inference_cache.db",
+                 max_entries: int = 1_000_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self._create_tables()
+            # Counted once, then kept up to date by the writes of the cache
+            self.n_entries = self.conn.execute("SELECT COUNT(*) FROM ModelLabel").fetchone()[0]
+
+    def _create_tables(self):
+        """ Create the tables of the cache if they do not exist """
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS ModelLabel (
+                model TEXT,
+                revision TEXT,
+                text_hash TEXT,
+                label TEXT,
+                last_access REAL,
+                PRIMARY KEY (model, revision, text_hash)
+            );
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_model_label_last_access
+            ON ModelLabel (last_access);
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS FeatureModel (
+                feature TEXT PRIMARY KEY,
+                model TEXT,
+                revision TEXT
+            );
+        ''')
+        self.conn.commit()
+
+    def register_model(self, feature: str, model: str, revision: str = "main"):
+        """ Record the model used for the feature and invalidate the labels of
+        the previous model when the model_configuration entry has changed
+
+        Arguments:
+            - feature: a key of the model_configuration
+            - model: the name of the model configured for the feature
+            - revision: the revision of the model
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT model, revision FROM FeatureModel WHERE feature = ?",
+                (feature,)).fetchone()
+            if row is not None and tuple(row) != (model, revision):
+                in_use = self.conn.execute(
+                    '''SELECT COUNT(*) FROM FeatureModel
+                       WHERE feature != ? AND model = ? AND revision = ?''',
+                    (feature, row[0], row[1])).fetchone()[0]
+                if not in_use:
+                    deleted = self.conn.execute(
+                        "DELETE FROM ModelLabel WHERE model = ? AND revision = ?",
+                        (row[0], row[1]))
+                    self.n_entries -= deleted.rowcount
+            self.conn.execute(
+                "INSERT OR REPLACE INTO FeatureModel (feature, model, revision) VALUES (?, ?, ?)",
+                (feature, model, revision))
+            self.conn.commit()
+
+    def get_many(self, model: str, revision: str, texts: list) -> list:
+        """ Retrieve the cached labels for the given texts
+
+        Arguments:
+            - model: the name of the model
+            - revision: the revision of the model
+            - texts: a list of texts
+
+        Returns:
+            - list: the labels in the order of the texts, None for a miss
+        """
+        with self.lock:
+            hashes = [hash_text(text) for text in texts]
+            found = {}
+            unique_hashes = list(set(hashes))
+            # Stay below the SQLite limit on the number of bound parameters
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start + 500]
+                placeholders = ", ".join(["?"] * len(chunk))
+                rows = self.conn.execute(
+                    f'''SELECT text_hash, label FROM ModelLabel
+                        WHERE model = ? AND revision = ? AND text_hash IN ({placeholders})''',
+                    (model, revision, *chunk)).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    '''UPDATE ModelLabel SET last_access = ?
+                       WHERE model = ? AND revision = ? AND text_hash = ?''',
+                    [(now, model, revision, text_hash) for text_hash in found])
+                self.conn.commit()
+
+            labels = [found.get(text_hash) for text_hash in hashes]
+            n_hits = sum(label is not None for label in labels)
+            self.hits += n_hits
+            self.misses += len(labels) - n_hits
+            return labels
+
+    def put_many(self, model: str, revision: str, texts: list, labels: list):
+        """ Store the labels generated for the given texts and evict the least
+        recently used labels beyond max_entries
+
+        Arguments:
+            - model: the name of the model
+            - revision: the revision of the model
+            - texts: a list of texts
+            - labels: a list of labels in the order of the texts
+        """
+        with self.lock:
+            now = time.time()
+            rows = [(model, revision, hash_text(text), label, now)
+                    for text, label in zip(texts, labels)]
+            # The inserted rows are counted apart from the labels replaced
+            inserted = self.conn.executemany(
+                '''INSERT OR IGNORE INTO ModelLabel
+                   (model, revision, text_hash, label, last_access) VALUES (?, ?, ?, ?, ?)''',
+                rows)
+            self.n_entries += inserted.rowcount
+            self.conn.executemany(
+                '''UPDATE ModelLabel SET label = ?, last_access = ?
+                   WHERE model = ? AND revision = ? AND text_hash = ?''',
+                [(label, now, model, revision, text_hash)
+                 for model, revision, text_hash, label, now in rows])
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """ Delete the least recently used labels beyond max_entries """
+        n_excess = self.n_entries - self.max_entries
+        if n_excess > 0:
+            deleted = self.conn.execute(
+                '''DELETE FROM ModelLabel WHERE rowid IN (
+                       SELECT rowid FROM ModelLabel ORDER BY last_access LIMIT ?)''',
+                (n_excess,))
+            self.n_entries -= deleted.rowcount
+
+    def statistics(self) -> dict:
+        """ Report the hit and miss counts of the cache
+
+        Returns:
+            - dict: the hits, misses, hit rate and number of stored labels
+        """
+        with self.lock:
+            n_lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / n_lookups if n_lookups else 0.0,
+                "entries": self.n_entries,
+            }
+
+    def close(self):
+        """ Close the connection to the cache """
+        with self.lock:
+            self.conn.close()
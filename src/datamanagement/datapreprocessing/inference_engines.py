@@ -0,0 +1,136 @@
+""" Inference engines for the text-classification models.
+
+A model_configuration entry selects its engine with the "engine" key:
+
+    - "pytorch": the default fp32 transformers pipeline
+    - "quantized": dynamic int8 quantization of the Linear layers with torch
+    - "onnx": an ONNX Runtime session exported with optimum
+
+The quantized model and the ONNX export are written to MODEL_EXPORT_DIR on
+first use and loaded from there afterwards. Both engines run on the CPU.
+
+torch and transformers are imported on first use, so importing this module
+costs nothing to the jobs which never run a model.
+"""
+import os
+
+ENGINES = ("pytorch", "quantized", "onnx")
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "model_exports")
+
+# Keys of a model_configuration entry that are consumed by this module and
+# must not be forwarded to transformers.pipeline
+PIPELINE_EXCLUDED_KEYS = ("batch_size", "engine")
+
+
+def split_model_configuration(value: dict) -> tuple:
+    """ Separate the pipeline arguments from the execution options of a
+    model_configuration entry
+
+    Arguments:
+        - value: a dict with the model parameters of a single feature
+
+    Returns:
+        - tuple: (pipeline arguments, batch size or None)
+    """
+    pipeline_arguments = {key: parameter for key, parameter in value.items()
+                          if key not in PIPELINE_EXCLUDED_KEYS}
+    return pipeline_arguments, value.get("batch_size")
+
+
+def _export_path(model_name: str, revision: str, engine: str) -> str:
+    """ Build the local path of the exported artifacts of a model
+
+    Arguments:
+        - model_name: the name of the model on the hub
+        - revision: the revision of the model
+        - engine: the engine the model is exported for
+
+    Returns:
+        - str: the directory of the exported model
+    """
+    return os.path.join(MODEL_EXPORT_DIR, engine,
+                        model_name.replace("/", "--"), revision)
+
+
+def _load_quantized_model(model_name: str, revision: str):
+    """ Load the dynamically quantized model, quantizing it on first use
+
+    Arguments:
+        - model_name: the name of the model on the hub
+        - revision: the revision of the model
+
+    Returns:
+        - torch.nn.Module: the model with int8 Linear layers
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    path = os.path.join(_export_path(model_name, revision, "quantized"), "model.pt")
+    if os.path.exists(path):
+        return torch.load(path, weights_only=False)
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(model, path)
+    return model
+
+
+def _load_onnx_model(model_name: str, revision: str):
+    """ Load the ONNX Runtime model, exporting it on first use
+
+    Arguments:
+        - model_name: the name of the model on the hub
+        - revision: the revision of the model
+
+    Returns:
+        - ORTModelForSequenceClassification: the model run by ONNX Runtime
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as oops:
+        raise ImportError("The onnx engine requires optimum[onnxruntime] "
+                          "to be installed") from oops
+
+    path = _export_path(model_name, revision, "onnx")
+    if os.path.exists(path):
+        return ORTModelForSequenceClassification.from_pretrained(path)
+
+    model = ORTModelForSequenceClassification.from_pretrained(
+                model_name, revision=revision, export=True)
+    model.save_pretrained(path)
+    return model
+
+
+def load_pipeline(pipeline_arguments: dict, engine: str = "pytorch"):
+    """ Create the pipeline of a model_configuration entry with its engine
+
+    Arguments:
+        - pipeline_arguments: the arguments given to transformers.pipeline
+        - engine: one of ENGINES
+
+    Returns:
+        - Pipeline: a text-classification pipeline
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, expected one of {ENGINES}")
+    import torch
+    from transformers import AutoTokenizer, pipeline
+
+    if engine == "pytorch":
+        arguments = dict(pipeline_arguments)
+        # Fall back to the CPU on the nodes without a GPU
+        if not torch.cuda.is_available():
+            arguments["device"] = -1
+        return pipeline(**arguments)
+
+    arguments = dict(pipeline_arguments)
+    model_name = arguments.pop("model")
+    revision = arguments.pop("revision", "main")
+    arguments["device"] = -1
+    if engine == "quantized":
+        model = _load_quantized_model(model_name, revision)
+    else:
+        model = _load_onnx_model(model_name, revision)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+    return pipeline(model=model, tokenizer=tokenizer, **arguments)
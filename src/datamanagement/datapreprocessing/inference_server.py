@@ -0,0 +1,339 @@
+""" A long-running local inference server keeping the models resident.
+
+The models of model_configuration are loaded once when the server starts and
+serve every job of the node (realtime top news, historical backfill, ad-hoc
+reprocessing) over a Unix socket or a localhost TCP port. The protocol is a
+JSON object per line:
+
+    request:  {"key": "emotions", "texts": ["...", "..."]}
+    response: {"labels": ["joy", "anger"]} or {"error": "..."}
+
+The requests of every model go through a bounded asyncio queue and are
+gathered into micro-batches: a batch is run once it holds max_batch_size
+texts or once the first request of the batch waited max_latency_ms, so
+concurrent jobs share the forward passes without delaying a lone request
+for long. Every model runs on its own thread, one batch at a time.
+
+Usage (from the src directory):
+
+    python -m datamanagement.datapreprocessing.inference_server --socket /tmp/inference.sock
+
+and in a job, InferenceClient is given to create_features_from_pretrained_models
+as its inference_pool:
+
+    with InferenceClient(socket_path="/tmp/inference.sock") as client:
+        df = create_features_from_pretrained_models(model_configuration, df, columns,
+                                                    inference_pool=client)
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .data_transforming import classify_texts
+from .inference_engines import split_model_configuration
+from .model_registry import ModelRegistry
+
+
+class MicroBatcher:
+    """ Gather the concurrent requests of a model into micro-batches
+
+    Arguments:
+        - classify: a function labelling a list of texts
+        - max_batch_size: the number of texts at which a batch is run
+        - max_latency_ms: the longest a request waits for others to join
+          its batch
+        - max_queue: the number of requests waiting, beyond it the
+          connections wait before their request is queued
+    """
+
+    def __init__(self, classify, max_batch_size: int = 64, max_latency_ms: float = 10,
+                 max_queue: int = 1024):
+        self.classify = classify
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # The batches of a model run one at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.n_batches = 0
+        self.n_texts = 0
+
+    async def submit(self, texts: list) -> list:
+        """ Queue the texts and wait for their labels """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _next_batch(self) -> list:
+        """ Wait for a request and gather the ones arriving within the
+        latency window, up to max_batch_size texts """
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        n_texts = len(batch[0][0])
+        deadline = loop.time() + self.max_latency
+        while n_texts < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            n_texts += len(request[0])
+        return batch
+
+    async def run(self):
+        """ Run the micro-batches until cancelled """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            # The texts repeated across the requests are classified once
+            unique_texts = list(dict.fromkeys(texts))
+            try:
+                labels = await loop.run_in_executor(self.executor, self.classify, unique_texts)
+                labelled = dict(zip(unique_texts, labels))
+            except Exception as oops:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(oops)
+                continue
+            self.n_batches += 1
+            self.n_texts += len(unique_texts)
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result([labelled[text] for text in request_texts])
+
+
+class InferenceServer:
+    """ Serve the models of model_configuration with micro-batching
+
+    Arguments:
+        - model_configuration: a dict in which the key stats the feature to be
+            extracted values of model parameters in a dict
+        - max_batch_size: the number of texts at which a batch is run
+        - max_latency_ms: the longest a request waits for others to join
+          its batch
+        - registry: the ModelRegistry keeping the models resident, a new
+          one by default
+        - classify: an optional function (key, texts) -> labels used
+          instead of the registry, e.g. for the benchmarks
+    """
+
+    def __init__(self, model_configuration: dict, max_batch_size: int = 64,
+                 max_latency_ms: float = 10, registry: ModelRegistry = None, classify=None):
+        self.model_configuration = model_configuration
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.registry = registry or ModelRegistry()
+        self.classify = classify or self._classify_with_registry
+        self.batchers = {}
+        self.server = None
+        self.loop = None
+        self.ready = threading.Event()
+
+    def _classify_with_registry(self, key: str, texts: list) -> list:
+        value = self.model_configuration[key]
+        _, batch_size = split_model_configuration(value)
+        return classify_texts(self.registry.get(key, value), texts,
+                              batch_size or self.max_batch_size)
+
+    def preload(self):
+        """ Load every model of the configuration before serving """
+        if self.classify == self._classify_with_registry:
+            for key, value in self.model_configuration.items():
+                self.registry.get(key, value)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Answer the requests of a connection, one line each """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    batcher = self.batchers.get(request["key"])
+                    if batcher is None:
+                        raise KeyError(f"Unknown model {request['key']}")
+                    response = {"labels": await batcher.submit(request["texts"])}
+                except Exception as oops:
+                    response = {"error": f"{type(oops).__name__}: {oops}"}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str = None, host: str = "127.0.0.1", port: int = 0):
+        """ Serve until cancelled
+
+        Arguments:
+            - socket_path: the path of the Unix socket, a TCP port is used
+              when not given
+            - host: the host of the TCP port
+            - port: the TCP port, any free port when 0
+        """
+        self.loop = asyncio.get_running_loop()
+        for key in self.model_configuration:
+            self.batchers[key] = MicroBatcher(
+                lambda texts, key=key: self.classify(key, texts),
+                self.max_batch_size, self.max_latency_ms)
+        tasks = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        else:
+            self.server = await asyncio.start_server(self._handle, host=host, port=port)
+        self.ready.set()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @property
+    def address(self):
+        """ The socket path or the (host, port) the server listens on """
+        return self.server.sockets[0].getsockname()
+
+    def start_in_thread(self, socket_path: str = None, host: str = "127.0.0.1",
+                        port: int = 0):
+        """ Serve from a background thread and return once it listens
+
+        Returns:
+            - the socket path or the (host, port) of the server
+        """
+        self.preload()
+        self.thread = threading.Thread(
+            target=lambda: asyncio.run(self._serve_until_stopped(socket_path, host, port)),
+            daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self.address
+
+    async def _serve_until_stopped(self, socket_path, host, port):
+        try:
+            await self.serve(socket_path, host, port)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        """ Stop a server started with start_in_thread """
+        if self.server is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.thread.join(timeout=5)
+
+    def statistics(self) -> dict:
+        """ Report the batches run and texts classified per model """
+        return {key: {"batches": batcher.n_batches, "texts": batcher.n_texts,
+                      "mean_batch_size": batcher.n_texts / batcher.n_batches
+                      if batcher.n_batches else 0.0}
+                for key, batcher in self.batchers.items()}
+
+
+class InferenceClient:
+    """ Classify the texts with a running InferenceServer
+
+    It has the classify(key, texts) of CPUInferencePool, so it is given to
+    create_features_from_pretrained_models as its inference_pool. Every
+    thread uses its own connection.
+
+    Arguments:
+        - socket_path: the Unix socket of the server
+        - host: the host of the server when it listens on a TCP port
+        - port: the TCP port of the server
+        - timeout: the seconds a request may take
+    """
+
+    def __init__(self, socket_path: str = None, host: str = "127.0.0.1", port: int = None,
+                 timeout: float = 300):
+        if socket_path is None and port is None:
+            raise ValueError("Either socket_path or port is required")
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            if self.socket_path is not None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+            else:
+                sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            connection = (sock, sock.makefile("rb"))
+            self.local.connection = connection
+        return connection
+
+    def classify(self, key: str, texts: list) -> list:
+        """ Classify the texts with the model of the feature on the server
+
+        Arguments:
+            - key: a key of the model_configuration of the server
+            - texts: a list of texts to generate the model response
+
+        Returns:
+            - list: the labels in the same order as the given texts
+        """
+        if not texts:
+            return []
+        sock, reader = self._connection()
+        request = {"key": key, "texts": [text if isinstance(text, str) else None
+                                         for text in texts]}
+        try:
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            line = reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("The inference server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"The inference server failed as {response['error']}")
+        return response["labels"]
+
+    def close(self):
+        """ Close the connection of the current thread """
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+            self.local.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    from .model_config import model_configuration
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", help="path of the Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-latency-ms", type=float, default=10)
+    arguments = parser.parse_args()
+
+    server = InferenceServer(model_configuration, arguments.max_batch_size,
+                             arguments.max_latency_ms)
+    server.preload()
+    print(f"Serving {', '.join(model_configuration)} on {arguments.socket or arguments.port}")
+    asyncio.run(server.serve(arguments.socket, arguments.host, arguments.port))
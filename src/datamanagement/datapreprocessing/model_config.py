@@ -1,13 +1,16 @@
 SPAM_HAM_LABELS = {"LABEL_1": "ham", "LABEL_0": "spam"}
 SARCASM_LABELS = {"LABEL_1": "sarcastic", "LABEL_0": "not sarcastic" }
 ARGUMENT_LABELS = {"LABEL_1": "non argument", "LABEL_0": "argument" }
+# Besides the transformers.pipeline arguments an entry may set "batch_size"
+# and "engine" ("pytorch", "quantized" or "onnx", see inference_engines.py)
 model_configuration = {
                         "emotions":
                         {
                             "task": "text-classification", 
                             "model": "j-hartmann/emotion-english-distilroberta-base",
                             "device": 0,
-                            "truncation": True
+                            "truncation": True,
+                            "batch_size": 32
                         },
                         # "fake-real":  {
                         #          "task": "text-classification", 
@@ -19,7 +22,8 @@ model_configuration = {
                                  "task": "text-classification",
                                  "model":"facebook/roberta-hate-speech-dynabench-r4-target",
                                  "device": 0,
-                                 "truncation": True
+                                 "truncation": True,
+                                 "batch_size": 32
                             },
                         # "spam-ham": {
                         #          "task": "text-classification",
@@ -56,7 +60,8 @@ model_configuration = {
                                  "model":"alexandrainst/da-offensive-detection-base",
                                  # accurracy 0.86  https://huggingface.co/alexandrainst/da-offensive-detection-base
                                  "device": 0,
-                                 "truncation": True
+                                 "truncation": True,
+                                 "batch_size": 32
                         },
                         # "argument": {
                         #          "task": "text-classification",
@@ -0,0 +1,136 @@
+""" A registry keeping the pipelines of model_configuration resident.
+
+Each configured pipeline is loaded at most once per process and reused for
+every column. When a memory budget is given, the least recently used models
+are evicted once the models loaded exceed it. The load time and the memory
+of every model are recorded.
+"""
+import gc
+import os
+import resource
+import time
+from collections import OrderedDict
+
+import psutil
+
+from ..instrumentation import instrumentation
+from .inference_engines import load_pipeline, split_model_configuration
+
+
+def _current_rss_mb() -> float:
+    """ Return the resident set size of the current process in MB """
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def _peak_rss_mb() -> float:
+    """ Return the peak resident set size of the current process in MB """
+    # ru_maxrss is reported in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+class ModelRegistry:
+    """ Load the pipelines of model_configuration at most once per process
+
+    Arguments:
+        - memory_budget_mb: an optional limit on the memory of the resident
+          models, the least recently used models are evicted beyond it
+    """
+
+    def __init__(self, memory_budget_mb: float = None):
+        self.memory_budget_mb = memory_budget_mb
+        # key -> (model parameters, pipeline), ordered from least recently used
+        self.pipelines = OrderedDict()
+        self.memory_mb = {}
+        self.metrics = {}
+
+    def get(self, key: str, value: dict):
+        """ Return the pipeline of the feature, loading it on first use
+
+        Arguments:
+            - key: a key of the model_configuration
+            - value: the model parameters of the feature
+
+        Returns:
+            - Pipeline: the resident pipeline of the feature
+        """
+        if key in self.pipelines:
+            loaded_value, pipe = self.pipelines[key]
+            if loaded_value == value:
+                self.pipelines.move_to_end(key)
+                return pipe
+            # The model_configuration entry has changed
+            self.evict(key)
+
+        pipeline_arguments, _ = split_model_configuration(value)
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        pipe = load_pipeline(pipeline_arguments, value.get("engine", "pytorch"))
+        load_seconds = time.perf_counter() - start
+        memory_mb = max(_current_rss_mb() - rss_before, 0.0)
+        if pipe.device.type == "cuda":
+            import torch
+            memory_mb += torch.cuda.memory_allocated(pipe.device) / 2 ** 20
+
+        self.pipelines[key] = (dict(value), pipe)
+        self.memory_mb[key] = memory_mb
+        metrics = self.metrics.setdefault(key, {"loads": 0})
+        metrics.update({
+            "model": pipeline_arguments.get("model"),
+            "loads": metrics["loads"] + 1,
+            "load_seconds": load_seconds,
+            "memory_mb": memory_mb,
+            "peak_rss_mb": _peak_rss_mb(),
+        })
+        instrumentation.current.count("model_load_seconds", load_seconds)
+        instrumentation.observe("model_load_seconds", load_seconds, model=key)
+        instrumentation.observe("model_memory_bytes", memory_mb * 2 ** 20, model=key)
+        self._enforce_budget(keep=key)
+        return pipe
+
+    def _enforce_budget(self, keep: str):
+        """ Evict the least recently used models beyond the memory budget
+
+        Arguments:
+            - keep: the key of the model which must stay resident
+        """
+        if self.memory_budget_mb is None:
+            return
+        for key in list(self.pipelines):
+            if sum(self.memory_mb.values()) <= self.memory_budget_mb:
+                break
+            if key != keep:
+                self.evict(key)
+
+    def evict(self, key: str):
+        """ Release the pipeline of the feature
+
+        Arguments:
+            - key: a key of the model_configuration
+        """
+        if key not in self.pipelines:
+            return
+        del self.pipelines[key]
+        del self.memory_mb[key]
+        gc.collect()
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def clear(self):
+        """ Release all the resident pipelines """
+        for key in list(self.pipelines):
+            self.evict(key)
+
+    def statistics(self) -> dict:
+        """ Report the load time and memory recorded for every model
+
+        Returns:
+            - dict: the metrics keyed on the model_configuration key
+        """
+        return {key: dict(metrics, resident=key in self.pipelines)
+                for key, metrics in self.metrics.items()}
+
+
+default_registry = ModelRegistry(
+    memory_budget_mb=float(os.getenv("MODEL_MEMORY_BUDGET_MB"))
+    if os.getenv("MODEL_MEMORY_BUDGET_MB") else None)
@@ -1,49 +1,297 @@
+import json
+import os
 import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from google.oauth2 import service_account
-from pandas_gbq import to_gbq
 
-def load_sqlite_to_bigquery(sqlite_db_path, credentials_path, project_id, dataset_id):
+from ..database.db_load import CHANGE_COLUMN, read_load_state
+from ..instrumentation import instrumentation
+
+# Tables of the SQLite staging database exported to the warehouse
+EXPORT_TABLES = ['FactNews', 'DimArticle', 'DimArticleTitle', 'DimArticleDescription',
+                 'DimArticleContent', 'TextPosCounts', 'TextOrgCounts', 'ArticleDuplicateCluster']
+
+
+class BigQuerySink:
+    """
+    Write the exported chunks into BigQuery tables.
+
+    Args:
+    dataset_id (str): BigQuery dataset ID.
+    project_id (str): Google Cloud project ID.
+    credentials: Google Cloud credentials, the default credentials when None.
+    client: a bigquery.Client (or a fake with load_table_from_dataframe, query
+    and delete_table).
+    job_config_factory: builds the load job config of a write disposition,
+    a bigquery.LoadJobConfig when None. With a client and a factory, the
+    google-cloud-bigquery package is not needed, e.g. for a fake client.
+    """
+
+    def __init__(self, dataset_id, project_id=None, credentials=None, client=None,
+                 job_config_factory=None):
+        self.dataset_id = dataset_id
+        self.job_config_factory = job_config_factory
+        if client is None:
+            # Imported here so that the Parquet exports do not load the client
+            from google.cloud import bigquery
+            client = bigquery.Client(project=project_id, credentials=credentials)
+        self.client = client
+        self.name = f"bigquery:{dataset_id}"
+
+    def _job_config(self, write_disposition):
+        """Return the load job config of the write disposition."""
+        if self.job_config_factory is not None:
+            return self.job_config_factory(write_disposition)
+        from google.cloud import bigquery
+        return bigquery.LoadJobConfig(write_disposition=write_disposition)
+
+    def write(self, table_name, df, replace):
+        """Append the chunk to the table, or replace the table with it."""
+        job_config = self._job_config("WRITE_TRUNCATE" if replace else "WRITE_APPEND")
+        self.client.load_table_from_dataframe(
+            df, f"{self.dataset_id}.{table_name}", job_config=job_config).result()
+
+    def merge(self, table_name, df, keys):
+        """Upsert the chunk into the table on its primary key columns.
+
+        The chunk is loaded into a temporary table which is merged into the
+        table with a MERGE statement, then dropped.
+        """
+        staging_table = f"{self.dataset_id}.{table_name}_merge_{uuid.uuid4().hex}"
+        job_config = self._job_config("WRITE_TRUNCATE")
+        self.client.load_table_from_dataframe(df, staging_table, job_config=job_config).result()
+        try:
+            condition = " AND ".join(f"target.{key} = source.{key}" for key in keys)
+            updates = ", ".join(f"{column} = source.{column}"
+                                for column in df.columns if column not in keys)
+            self.client.query(f"""
+                MERGE `{self.dataset_id}.{table_name}` AS target
+                USING `{staging_table}` AS source
+                ON {condition}
+                WHEN MATCHED THEN UPDATE SET {updates}
+                WHEN NOT MATCHED THEN INSERT ROW
+            """).result()
+        finally:
+            self.client.delete_table(staging_table, not_found_ok=True)
+
+
+class ParquetSink:
+    """
+    Write the exported chunks as Parquet files, one directory per table.
+
+    Args:
+    directory (str): Directory in which the table directories are created.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = f"parquet:{os.path.abspath(directory)}"
+
+    def write(self, table_name, df, replace):
+        """Add the chunk as a new part file, removing the old parts on replace."""
+        table_directory = os.path.join(self.directory, table_name)
+        os.makedirs(table_directory, exist_ok=True)
+        if replace:
+            for file_name in os.listdir(table_directory):
+                os.remove(os.path.join(table_directory, file_name))
+        df.to_parquet(os.path.join(table_directory, f"part-{uuid.uuid4()}.parquet"), index=False)
+
+    def merge(self, table_name, df, keys):
+        """Upsert the chunk into the table on its primary key columns.
+
+        Parquet files cannot be updated in place: the part files holding keys
+        of the chunk are rewritten one at a time without those rows, and the
+        chunk is added as a new part, so only one part is in memory at a time.
+        """
+        table_directory = os.path.join(self.directory, table_name)
+        if os.path.isdir(table_directory):
+            chunk_keys = pd.MultiIndex.from_frame(df[keys])
+            for file_name in sorted(os.listdir(table_directory)):
+                if file_name.startswith("."):
+                    continue
+                path = os.path.join(table_directory, file_name)
+                part_keys = pd.MultiIndex.from_frame(pd.read_parquet(path, columns=keys))
+                replaced = part_keys.isin(chunk_keys)
+                if not replaced.any():
+                    continue
+                if replaced.all():
+                    os.remove(path)
+                    continue
+                kept = pd.read_parquet(path)[~replaced]
+                # Hidden until replaced, the readers skip the dot files
+                temporary_path = os.path.join(table_directory, f".{file_name}.tmp")
+                kept.to_parquet(temporary_path, index=False)
+                os.replace(temporary_path, path)
+        self.write(table_name, df, replace=False)
+
+
+class ExportWatermarks:
+    """
+    Store the export position per sink and table in a JSON file.
+
+    The position of a table is the generation of the load it was exported
+    from and the (change_seq, rowid) of the last row exported. The
+    watermarks are kept outside the SQLite database, so recording them never
+    waits on the read locks of the tables being exported.
+
+    Args:
+    path (str): Path of the JSON file holding the watermarks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.watermarks = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.watermarks = json.load(file)
+
+    def read(self, sink_name, table_name):
+        """Return the position of the table exported to the sink, {} if none."""
+        with self.lock:
+            watermark = self.watermarks.get(sink_name, {}).get(table_name, {})
+            # The rowid watermarks of the previous exports force a full export
+            return watermark if isinstance(watermark, dict) else {}
+
+    def write(self, sink_name, table_name, watermark):
+        """Store the position of the table exported to the sink."""
+        with self.lock:
+            self.watermarks.setdefault(sink_name, {})[table_name] = watermark
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(self.watermarks, file, indent=2)
+            os.replace(temporary_path, self.path)
+
+
+def primary_key(conn, table_name):
+    """Return the primary key columns of a table, in key order."""
+    columns = conn.execute(f'PRAGMA table_info({table_name})').fetchall()
+    return [row[1] for row in sorted(columns, key=lambda row: row[5]) if row[5] > 0]
+
+
+def export_table(sqlite_db_path, table_name, sink, watermarks, chunk_size=50000, full_refresh=False):
+    """
+    Stream the rows of a table changed since its watermark into the sink.
+
+    Every load stamps the rows it inserts or changes with its change_seq
+    (see db_load.start_load), so the rows past the watermark are read in
+    (change_seq, rowid) order and merged into the sink on the primary key.
+    Only one chunk is read at a time (the Parquet merge also holds one part
+    file) and the watermark is stored after every chunk, so an interrupted
+    export resumes after the last chunk written. A table rebuilt
+    by a "replace" load has a new load generation and is exported in full,
+    replacing the table in the sink.
+
+    Returns:
+    int: The number of rows exported.
+    """
+    conn = sqlite3.connect(sqlite_db_path, timeout=30)
+    try:
+        generation, _ = read_load_state(conn)
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table_name})')]
+        keys = primary_key(conn, table_name)
+        watermark = watermarks.read(sink.name, table_name)
+        # Databases loaded before the change sequence existed are exported in full
+        tracked = generation is not None and CHANGE_COLUMN in columns
+        full = full_refresh or not tracked or watermark.get("generation") != generation
+        if full:
+            watermark = {"generation": generation, "change_seq": 0, "rowid": 0}
+        replace = full
+
+        if tracked:
+            query = f'''SELECT rowid AS _export_rowid, * FROM {table_name}
+                        WHERE {CHANGE_COLUMN} > ? OR ({CHANGE_COLUMN} = ? AND rowid > ?)
+                        ORDER BY {CHANGE_COLUMN}, rowid'''
+            params = (watermark["change_seq"], watermark["change_seq"], watermark["rowid"])
+        else:
+            query = f'SELECT rowid AS _export_rowid, * FROM {table_name} ORDER BY rowid'
+            params = ()
+
+        n_rows = 0
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunk_size):
+            if chunk.empty:
+                continue
+            last_row = chunk.iloc[-1]
+            rows = chunk.drop(columns='_export_rowid')
+            if full:
+                # The rows of a full export are distinct, they are appended
+                sink.write(table_name, rows, replace=replace)
+            else:
+                sink.merge(table_name, rows, keys)
+            watermarks.write(sink.name, table_name, {
+                "generation": generation,
+                "change_seq": int(last_row[CHANGE_COLUMN]) if tracked else 0,
+                "rowid": int(last_row['_export_rowid']),
+            })
+            replace = False
+            n_rows += chunk.shape[0]
+
+        if n_rows == 0 and replace:
+            # An empty table still replaces what was exported before
+            sink.write(table_name, pd.DataFrame(columns=columns), replace=True)
+            watermarks.write(sink.name, table_name, watermark)
+        return n_rows
+    finally:
+        conn.close()
+
+
+def export_sqlite(sqlite_db_path, sink, tables=EXPORT_TABLES, chunk_size=50000,
+                  max_workers=4, full_refresh=False, watermarks_path=None):
+    """
+    Export the tables of the SQLite database into the sink in parallel.
+
+    The watermarks are stored next to the database unless watermarks_path
+    is given.
+
+    Returns:
+    dict: The number of rows exported per table.
+    """
+    watermarks = ExportWatermarks(watermarks_path or f"{sqlite_db_path}.watermarks.json")
+    conn = sqlite3.connect(sqlite_db_path, timeout=30)
+    existing_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+
+    tables = [table_name for table_name in tables if table_name in existing_tables]
+    with instrumentation.stage("warehouse_export") as record, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {table_name: executor.submit(export_table, sqlite_db_path, table_name, sink,
+                                               watermarks, chunk_size, full_refresh)
+                   for table_name in tables}
+        n_rows = {table_name: future.result() for table_name, future in futures.items()}
+        record.rows_out = sum(n_rows.values())
+        return n_rows
+
+
+def load_sqlite_to_bigquery(sqlite_db_path, credentials_path, project_id, dataset_id,
+                            chunk_size=50000, max_workers=4, full_refresh=False):
     """
     Load data from an SQLite database into BigQuery tables.
-    
+
+    Only the rows inserted or changed since the previous export are sent
+    and merged on the primary keys, unless full_refresh is set. A "replace"
+    load of create_and_insert_to_db is detected and replaces the tables.
+
     Args:
     sqlite_db_path (str): Path to the SQLite database file.
     credentials_path (str): Path to the Google Cloud service account JSON key file.
     project_id (str): Google Cloud project ID.
     dataset_id (str): BigQuery dataset ID.
+    chunk_size (int): Number of rows read and uploaded at a time.
+    max_workers (int): Number of tables uploaded in parallel.
+    full_refresh (bool): Replace every table instead of merging the changed rows.
     """
+    from google.oauth2 import service_account
+
     # Set up BigQuery credentials
     credentials = service_account.Credentials.from_service_account_file(credentials_path)
-    
-    # Connect to the SQLite database
-    conn = sqlite3.connect(sqlite_db_path)
-    
-    # Load data from each table in SQLite into pandas DataFrames
-    fact_news_df = pd.read_sql_query("SELECT * FROM FactNews", conn)
-    dim_article_df = pd.read_sql_query("SELECT * FROM DimArticle", conn)
-    dim_article_title_df = pd.read_sql_query("SELECT * FROM DimArticleTitle", conn)
-    dim_article_description_df = pd.read_sql_query("SELECT * FROM DimArticleDescription", conn)
-    dim_article_content_df = pd.read_sql_query("SELECT * FROM DimArticleContent", conn)
-    
-    # Close the SQLite connection
-    conn.close()
-    
-    # Define table names for BigQuery
-    fact_news_table = f"{dataset_id}.FactNews"
-    dim_article_table = f"{dataset_id}.DimArticle"
-    dim_article_title_table = f"{dataset_id}.DimArticleTitle"
-    dim_article_description_table = f"{dataset_id}.DimArticleDescription"
-    dim_article_content_table = f"{dataset_id}.DimArticleContent"
-    
-    # Upload DataFrames to BigQuery
-    to_gbq(fact_news_df, fact_news_table, project_id=project_id, if_exists='replace', credentials=credentials)
-    to_gbq(dim_article_df, dim_article_table, project_id=project_id, if_exists='replace', credentials=credentials)
-    to_gbq(dim_article_title_df, dim_article_title_table, project_id=project_id, if_exists='replace', credentials=credentials)
-    to_gbq(dim_article_description_df, dim_article_description_table, project_id=project_id, if_exists='replace', credentials=credentials)
-    to_gbq(dim_article_content_df, dim_article_content_table, project_id=project_id, if_exists='replace', credentials=credentials)
-    
+    sink = BigQuerySink(dataset_id, project_id=project_id, credentials=credentials)
+
+    n_rows = export_sqlite(sqlite_db_path, sink, chunk_size=chunk_size,
+                           max_workers=max_workers, full_refresh=full_refresh)
+    print(f"Rows exported per table: {n_rows}")
     print("Data successfully loaded into BigQuery!")
 
 # Example usage
-#load_sqlite_to_bigquery('newsdb1.db', 'newsanalytics-440610-81d148518740.json', 'newsanalytics-440610', 'testnews')
\ No newline at end of file
+#load_sqlite_to_bigquery('newsdb1.db', 'newsanalytics-440610-81d148518740.json', 'newsanalytics-440610', 'testnews')
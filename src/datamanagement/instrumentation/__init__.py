@@ -0,0 +1 @@
+from .metrics import Instrumentation, PeakRssSampler, StageRecord, instrumentation, instrumented
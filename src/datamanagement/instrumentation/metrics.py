@@ -0,0 +1,320 @@
+""" Per-stage metrics of the pipeline.
+
+Every instrumented stage (the fetchers, the cleaning, both NLP stages and the
+loaders) records its wall time, rows in and out, rows per second and peak
+resident memory, with stage specific values such as the api calls made, the
+quota remaining or the model load time. The instrumentation is off by
+default and costs nothing then; it is switched on at runtime with enable()
+or with the environment variables:
+
+    - PIPELINE_METRICS_JSONL: a file receiving a JSON line per stage run
+    - PIPELINE_METRICS_PROM: a Prometheus textfile (node exporter textfile
+      collector) rewritten after every stage run
+    - PIPELINE_PROFILER: "cprofile" or "pyinstrument" to profile every stage
+    - PIPELINE_PROFILE_DIR: the directory of the profiles, "profiles" by default
+"""
+import contextlib
+import cProfile
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+
+import psutil
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class PeakRssSampler:
+    """ Sample the resident memory of the process in a background thread
+
+    Arguments:
+        - interval: the seconds between two samples
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.stop = threading.Event()
+        self.baseline_mb = self.peak_mb = 0.0
+
+    def _rss_mb(self) -> float:
+        return self.process.memory_info().rss / 2 ** 20
+
+    def _sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self._rss_mb())
+
+    def __enter__(self):
+        self.baseline_mb = self.peak_mb = self._rss_mb()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+        self.peak_mb = max(self.peak_mb, self._rss_mb())
+
+
+class StageRecord:
+    """ The measures of a single run of a stage
+
+    Arguments:
+        - stage: the name of the stage
+        - rows_in: the number of rows given to the stage
+    """
+
+    def __init__(self, stage: str, rows_in: int = None):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        # Values summed over the runs, e.g. the api calls
+        self.counters = {}
+        # Last values, e.g. the quota remaining
+        self.gauges = {}
+
+    def count(self, name: str, value: float = 1):
+        """ Add the value to a counter of the stage """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        """ Set a gauge of the stage """
+        if value is not None:
+            self.gauges[name] = value
+
+
+class _DisabledRecord(StageRecord):
+    """ A record discarding everything, given while the instrumentation is off """
+
+    def count(self, name: str, value: float = 1):
+        pass
+
+    def gauge(self, name: str, value: float):
+        pass
+
+
+class Instrumentation:
+    """ Collect the stage records into JSON lines and a Prometheus textfile """
+
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_path = None
+        self.prometheus_path = None
+        self.profiler = None
+        self.profile_dir = "profiles"
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # (metric, labels) -> value of the Prometheus textfile
+        self.counters = {}
+        self.gauges = {}
+
+    def enable(self, jsonl_path: str = None, prometheus_path: str = None,
+               profiler: str = None, profile_dir: str = "profiles"):
+        """ Switch the instrumentation on
+
+        Arguments:
+            - jsonl_path: a file receiving a JSON line per stage run
+            - prometheus_path: a Prometheus textfile rewritten after every
+              stage run
+            - profiler: "cprofile" or "pyinstrument" to profile every stage
+            - profile_dir: the directory the profiles are written to
+        """
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler}, expected one of {PROFILERS}")
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.enabled = True
+
+    def disable(self):
+        """ Switch the instrumentation off """
+        self.enabled = False
+
+    @property
+    def current(self) -> StageRecord:
+        """ The record of the innermost stage running in this thread """
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else _DisabledRecord("")
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """ Measure the stage run in the with block
+
+        Arguments:
+            - name: the name of the stage
+            - rows_in: the number of rows given to the stage
+
+        Yields:
+            - StageRecord: the record, on which rows_out and the stage
+              specific counters and gauges are set
+        """
+        if not self.enabled:
+            yield _DisabledRecord(name, rows_in)
+            return
+        record = StageRecord(name, rows_in)
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(record)
+        # Nested stages are part of the profile of the outermost one
+        profiler = self._start_profiler() if len(stack) == 1 else None
+        start = time.perf_counter()
+        error = None
+        try:
+            with PeakRssSampler() as sampler:
+                yield record
+        except Exception as oops:
+            error = oops
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            self._stop_profiler(profiler, name)
+            self._record(record, seconds, sampler, error)
+
+    def _start_profiler(self):
+        if self.profiler == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler, name: str):
+        if profiler is None:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.profile_dir, f"{name}-{timestamp}")
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(f"{path}.prof")
+        else:
+            profiler.stop()
+            with open(f"{path}.html", "w") as file:
+                file.write(profiler.output_html())
+
+    def _record(self, record: StageRecord, seconds: float, sampler: PeakRssSampler, error):
+        """ Write the record as a JSON line and into the Prometheus metrics """
+        line = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "stage": record.stage,
+            "seconds": round(seconds, 6),
+            "rows_in": record.rows_in,
+            "rows_out": record.rows_out,
+            # The rows produced for the stages without input, e.g. the fetchers
+            "rows_per_second": round((record.rows_in or record.rows_out) / seconds, 3)
+            if (record.rows_in or record.rows_out) and seconds else None,
+            "peak_rss_mb": round(sampler.peak_mb, 1),
+            "rss_increase_mb": round(sampler.peak_mb - sampler.baseline_mb, 1),
+            "error": None if error is None else repr(error),
+        }
+        line.update(record.counters)
+        line.update(record.gauges)
+
+        labels = (("stage", record.stage),)
+        with self.lock:
+            for name, value in [("pipeline_stage_runs_total", 1),
+                                ("pipeline_stage_errors_total", int(error is not None)),
+                                ("pipeline_stage_seconds_total", seconds),
+                                ("pipeline_stage_rows_in_total", record.rows_in or 0),
+                                ("pipeline_stage_rows_out_total", record.rows_out or 0)] + \
+                    [(f"pipeline_{name}_total", value) for name, value in record.counters.items()]:
+                self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+            gauges = {"pipeline_stage_last_seconds": seconds,
+                      "pipeline_stage_peak_rss_bytes": sampler.peak_mb * 2 ** 20}
+            if line["rows_per_second"] is not None:
+                gauges["pipeline_stage_last_rows_per_second"] = line["rows_per_second"]
+            gauges.update({f"pipeline_{name}": value for name, value in record.gauges.items()})
+            for name, value in gauges.items():
+                self.gauges[(name, labels)] = value
+
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a") as file:
+                    file.write(json.dumps(line) + "\n")
+            if self.prometheus_path:
+                self._write_prometheus()
+
+    def observe(self, name: str, value: float, **labels):
+        """ Set a gauge outside of a stage, e.g. the load time of a model
+
+        Arguments:
+            - name: the name of the metric, prefixed with pipeline_
+            - value: the value of the gauge
+            - labels: the labels of the metric
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(f"pipeline_{name}", tuple(sorted(labels.items())))] = value
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a") as file:
+                    file.write(json.dumps({
+                        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                        "metric": name, "value": value, **labels}) + "\n")
+            if self.prometheus_path:
+                self._write_prometheus()
+
+    def _write_prometheus(self):
+        """ Rewrite the Prometheus textfile, atomically so the collector
+        never reads a partial file """
+        lines = []
+        for metrics, metric_type in ((self.counters, "counter"), (self.gauges, "gauge")):
+            for name in sorted({name for name, _ in metrics}):
+                lines.append(f"# TYPE {name} {metric_type}")
+                for (metric, labels), value in sorted(metrics.items()):
+                    if metric == name:
+                        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                        lines.append(f"{name}{{{label_text}}} {value}")
+        temporary_path = f"{self.prometheus_path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temporary_path, self.prometheus_path)
+
+
+def _n_rows(value):
+    """ Return the number of rows of a DataFrame, None for anything else """
+    shape = getattr(value, "shape", None)
+    return shape[0] if shape else None
+
+
+def instrumented(stage: str, rows_argument: str = None):
+    """ Decorate a stage function so that every call is measured
+
+    The rows in are taken from the first DataFrame argument (or the argument
+    named rows_argument) and the rows out from the DataFrame returned.
+
+    Arguments:
+        - stage: the name of the stage
+        - rows_argument: the name of the argument holding the DataFrame
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            if rows_argument in kwargs:
+                rows_in = _n_rows(kwargs[rows_argument])
+            else:
+                rows_in = next(filter(None, map(_n_rows, list(args) + list(kwargs.values()))), None)
+            with instrumentation.stage(stage, rows_in) as record:
+                output = function(*args, **kwargs)
+                record.rows_out = _n_rows(output)
+                return output
+        return wrapper
+    return decorator
+
+
+instrumentation = Instrumentation()
+if os.getenv("PIPELINE_METRICS_JSONL") or os.getenv("PIPELINE_METRICS_PROM") \
+        or os.getenv("PIPELINE_PROFILER"):
+    instrumentation.enable(jsonl_path=os.getenv("PIPELINE_METRICS_JSONL"),
+                           prometheus_path=os.getenv("PIPELINE_METRICS_PROM"),
+                           profiler=os.getenv("PIPELINE_PROFILER"),
+                           profile_dir=os.getenv("PIPELINE_PROFILE_DIR", "profiles"))
@@ -0,0 +1,2 @@
+from .runner import ChunkProgress, PipelineRunner
+from .scheduler import Stage, StageScheduler
@@ -0,0 +1,391 @@
+""" A continuous realtime ingestion of the top news.
+
+RealtimeIngestor polls the top news endpoints of the fetchers on a schedule,
+drops the articles already ingested and sends the new ones through the stages
+(cleaning, NLP) and the SQLite loader in micro-batches. Every stage runs on
+its own thread and the stages are connected by bounded queues: once a queue
+holds max_pending_batches, the stage before it (and in the end the poller)
+waits, so a slow model holds back the polling instead of piling articles up
+in memory. The articles count as ingested once the sink has committed them,
+the ones of a failed micro-batch are polled and ingested again.
+
+The latency of every article is measured once its rows are committed, from
+its publish time and from the poll which fetched it, and reported with the
+statistics and as pipeline_realtime_* metrics.
+
+Usage (from the src directory), against the api or a local stub fed with
+synthetic articles:
+
+    python -m datamanagement.pipeline.realtime --api worldnewsapi --countries us gb --interval 60
+    python -m datamanagement.pipeline.realtime --stub --duration 120
+"""
+import argparse
+import collections
+import datetime
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..instrumentation import instrumentation
+from .runner import ARTICLE_KEY_COLUMNS, close_stages, rechunk
+
+# Marks the end of the polling in the queues
+_END_OF_STREAM = object()
+
+
+class SeenArticles:
+    """ Remember the keys of the latest articles ingested to drop them when
+    they are polled again
+
+    An article is only remembered once its micro-batch is in the sink: until
+    then it is in flight, so it is not queued a second time by the next
+    polls, and it is released to be polled again when its micro-batch fails.
+
+    Arguments:
+        - max_size: the number of keys remembered, the oldest are forgotten
+    """
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self.keys = collections.OrderedDict()
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def article_keys(df: pd.DataFrame) -> list:
+        """ Return the hashes of the key columns of the articles
+
+        Arguments:
+            - df: the articles as polled, before the stages change them
+
+        Returns:
+            - list: the key of every article
+        """
+        if df.empty:
+            return []
+        columns = [column for column in ARTICLE_KEY_COLUMNS if column in df] or list(df.columns)
+        return pd.util.hash_pandas_object(df[columns].astype(str), index=False).tolist()
+
+    def filter_new(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ Return the articles neither ingested nor in flight and hold them
+        in flight until mark_seen or release
+
+        Arguments:
+            - df: the articles polled
+
+        Returns:
+            - pd.DataFrame: the new articles, once each
+        """
+        if df.empty:
+            return df
+        new = []
+        with self.lock:
+            for key in self.article_keys(df):
+                is_new = key not in self.keys and key not in self.in_flight
+                new.append(is_new)
+                if is_new:
+                    self.in_flight.add(key)
+        return df[new].reset_index(drop=True)
+
+    def mark_seen(self, keys: list):
+        """ Remember the articles of a micro-batch committed by the sink
+
+        Arguments:
+            - keys: the article_keys of the micro-batch
+        """
+        with self.lock:
+            for key in keys:
+                self.in_flight.discard(key)
+                self.keys[key] = None
+                self.keys.move_to_end(key)
+            while len(self.keys) > self.max_size:
+                self.keys.popitem(last=False)
+
+    def release(self, keys: list):
+        """ Forget the articles of a failed micro-batch, so the next polls
+        queue them again
+
+        Arguments:
+            - keys: the article_keys of the micro-batch
+        """
+        with self.lock:
+            self.in_flight.difference_update(keys)
+
+
+class _MicroBatch:
+    """ The articles of a micro-batch with the times its latency is
+    measured from and the keys it is remembered by once loaded """
+
+    def __init__(self, df: pd.DataFrame, fetched_at: float):
+        self.df = df
+        self.fetched_at = fetched_at
+        self.keys = SeenArticles.article_keys(df)
+        self.published_at = pd.to_datetime(df["article_publishedAt"], errors="coerce",
+                                           utc=True, format="ISO8601") \
+            if "article_publishedAt" in df else pd.Series(pd.NaT, index=df.index)
+
+
+def _percentiles(values) -> dict:
+    """ Return the p50, p95 and max of the values, in seconds """
+    if not len(values):
+        return {"p50": None, "p95": None, "max": None}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3),
+            "max": round(float(np.max(values)), 3)}
+
+
+class RealtimeIngestor:
+    """ Poll the top news and ingest the new articles continuously
+
+    Arguments:
+        - pollers: a list of functions returning the latest articles as a
+          DataFrame, e.g. the retrieve_real_time_data of the fetchers
+        - stages: a list of (name, function) in order, as for PipelineRunner,
+          closed with the ingestor
+        - sink: a function given every processed micro-batch, e.g. the
+          sqlite_sink of the stages
+        - poll_interval: the seconds between the start of two polls
+        - micro_batch_size: the maximum number of articles of a micro-batch
+        - max_pending_batches: the number of micro-batches a queue between
+          two stages holds before the stage feeding it waits
+        - seen: the SeenArticles of the articles already ingested, the
+          articles of a failed micro-batch are polled and ingested again
+        - max_latencies: the number of latest latencies the percentiles are
+          taken over
+    """
+
+    def __init__(self, pollers: list, stages: list, sink, poll_interval: float = 60,
+                 micro_batch_size: int = 32, max_pending_batches: int = 4,
+                 seen: SeenArticles = None, max_latencies: int = 10000):
+        self.pollers = pollers
+        self.stages = stages
+        self.sink = sink
+        self.poll_interval = poll_interval
+        self.micro_batch_size = micro_batch_size
+        self.max_pending_batches = max_pending_batches
+        self.seen = seen or SeenArticles()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.statistics = {"polls": 0, "articles_polled": 0, "new_articles": 0,
+                           "batches": 0, "rows_loaded": 0, "failed_batches": 0}
+        self.publish_latencies = collections.deque(maxlen=max_latencies)
+        self.fetch_latencies = collections.deque(maxlen=max_latencies)
+
+    def stop(self):
+        """ Stop polling, the micro-batches queued are still ingested """
+        self.stop_event.set()
+
+    def poll(self) -> list:
+        """ Poll every poller once and cut the new articles into micro-batches
+
+        Returns:
+            - list: the _MicroBatch of the new articles
+        """
+        frames = []
+        for poller in self.pollers:
+            try:
+                frames.append(poller())
+            except Exception as oops:
+                print(f"Error occurred while polling the top news as {oops}")
+        fetched_at = time.time()
+        frames = [frame for frame in frames if frame is not None and not frame.empty]
+        polled = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        new = self.seen.filter_new(polled)
+        with self.lock:
+            self.statistics["polls"] += 1
+            self.statistics["articles_polled"] += polled.shape[0]
+            self.statistics["new_articles"] += new.shape[0]
+        return [_MicroBatch(batch, fetched_at)
+                for batch in rechunk([new], self.micro_batch_size)]
+
+    def _run_stage(self, name: str, stage, inbox: queue.Queue, outbox: queue.Queue):
+        """ Run a stage over the micro-batches of its inbox until the end of
+        the stream, a failing micro-batch is dropped and counted """
+        while True:
+            batch = inbox.get()
+            if batch is _END_OF_STREAM:
+                outbox.put(_END_OF_STREAM)
+                return
+            try:
+                batch.df = stage(batch.df)
+            except Exception as oops:
+                print(f"Error occurred in the {name} stage of a micro-batch as {oops}")
+                self.seen.release(batch.keys)
+                with self.lock:
+                    self.statistics["failed_batches"] += 1
+                continue
+            # Blocks while the next stage is behind
+            outbox.put(batch)
+
+    def _load(self, inbox: queue.Queue):
+        """ Flush the micro-batches to the sink and measure their latency """
+        while True:
+            batch = inbox.get()
+            if batch is _END_OF_STREAM:
+                return
+            try:
+                self.sink(batch.df)
+            except Exception as oops:
+                print(f"Error occurred while loading a micro-batch as {oops}")
+                self.seen.release(batch.keys)
+                with self.lock:
+                    self.statistics["failed_batches"] += 1
+                continue
+            queryable_at = time.time()
+            self.seen.mark_seen(batch.keys)
+            published_at = batch.published_at.dropna()
+            publish_latencies = (queryable_at - published_at.astype("int64") / 1e9).tolist()
+            with self.lock:
+                self.statistics["batches"] += 1
+                self.statistics["rows_loaded"] += batch.df.shape[0]
+                self.publish_latencies.extend(publish_latencies)
+                self.fetch_latencies.extend([queryable_at - batch.fetched_at] * batch.df.shape[0])
+            if publish_latencies:
+                instrumentation.observe("realtime_publish_to_queryable_seconds",
+                                        float(np.median(publish_latencies)))
+            instrumentation.observe("realtime_fetch_to_queryable_seconds",
+                                    queryable_at - batch.fetched_at)
+            instrumentation.observe("realtime_pending_batches", inbox.qsize())
+
+    def close(self):
+        """ Close the stages holding resources, e.g. the pools of a
+        StageScheduler """
+        close_stages(self.stages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def report(self) -> dict:
+        """ Return the statistics and the latency percentiles in seconds """
+        with self.lock:
+            report = dict(self.statistics)
+            report["publish_to_queryable_seconds"] = _percentiles(list(self.publish_latencies))
+            report["fetch_to_queryable_seconds"] = _percentiles(list(self.fetch_latencies))
+        return report
+
+    def run(self, duration: float = None, max_polls: int = None) -> dict:
+        """ Poll and ingest until stopped, the duration elapsed or max_polls
+        polls were made
+
+        Arguments:
+            - duration: the seconds after which the polling stops
+            - max_polls: the number of polls after which the polling stops
+
+        Returns:
+            - dict: the report of the run
+        """
+        queues = [queue.Queue(maxsize=self.max_pending_batches) for _ in range(len(self.stages) + 1)]
+        workers = [threading.Thread(target=self._run_stage, args=(name, stage, inbox, outbox),
+                                    daemon=True)
+                   for (name, stage), inbox, outbox in zip(self.stages, queues, queues[1:])]
+        workers.append(threading.Thread(target=self._load, args=(queues[-1],), daemon=True))
+        for worker in workers:
+            worker.start()
+
+        deadline = None if duration is None else time.monotonic() + duration
+        n_polls = 0
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                for batch in self.poll():
+                    # Blocks while the first stage is behind
+                    queues[0].put(batch)
+                n_polls += 1
+                if max_polls is not None and n_polls >= max_polls:
+                    break
+                wait = self.poll_interval - (time.monotonic() - started)
+                if deadline is not None:
+                    if time.monotonic() >= deadline:
+                        break
+                    wait = min(wait, deadline - time.monotonic())
+                self.stop_event.wait(max(wait, 0))
+        finally:
+            # The micro-batches queued go through the stages before stopping
+            queues[0].put(_END_OF_STREAM)
+            for worker in workers:
+                worker.join()
+        return self.report()
+
+
+def feed_stub(stub, corpus: pd.DataFrame, articles_per_second: float,
+              stop: threading.Event):
+    """ Publish the articles of the corpus on the stub at a steady rate,
+    with the time of their publication as publish time
+
+    Arguments:
+        - stub: a running StubNewsServer
+        - corpus: the articles published in order
+        - articles_per_second: the rate of publication
+        - stop: an event ending the publication
+    """
+    position = 0
+    while position < corpus.shape[0] and not stop.wait(1.0):
+        n_articles = max(1, int(articles_per_second))
+        articles = corpus.iloc[position:position + n_articles].copy()
+        articles["article_publishedAt"] = datetime.datetime.now(datetime.timezone.utc) \
+            .strftime("%Y-%m-%d %H:%M:%S")
+        stub.add_articles(articles)
+        position += n_articles
+
+
+if __name__ == "__main__":
+    from ..datafetch.news import NewsORGAPI, WorldNewsAPI
+    from .stages import news_pipeline_stages, sqlite_sink
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", choices=["worldnewsapi", "newsapi"], default="worldnewsapi")
+    parser.add_argument("--countries", nargs="+", default=["us"],
+                        help="source countries of the WorldNewsAPI top news")
+    parser.add_argument("--categories", nargs="+", default=["general"],
+                        help="categories of the NewsAPI.org top headlines")
+    parser.add_argument("--base-url", help="url of the api, e.g. a stub")
+    parser.add_argument("--stub", action="store_true",
+                        help="poll a local stub fed with synthetic articles")
+    parser.add_argument("--stub-rate", type=float, default=5,
+                        help="articles published per second on the stub")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between two polls")
+    parser.add_argument("--duration", type=float, help="seconds after which the daemon stops")
+    parser.add_argument("--micro-batch-size", type=int, default=32)
+    parser.add_argument("--max-pending-batches", type=int, default=4)
+    parser.add_argument("--db", default="newsdb", help="SQLite database, without .db")
+    arguments = parser.parse_args()
+
+    stub = None
+    feeding = threading.Event()
+    if arguments.stub:
+        from ..benchmarks.stub_news_server import StubNewsServer
+        from ..benchmarks.synthetic_corpus import generate_corpus
+
+        stub = StubNewsServer()
+        arguments.base_url = stub.start()
+        threading.Thread(target=feed_stub, args=(stub, generate_corpus(100000), arguments.stub_rate,
+                                                 feeding), daemon=True).start()
+
+    kwargs = {} if arguments.base_url is None else {"base_url": arguments.base_url}
+    if arguments.api == "worldnewsapi":
+        news_api = WorldNewsAPI(**kwargs)
+        poller = lambda: news_api.retrieve_real_time_data(country_codes=arguments.countries)
+    else:
+        news_api = NewsORGAPI(**kwargs)
+        poller = lambda: news_api.retrieve_real_time_data(categories=arguments.categories)
+
+    ingestor = RealtimeIngestor([poller], news_pipeline_stages(), sqlite_sink(arguments.db),
+                                poll_interval=arguments.interval,
+                                micro_batch_size=arguments.micro_batch_size,
+                                max_pending_batches=arguments.max_pending_batches)
+    try:
+        print(ingestor.run(duration=arguments.duration))
+    except KeyboardInterrupt:
+        print(ingestor.report())
+    finally:
+        ingestor.close()
+        feeding.set()
+        if stub is not None:
+            stub.stop()
@@ -0,0 +1,228 @@
+""" A streaming runner of the pipeline stages over fixed-size chunks.
+
+The articles of a source (pages of a fetcher, batches of the staging
+dataset) are cut into chunks of chunk_size rows, and every chunk goes
+through all the stages and is flushed to the sink before the next one is
+taken, so the memory used depends on the chunk size and not on the size of
+the corpus. The source is read by a producer thread into a bounded queue:
+once max_pending_chunks are waiting, the producer blocks until a chunk is
+taken, so the fetch never runs far ahead of the inference.
+
+The chunks done are recorded in a ChunkProgress, so a run which stopped is
+resumed by running it again over the same source.
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+
+import pandas as pd
+
+from ..instrumentation import instrumentation
+
+# Columns identifying an article, the fingerprint of a chunk is taken over
+# them when they are present
+ARTICLE_KEY_COLUMNS = ["source_name", "article_title", "article_publishedAt"]
+
+# Marks the end of the source in the queue
+_END_OF_SOURCE = object()
+
+
+class _SourceFailure:
+    """ Carry an exception of the producer thread to the runner """
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def chunk_fingerprint(df: pd.DataFrame) -> str:
+    """ Return a fingerprint of the articles of a chunk
+
+    Arguments:
+        - df: a chunk of articles
+
+    Returns:
+        - str: the sha256 hex digest of the article keys of the chunk
+    """
+    columns = [column for column in ARTICLE_KEY_COLUMNS if column in df] or list(df.columns)
+    hashes = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def rechunk(frames, chunk_size: int):
+    """ Cut a stream of DataFrames into chunks of chunk_size rows
+
+    Arguments:
+        - frames: an iterable of DataFrames of any size
+        - chunk_size: the number of rows of the chunks, the last one may
+          be smaller
+
+    Returns:
+        - generator: the chunks as DataFrames
+    """
+    pending = []
+    n_pending = 0
+    for frame in frames:
+        start = 0
+        while start < frame.shape[0]:
+            part = frame.iloc[start:start + chunk_size - n_pending]
+            start += part.shape[0]
+            pending.append(part)
+            n_pending += part.shape[0]
+            if n_pending == chunk_size:
+                yield pd.concat(pending, ignore_index=True) if len(pending) > 1 \
+                    else pending[0].reset_index(drop=True)
+                pending, n_pending = [], 0
+    if n_pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+class ChunkProgress:
+    """ Persist the fingerprints of the chunks done in a JSON file
+
+    Arguments:
+        - path: the path of the JSON file holding the progress
+    """
+
+    def __init__(self, path: str = "pipeline_progress.json"):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.done = json.load(file)
+
+    def is_done(self, fingerprint: str) -> bool:
+        """ Whether the chunk of the fingerprint went through the pipeline """
+        return fingerprint in self.done
+
+    def mark_done(self, fingerprint: str, n_rows: int):
+        """ Record the chunk as done and write the progress to disk
+
+        Arguments:
+            - fingerprint: the fingerprint of the chunk
+            - n_rows: the number of rows flushed to the sink
+        """
+        self.done[fingerprint] = n_rows
+        # Write to a temporary file first so a crash never leaves a
+        # truncated progress behind
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self.done, file)
+        os.replace(temporary_path, self.path)
+
+
+class PipelineRunner:
+    """ Stream the chunks of a source through the stages into a sink
+
+    Arguments:
+        - stages: a list of (name, function) in order, every function takes
+          the DataFrame of a chunk and returns it with its features, the
+          functions with a close, e.g. a StageScheduler, are closed with the
+          runner
+        - sink: a function given every processed chunk, e.g. the SQLite loader
+        - chunk_size: the number of rows per chunk
+        - max_pending_chunks: the number of chunks the source may read ahead
+          of the stages
+        - progress: an optional ChunkProgress, the chunks already done are
+          skipped
+    """
+
+    def __init__(self, stages: list, sink, chunk_size: int = 1000,
+                 max_pending_chunks: int = 2, progress: ChunkProgress = None):
+        self.stages = stages
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks
+        self.progress = progress
+
+    @staticmethod
+    def _put(chunks: queue.Queue, item, stop: threading.Event) -> bool:
+        """ Put the item in the queue, blocking while it is full, unless the
+        runner stopped """
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, source, chunks: queue.Queue, stop: threading.Event):
+        """ Read the source into the queue, blocking while the queue is full """
+        try:
+            for chunk in rechunk(source, self.chunk_size):
+                if not self._put(chunks, chunk, stop):
+                    return
+            self._put(chunks, _END_OF_SOURCE, stop)
+        except Exception as oops:
+            self._put(chunks, _SourceFailure(oops), stop)
+
+    def run(self, source) -> dict:
+        """ Run the stages over all the chunks of the source
+
+        Arguments:
+            - source: an iterable of DataFrames, e.g. a generator of pages
+
+        Returns:
+            - dict: the number of chunks processed and skipped and the rows
+              read and flushed
+        """
+        statistics = {"chunks": 0, "skipped_chunks": 0, "rows_in": 0, "rows_out": 0}
+        chunks = queue.Queue(maxsize=self.max_pending_chunks)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(source, chunks, stop),
+                                    daemon=True)
+        producer.start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _END_OF_SOURCE:
+                    break
+                if isinstance(chunk, _SourceFailure):
+                    raise chunk.error
+                fingerprint = chunk_fingerprint(chunk)
+                if self.progress is not None and self.progress.is_done(fingerprint):
+                    statistics["skipped_chunks"] += 1
+                    continue
+                statistics["rows_in"] += chunk.shape[0]
+                with instrumentation.stage("pipeline_chunk", chunk.shape[0]) as record:
+                    for _, stage in self.stages:
+                        chunk = stage(chunk)
+                    self.sink(chunk)
+                    record.rows_out = chunk.shape[0]
+                    record.gauge("pending_chunks", chunks.qsize())
+                if self.progress is not None:
+                    self.progress.mark_done(fingerprint, chunk.shape[0])
+                statistics["chunks"] += 1
+                statistics["rows_out"] += chunk.shape[0]
+                print(f"Chunk {statistics['chunks']} done, {statistics['rows_out']} rows loaded")
+        finally:
+            # The producer stops at its next chunk, it is not waited for
+            # when the stages failed
+            stop.set()
+        producer.join()
+        return statistics
+
+    def close(self):
+        """ Close the stages holding resources, e.g. the pools of a
+        StageScheduler """
+        close_stages(self.stages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def close_stages(stages: list):
+    """ Call the close of the stage functions which have one
+
+    Arguments:
+        - stages: a list of (name, function)
+    """
+    for _, stage in stages:
+        close = getattr(stage, "close", None)
+        if callable(close):
+            close()
@@ -0,0 +1,223 @@
+""" A scheduler running the independent stages of a chunk concurrently.
+
+Every Stage declares the columns it reads and the columns it adds. A stage
+depends on the stages adding the columns it reads, and the stages without
+a dependency between them run at the same time, each on the pool suited to
+its work:
+
+    - "thread": a thread pool, for the stages waiting on I/O
+    - "process": a pool of spawned processes, for the CPU bound python work
+      such as spacy which the GIL would serialize on threads
+    - "torch": a single dedicated thread, so the models keep the intra-op
+      threads of torch for themselves and never run two at once
+
+Every stage is given a copy of the row key and of its input columns only,
+and the columns it returns are joined back on the row key, so the wall time
+of a chunk comes close to the one of its longest chain of stages rather than
+the sum of all of them.
+"""
+import multiprocessing
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+import numpy as np
+import pandas as pd
+
+from ..instrumentation import instrumentation
+
+POOLS = ("thread", "process", "torch")
+
+# The row key added when the frame has no key column
+_ROW_KEY = "_row_key"
+
+
+class Stage:
+    """ A stage of the scheduler
+
+    Arguments:
+        - name: the name of the stage
+        - function: takes a DataFrame of the row key and the inputs and
+          returns it with the outputs, it must be picklable for the
+          "process" pool, e.g. a module level function or a partial of one
+        - inputs: the columns read by the stage
+        - outputs: the columns added by the stage
+        - pool: "thread", "process" or "torch"
+    """
+
+    def __init__(self, name: str, function, inputs: list, outputs: list, pool: str = "thread"):
+        if pool not in POOLS:
+            raise ValueError(f"Unknown pool {pool}, expected one of {POOLS}")
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.pool = pool
+
+
+def _run_stage(function, df: pd.DataFrame) -> tuple:
+    """ Run a stage and measure its time where it runs, so the time spent
+    waiting for a pool is not counted """
+    start = time.perf_counter()
+    output = function(df)
+    return output, time.perf_counter() - start
+
+
+class StageScheduler:
+    """ Run the stages of every chunk as a DAG of column dependencies
+
+    Arguments:
+        - stages: the Stage list, in any order
+        - key_column: the column identifying the rows, e.g. article_id, the
+          position of the rows is used when not given
+        - thread_workers: the number of threads of the "thread" pool
+        - process_workers: the number of processes of the "process" pool
+    """
+
+    def __init__(self, stages: list, key_column: str = None, thread_workers: int = 4,
+                 process_workers: int = 1):
+        self.stages = stages
+        self.key_column = key_column
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.dependencies = self._resolve_dependencies(stages)
+        self.executors = {}
+        self.last_run = {}
+
+    @staticmethod
+    def _resolve_dependencies(stages: list) -> dict:
+        """ Find the stages every stage waits for and reject the cycles
+
+        Returns:
+            - dict: the names of the stages every stage depends on
+        """
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"The stage names {names} are not unique")
+        producers = {}
+        for stage in stages:
+            for column in stage.outputs:
+                if column in producers:
+                    raise ValueError(f"The column {column} is added by both "
+                                     f"{producers[column]} and {stage.name}")
+                producers[column] = stage.name
+        dependencies = {stage.name: {producers[column] for column in stage.inputs
+                                     if column in producers} - {stage.name}
+                        for stage in stages}
+
+        # Kahn's algorithm, the stages left over are part of a cycle
+        remaining = {name: set(depends_on) for name, depends_on in dependencies.items()}
+        while True:
+            ready = [name for name, depends_on in remaining.items() if not depends_on]
+            if not ready:
+                break
+            for name in ready:
+                del remaining[name]
+            for depends_on in remaining.values():
+                depends_on.difference_update(ready)
+        if remaining:
+            raise ValueError(f"The stages {sorted(remaining)} depend on each other")
+        return dependencies
+
+    def _executor(self, pool: str):
+        """ Return the executor of the pool, created on its first stage """
+        if pool not in self.executors:
+            if pool == "thread":
+                self.executors[pool] = ThreadPoolExecutor(max_workers=self.thread_workers,
+                                                          thread_name_prefix="stage")
+            elif pool == "process":
+                # Spawned rather than forked, the parent may hold torch threads
+                self.executors[pool] = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self.executors[pool] = ThreadPoolExecutor(max_workers=1,
+                                                          thread_name_prefix="torch")
+        return self.executors[pool]
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ Run all the stages over the chunk
+
+        Arguments:
+            - df: the chunk, with the inputs of the stages
+
+        Returns:
+            - pd.DataFrame: the chunk with the outputs of all the stages
+        """
+        key = self.key_column or _ROW_KEY
+        df = df.copy()
+        if self.key_column is None:
+            df[_ROW_KEY] = np.arange(df.shape[0])
+        elif df[key].duplicated().any():
+            raise ValueError(f"The key column {key} is not unique")
+
+        stages = {stage.name: stage for stage in self.stages}
+        done = set()
+        running = {}
+        stage_seconds = {}
+        start = time.perf_counter()
+        with instrumentation.stage("scheduled_stages", df.shape[0]) as record:
+            try:
+                while len(done) < len(self.stages):
+                    for stage in stages.values():
+                        if stage.name in done or stage.name in running.values() \
+                                or not self.dependencies[stage.name] <= done:
+                            continue
+                        columns = [key] + [column for column in stage.inputs if column != key]
+                        future = self._executor(stage.pool).submit(
+                            _run_stage, stage.function, df[columns].copy())
+                        running[future] = stage.name
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        stage = stages[name]
+                        try:
+                            output, seconds = future.result()
+                        except Exception as oops:
+                            raise RuntimeError(f"The stage {name} failed as {oops}") from oops
+                        df = self._join(df, output, stage, key)
+                        stage_seconds[name] = seconds
+                        record.gauge(f"{name}_seconds", seconds)
+                        done.add(name)
+            finally:
+                for future in running:
+                    future.cancel()
+            record.rows_out = df.shape[0]
+
+        wall_seconds = time.perf_counter() - start
+        self.last_run = {"wall_seconds": round(wall_seconds, 4),
+                         "sum_of_stage_seconds": round(sum(stage_seconds.values()), 4),
+                         "stage_seconds": {name: round(seconds, 4)
+                                           for name, seconds in stage_seconds.items()}}
+        if self.key_column is None:
+            df = df.drop(columns=_ROW_KEY)
+        return df
+
+    @staticmethod
+    def _join(df: pd.DataFrame, output: pd.DataFrame, stage: Stage, key: str) -> pd.DataFrame:
+        """ Join the outputs of a stage onto the chunk by the row key, the
+        rows the stage did not return get missing values """
+        missing = [column for column in [key] + stage.outputs if column not in output]
+        if missing:
+            raise RuntimeError(f"The stage {stage.name} did not return the columns {missing}")
+        aligned = output.set_index(key)[stage.outputs].reindex(df[key])
+        for column in stage.outputs:
+            df[column] = aligned[column].to_numpy()
+        return df
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ Run the stages over the chunk, so the scheduler is itself a stage
+        of PipelineRunner, which shuts its pools down """
+        return self.run(df)
+
+    def close(self):
+        """ Shut the pools down """
+        for executor in self.executors.values():
+            executor.shutdown()
+        self.executors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
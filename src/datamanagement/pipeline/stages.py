@@ -0,0 +1,209 @@
+""" The stages, sources and sink of the news pipeline run by PipelineRunner.
+
+Usage (from the src directory), enriching the staged articles chunk by chunk
+into the SQLite database:
+
+    python -m datamanagement.pipeline.stages --staging datamanagement/data/staging --db newsdb
+"""
+import argparse
+import functools
+
+from ..database.db_load import create_and_insert_to_db
+from ..datapreprocessing.data_cleaning import clean_historical_news
+from ..datapreprocessing.deduplication import (
+    assign_duplicate_clusters, enrich_cluster_representatives)
+from ..datapreprocessing.data_transforming import (
+    create_features_from_pretrained_models, load_spacy_pipeline,
+    retrieve_counts_on_part_of_speech)
+from ..datapreprocessing.model_config import model_configuration as default_model_configuration
+from ..staging import iter_staging
+from .runner import ChunkProgress, PipelineRunner
+from .scheduler import Stage, StageScheduler
+
+TEXT_COLUMNS = ["article_content", "article_description", "article_title"]
+
+# The spacy pipeline of a worker process of the scheduler, loaded on its
+# first chunk
+_WORKER_NLP = None
+
+
+def count_part_of_speech_in_worker(df, columns: list):
+    """ Count the part of speech of the columns in a worker process,
+    keeping the spacy pipeline loaded across the chunks
+
+    Arguments:
+        - df: the chunk given by the scheduler
+        - columns: the columns whose part of speech are counted
+
+    Returns:
+        - pd.DataFrame: the chunk with the counts of the columns
+    """
+    global _WORKER_NLP
+    if _WORKER_NLP is None:
+        _WORKER_NLP = load_spacy_pipeline()
+    return retrieve_counts_on_part_of_speech(df, columns, nlp=_WORKER_NLP)
+
+
+def enrichment_scheduler(model_configuration: dict, feature_columns: list, pos_columns: list,
+                         cache=None, inference_pool=None, registry=None,
+                         deduplicated: bool = False) -> StageScheduler:
+    """ Build a scheduler running the model features on the torch worker
+    and the part of speech counts in a worker process at the same time
+
+    Arguments:
+        - model_configuration, feature_columns, pos_columns, cache,
+          inference_pool, registry: as in news_pipeline_stages, without
+          pos_columns only the model features are run
+        - deduplicated: the chunks have the columns of
+          assign_duplicate_clusters, the model features are run on the
+          cluster representatives only while the part of speech counts are
+          run on every article
+
+    Returns:
+        - StageScheduler: the scheduler, whose run (or call) enriches a chunk
+    """
+    model_features = functools.partial(create_features_from_pretrained_models,
+                                       model_configuration, columns=feature_columns,
+                                       cache=cache, inference_pool=inference_pool,
+                                       registry=registry, raise_errors=True)
+    model_inputs = list(feature_columns)
+    if deduplicated:
+        model_features = functools.partial(enrich_cluster_representatives,
+                                           enrich=model_features)
+        model_inputs += ["duplicate_cluster_id", "is_cluster_representative"]
+    stages = [
+        Stage("model_features",
+              model_features,
+              inputs=model_inputs,
+              outputs=[f"{column}_{key}" for column in feature_columns
+                       for key in model_configuration],
+              pool="torch"),
+    ]
+    if pos_columns:
+        stages.append(Stage(
+            "part_of_speech",
+            functools.partial(count_part_of_speech_in_worker, columns=pos_columns),
+            inputs=pos_columns,
+            outputs=[f"{column}_{suffix}" for column in pos_columns
+                     for suffix in ("pos_counts", "org_counts")],
+            pool="process"))
+    return StageScheduler(stages)
+
+
+def news_pipeline_stages(model_configuration: dict = None,
+                         feature_columns: list = ["article_description", "article_title"],
+                         pos_columns: list = TEXT_COLUMNS,
+                         cache=None, inference_pool=None, registry=None,
+                         dedup_threshold: float = None, overlap: bool = False) -> list:
+    """ Build the cleaning, model feature and part of speech stages
+
+    The spacy pipeline is loaded once and the models stay resident in the
+    registry, so they are not reloaded for every chunk. A failed model
+    feature fails its chunk, which is then not recorded as done, rather than
+    being loaded with "None" labels.
+
+    Arguments:
+        - model_configuration: the models of the features, the ones of
+          model_config by default
+        - feature_columns: the columns classified by the models
+        - pos_columns: the columns whose part of speech are counted
+        - cache, inference_pool, registry: as in
+          create_features_from_pretrained_models
+        - dedup_threshold: with a threshold, the near-duplicates of a chunk
+          are clustered and only the cluster representatives go through the
+          models, their labels are copied to the other members
+        - overlap: run the model features and the part of speech counts of
+          a chunk at the same time with the enrichment_scheduler, whose
+          pools are shut down by the close of the PipelineRunner or
+          RealtimeIngestor given the stages
+
+    Returns:
+        - list: the (name, function) of the stages, in order
+    """
+    if model_configuration is None:
+        model_configuration = default_model_configuration
+    deduplicated = dedup_threshold is not None
+    if overlap:
+        # The scheduler holds its pools until the runner closes its stages
+        enrich = enrichment_scheduler(model_configuration, feature_columns, pos_columns,
+                                      cache, inference_pool, registry, deduplicated)
+    else:
+        nlp = load_spacy_pipeline()
+        model_features = functools.partial(create_features_from_pretrained_models,
+                                           model_configuration, columns=feature_columns,
+                                           cache=cache, inference_pool=inference_pool,
+                                           registry=registry, raise_errors=True)
+        if deduplicated:
+            model_features = functools.partial(enrich_cluster_representatives,
+                                               enrich=model_features)
+
+        def enrich(df):
+            # The part of speech counts depend on the exact text, they are
+            # counted on every article even when the labels are deduplicated
+            return retrieve_counts_on_part_of_speech(model_features(df), pos_columns, nlp=nlp)
+
+    if not deduplicated:
+        return [("clean", clean_historical_news), ("enrich", enrich)]
+    return [
+        ("clean", clean_historical_news),
+        ("deduplicate", lambda df: assign_duplicate_clusters(df, threshold=dedup_threshold)),
+        ("enrich", enrich),
+    ]
+
+
+def sqlite_sink(db_name: str = "newsdb"):
+    """ Build a sink upserting every chunk into the SQLite database
+
+    Arguments:
+        - db_name: the name of the database, without the .db suffix
+
+    Returns:
+        - function: the sink, raising when a chunk could not be loaded so it
+          is not recorded as done
+    """
+    def load(df):
+        if not create_and_insert_to_db(df, db_name=db_name, mode="upsert"):
+            raise RuntimeError(f"The chunk could not be loaded into {db_name}.db")
+    return load
+
+
+def fetch_by_category(news_api, categories: list, **kwargs):
+    """ Fetch the historical articles one category at a time
+
+    Arguments:
+        - news_api: a WorldNewsAPI
+        - categories: the categories to fetch
+        - kwargs: the other arguments of retrieve_historical_data
+
+    Returns:
+        - generator: a DataFrame of articles per category
+    """
+    for category in categories:
+        yield news_api.retrieve_historical_data(categories=[category], **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--staging", required=True, help="directory of the staging dataset")
+    parser.add_argument("--db", default="newsdb", help="SQLite database, without .db")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--max-pending-chunks", type=int, default=2)
+    parser.add_argument("--progress", default="pipeline_progress.json")
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    parser.add_argument("--dedup-threshold", type=float,
+                        help="Jaccard similarity of the near-duplicates enriched once")
+    parser.add_argument("--overlap", action="store_true",
+                        help="run the model features and part of speech counts concurrently")
+    arguments = parser.parse_args()
+
+    source = iter_staging(arguments.staging, batch_size=arguments.chunk_size,
+                          start_date=arguments.start_date, end_date=arguments.end_date)
+    with PipelineRunner(news_pipeline_stages(dedup_threshold=arguments.dedup_threshold,
+                                             overlap=arguments.overlap),
+                        sqlite_sink(arguments.db),
+                        chunk_size=arguments.chunk_size,
+                        max_pending_chunks=arguments.max_pending_chunks,
+                        progress=ChunkProgress(arguments.progress)) as runner:
+        print(runner.run(source))
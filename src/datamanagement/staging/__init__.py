@@ -0,0 +1 @@
+from .parquet_store import STAGING_DIR, iter_staging, open_staging, read_staging, write_staging
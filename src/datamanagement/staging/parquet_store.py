@@ -0,0 +1,200 @@
+""" A Parquet staging layer between the pipeline stages.
+
+The articles are written with pyarrow into a dataset partitioned by the
+publish date and the source api, with a fixed schema: real UTC timestamps,
+strings for the texts and model labels and native map<string, int64>
+columns for the _pos_counts and _org_counts dicts, so nothing is stringified
+between the stages. Readers project the columns they need and the date and
+source filters are pushed down to the partitions.
+"""
+import datetime
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# The staging dataset written by the fetchers, whatever the working directory
+STAGING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "data", "staging")
+
+PARTITION_COLUMNS = ["publish_date", "source_api"]
+
+ARTICLE_FIELDS = [
+    pa.field("source_id", pa.string()),
+    pa.field("source_name", pa.string()),
+    pa.field("author_name", pa.string()),
+    pa.field("article_title", pa.string()),
+    pa.field("article_description", pa.string()),
+    pa.field("article_urlToImage", pa.string()),
+    pa.field("article_publishedAt", pa.timestamp("ns", tz="UTC")),
+    pa.field("article_content", pa.string()),
+    pa.field("article_category", pa.string()),
+    pa.field("article_sentiment", pa.float64()),
+    pa.field("duplicate_cluster_id", pa.string()),
+    pa.field("is_cluster_representative", pa.bool_()),
+]
+
+COUNTS_TYPE = pa.map_(pa.string(), pa.int64())
+
+PARTITIONING = ds.partitioning(
+    pa.schema([pa.field("publish_date", pa.string()), pa.field("source_api", pa.string())]),
+    flavor="hive")
+
+
+def build_schema(columns: list) -> pa.Schema:
+    """ Build the staging schema of the given columns
+
+    The article columns keep their fixed type, the _pos_counts and
+    _org_counts columns are maps and any other column (the model labels)
+    is a string.
+
+    Arguments:
+        - columns: the columns of the DataFrame to stage
+
+    Returns:
+        - pa.Schema: the schema of the staged columns
+    """
+    article_fields = {field.name: field for field in ARTICLE_FIELDS}
+    fields = []
+    for column in columns:
+        if column in article_fields:
+            fields.append(article_fields[column])
+        elif column.endswith("_pos_counts") or column.endswith("_org_counts"):
+            fields.append(pa.field(column, COUNTS_TYPE))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _to_arrow_column(series: pd.Series, field: pa.Field) -> pa.Array:
+    """ Convert a column into an arrow array of the type of its field """
+    if pa.types.is_timestamp(field.type):
+        return pa.array(pd.to_datetime(series, errors="coerce", utc=True), type=field.type)
+    if pa.types.is_map(field.type):
+        return pa.array([value if isinstance(value, dict) else None for value in series],
+                        type=field.type)
+    if pa.types.is_boolean(field.type):
+        return pa.array(series.astype(bool), type=field.type)
+    if pa.types.is_floating(field.type):
+        return pa.array(pd.to_numeric(series, errors="coerce"), type=field.type)
+    return pa.array([None if pd.isna(value) else str(value) for value in series],
+                    type=field.type)
+
+
+def write_staging(df: pd.DataFrame, root: str, source_api: str) -> pa.Table:
+    """ Append the DataFrame to the staging dataset
+
+    Arguments:
+        - df: a pandas DataFrame with the article_publishedAt column
+        - root: the directory of the staging dataset
+        - source_api: the api the articles come from, e.g. "worldnewsapi"
+
+    Returns:
+        - pa.Table: the table written, with its partition columns
+    """
+    columns = [column for column in df.columns if column not in PARTITION_COLUMNS]
+    schema = build_schema(columns)
+    arrays = [_to_arrow_column(df[field.name], field) for field in schema]
+    published_at = arrays[schema.get_field_index("article_publishedAt")]
+    publish_date = pa.array([None if value is None else value.strftime("%Y-%m-%d")
+                             for value in published_at.to_pylist()], type=pa.string())
+    table = pa.Table.from_arrays(
+        arrays + [publish_date, pa.array([source_api] * len(df), type=pa.string())],
+        schema=schema.append(pa.field("publish_date", pa.string()))
+                     .append(pa.field("source_api", pa.string())))
+    # Every write adds new files, the existing partitions are kept
+    ds.write_dataset(table, root, format="parquet", partitioning=PARTITIONING,
+                     basename_template=f"part-{uuid.uuid4()}-{{i}}.parquet",
+                     existing_data_behavior="overwrite_or_ignore")
+    return table
+
+
+def open_staging(root: str) -> ds.Dataset:
+    """ Open the staging dataset with the union of the columns of its files
+
+    The sources stage different columns, e.g. only the worldnewsapi
+    articles have an article_category, and a dataset takes the schema of
+    its first file when none is given, which would drop the columns of the
+    other files. The columns a file does not have are read as nulls.
+
+    Arguments:
+        - root: the directory of the staging dataset
+
+    Returns:
+        - ds.Dataset: the dataset, partitioned on PARTITION_COLUMNS
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if not schemas:
+        return dataset
+    schema = pa.unify_schemas(schemas)
+    for field in PARTITIONING.schema:
+        if field.name not in schema.names:
+            schema = schema.append(field)
+    return ds.dataset(root, schema=schema, format="parquet", partitioning=PARTITIONING)
+
+
+def read_staging(root: str, columns: list = None, start_date=None, end_date=None,
+                 source_api: str = None) -> pd.DataFrame:
+    """ Read the staged articles into a DataFrame
+
+    Arguments:
+        - root: the directory of the staging dataset
+        - columns: the columns to read, all the columns by default
+        - start_date: the first publish date to read, inclusive
+        - end_date: the last publish date to read, inclusive
+        - source_api: the api of the articles to read, all by default
+
+    Returns:
+        - pd.DataFrame: the articles, with the counts as dicts
+    """
+    dataset = open_staging(root)
+    table = dataset.to_table(columns=columns,
+                             filter=_staging_filter(start_date, end_date, source_api))
+    return table.to_pandas(maps_as_pydicts="strict")
+
+
+def iter_staging(root: str, batch_size: int = 10000, columns: list = None,
+                 start_date=None, end_date=None, source_api: str = None):
+    """ Read the staged articles as a stream of DataFrames
+
+    Only one batch of at most batch_size rows is in memory at a time.
+
+    Arguments:
+        - root: the directory of the staging dataset
+        - batch_size: the maximum number of rows per DataFrame
+        - columns, start_date, end_date, source_api: as in read_staging
+
+    Returns:
+        - generator: the articles as DataFrames, with the counts as dicts
+    """
+    dataset = open_staging(root)
+    batches = dataset.to_batches(columns=columns, batch_size=batch_size,
+                                 filter=_staging_filter(start_date, end_date, source_api))
+    for record_batch in batches:
+        if record_batch.num_rows:
+            yield record_batch.to_pandas(maps_as_pydicts="strict")
+
+
+def _staging_filter(start_date, end_date, source_api):
+    """ Build the partition filter of the dates and source api, None if none """
+    expression = None
+    filters = []
+    if start_date is not None:
+        filters.append(ds.field("publish_date") >= _format_date(start_date))
+    if end_date is not None:
+        filters.append(ds.field("publish_date") <= _format_date(end_date))
+    if source_api is not None:
+        filters.append(ds.field("source_api") == source_api)
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _format_date(value) -> str:
+    """ Format a date as the YYYY-MM-DD of the publish_date partitions """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The package is run from the src directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+
+class CountingPool:
+    """ Stands for a CPUInferencePool, labelling the texts by length """
+
+    def __init__(self):
+        self.n_texts = 0
+
+    def classify(self, key, texts):
+        self.n_texts += len(texts)
+        return [f"LABEL_{len(text)}" for text in texts]
+
+
+@pytest.fixture
+def counting_pool():
+    return CountingPool()
+
+
+@pytest.fixture
+def length_model_configuration():
+    return {"length": {"task": "text-classification", "model": "not-downloaded"}}
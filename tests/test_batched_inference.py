@@ -0,0 +1,45 @@
+from datamanagement.datapreprocessing.data_transforming import (
+    classify_texts, retrieve_labels_in_batches, retrieve_model_response)
+
+TEXTS = ["a much longer headline about the storm", "short", None,
+         "a medium headline", "", "short", "the longest headline of them all, by far"]
+
+
+class StubPipeline:
+    """ Stands for a text-classification pipeline, labelling the texts by
+    their number of words and recording the batches it is given """
+
+    def __init__(self):
+        self.batches = []
+
+    @staticmethod
+    def _classify(text):
+        return {"label": f"LABEL_{len(text.split())}", "score": 1.0}
+
+    def __call__(self, texts, batch_size=None):
+        if isinstance(texts, str):
+            return [self._classify(texts)]
+        self.batches.append(list(texts))
+        return [self._classify(text) for text in texts]
+
+
+def test_batched_labels_match_the_per_row_labels():
+    pipe = StubPipeline()
+    per_row = [retrieve_model_response(pipe, text) for text in TEXTS]
+
+    for batch_size in (1, 2, 3, len(TEXTS), 100):
+        assert retrieve_labels_in_batches(pipe, TEXTS, batch_size) == per_row
+        assert classify_texts(pipe, TEXTS, batch_size) == per_row
+    assert classify_texts(pipe, TEXTS) == per_row
+
+
+def test_batches_are_sorted_on_length_and_restored_in_order():
+    pipe = StubPipeline()
+    labels = retrieve_labels_in_batches(pipe, TEXTS, batch_size=3)
+
+    texts = [text for batch in pipe.batches for text in batch]
+    assert [len(text) for text in texts] == sorted(len(text) for text in texts)
+    assert [len(batch) for batch in pipe.batches] == [3, 3, 1]
+    assert labels[0] == "LABEL_7"
+    assert labels[2] == "LABEL_0"
+    assert labels[-1] == "LABEL_8"
@@ -0,0 +1,80 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from datamanagement.benchmarks.stub_news_server import StubNewsServer
+from datamanagement.datafetch.news.WorldNewsApi import HISTORICAL_QUERY, WorldNewsAPI
+from datamanagement.datafetch.news.checkpoint_store import CheckpointStore
+from datamanagement.datafetch.news.fetch_engine import FetchEngine
+
+
+def articles(n_articles, first_day=1):
+    start = datetime.datetime(2024, 10, first_day)
+    return pd.DataFrame({
+        "source_id": [f"{first_day}-{index}" for index in range(n_articles)],
+        "article_title": [f"Article {first_day}-{index}" for index in range(n_articles)],
+        "article_publishedAt": [(start + datetime.timedelta(minutes=index))
+                                .strftime("%Y-%m-%d %H:%M:%S") for index in range(n_articles)],
+    })
+
+
+@pytest.fixture
+def stub():
+    with StubNewsServer(articles(250), filter_dates=True) as stub:
+        yield stub
+
+
+def fetch(stub, store, **kwargs):
+    news_api = WorldNewsAPI(base_url=stub.url, fetch_engine=FetchEngine(**kwargs))
+    try:
+        return news_api.retrieve_historical_data(start_date="2024-10-01", end_date="2024-11-05",
+                                                 checkpoint_store=store)
+    finally:
+        news_api.fetch_engine.close()
+
+
+def test_a_backfill_of_an_earlier_window_starts_at_its_beginning(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.json"))
+    store.save("politics", HISTORICAL_QUERY, "2024-10-05", "2024-11-05", 300,
+               "2024-10-20 10:00:00", complete=True)
+
+    assert store.resume_point("politics", HISTORICAL_QUERY, "2024-10-01", "2024-11-05") \
+        == ("2024-10-01", 0)
+    assert store.resume_point("politics", HISTORICAL_QUERY, "2024-10-06", "2024-11-05") \
+        == ("2024-10-20 10:00:00", 0)
+
+
+def test_the_progress_of_articles_not_stored_is_not_kept(stub, tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    store = CheckpointStore(path)
+    assert fetch(stub, store).shape[0] == 250
+    # The articles could not be staged, e.g. the process died
+    store.discard()
+
+    assert fetch(stub, CheckpointStore(path)).shape[0] == 250
+
+
+def test_an_interrupted_fetch_resumes_from_its_offset(stub, tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    store = CheckpointStore(path)
+    # The quota runs out after the first page
+    stub.quota = 1
+    assert fetch(stub, store, min_quota=2).shape[0] == 100
+    store.commit()
+
+    stub.quota = 1_000_000
+    resumed = fetch(stub, CheckpointStore(path))
+    assert resumed["source_id"].tolist() == [f"1-{index}" for index in range(100, 250)]
+
+
+def test_a_complete_fetch_resumes_from_the_watermark(stub, tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    store = CheckpointStore(path)
+    assert fetch(stub, store).shape[0] == 250
+    store.commit()
+
+    stub.add_articles(articles(30, first_day=3))
+    resumed = fetch(stub, CheckpointStore(path))
+    # The articles published from the latest one ingested
+    assert resumed["source_id"].tolist() == ["1-249"] + [f"3-{index}" for index in range(30)]
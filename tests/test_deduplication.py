@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from datamanagement.datapreprocessing.deduplication import (
+    assign_duplicate_clusters, enrich_cluster_representatives)
+from datamanagement.pipeline.stages import enrichment_scheduler
+
+CONTENT = " ".join(f"word{index}" for index in range(200))
+
+
+@pytest.fixture
+def articles():
+    # The first two articles are the same wire story under two headlines
+    df = pd.DataFrame({
+        "article_title": ["Storm hits the coast", "Storm hits the coast, updated", "Elections"],
+        "article_description": ["A storm", "A storm", "The elections"],
+        "article_content": [CONTENT, CONTENT, "Votes were counted in the capital"],
+    })
+    return assign_duplicate_clusters(df)
+
+
+def test_labels_are_generated_for_the_representatives_only(articles, counting_pool,
+                                                           length_model_configuration):
+    with enrichment_scheduler(length_model_configuration, ["article_title"], [],
+                              inference_pool=counting_pool, deduplicated=True) as scheduler:
+        enriched = scheduler.run(articles)
+
+    assert articles["duplicate_cluster_id"].nunique() == 2
+    assert counting_pool.n_texts == 2
+    # The member gets the label of its representative
+    assert enriched["article_title_length"].tolist() == ["LABEL_20", "LABEL_20", "LABEL_9"]
+
+
+def test_text_counts_are_not_copied_between_members(articles):
+    def enrich(df):
+        df["article_title_pos_counts"] = [{"NOUN": len(text.split())}
+                                          for text in df["article_title"]]
+        return df
+
+    with pytest.raises(ValueError, match="article_title_pos_counts"):
+        enrich_cluster_representatives(articles, enrich)
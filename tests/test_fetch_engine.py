@@ -0,0 +1,89 @@
+import time
+
+import pandas as pd
+import pytest
+
+from datamanagement.benchmarks.stub_news_server import StubNewsServer
+from datamanagement.datafetch.news.NewsOrgApi import NewsORGAPI
+from datamanagement.datafetch.news.fetch_engine import FetchEngine, QuotaExhausted
+
+ARTICLES = pd.DataFrame({
+    "source_name": [f"source {index}" for index in range(10)],
+    "article_title": [f"Article {index}" for index in range(10)],
+    "article_publishedAt": ["2024-10-01 10:00:00"] * 10,
+})
+
+
+@pytest.fixture
+def stub():
+    with StubNewsServer(ARTICLES) as stub:
+        yield stub
+
+
+@pytest.fixture
+def engine_factory():
+    engines = []
+
+    def create(**kwargs):
+        engines.append(FetchEngine(**kwargs))
+        return engines[-1]
+    yield create
+    for engine in engines:
+        engine.close()
+
+
+def test_throttled_requests_wait_for_retry_after(stub, engine_factory):
+    engine = engine_factory(backoff_factor=10)
+    stub.fail_next(2, status=429, retry_after=0.2)
+
+    started = time.monotonic()
+    response = engine.get(f"{stub.url}/top-news")
+    assert response.status_code == 200
+    # Retry-After has precedence over the backoff of 10 and 20 seconds
+    assert 0.4 <= time.monotonic() - started < 5
+    assert stub.n_requests == engine.n_requests == 3
+
+
+def test_failed_requests_back_off_exponentially(stub, engine_factory):
+    engine = engine_factory(backoff_factor=0.1, max_retries=2)
+    stub.fail_next(3, status=503)
+
+    started = time.monotonic()
+    response = engine.get(f"{stub.url}/top-news")
+    # The last failed response is returned once the retries are used up
+    assert response.status_code == 503
+    assert time.monotonic() - started >= 0.1 + 0.2
+    assert stub.n_requests == 3
+
+
+def test_no_request_is_sent_once_the_quota_runs_out(stub, engine_factory):
+    engine = engine_factory(min_quota=2)
+    stub.quota = 1
+
+    assert engine.get(f"{stub.url}/top-news").status_code == 200
+    assert engine.quota_left == 1
+    with pytest.raises(QuotaExhausted):
+        engine.get(f"{stub.url}/top-news")
+    assert engine.get_many([{"url": f"{stub.url}/top-news"}] * 3) == [None] * 3
+    assert stub.n_requests == 1
+
+
+def test_concurrent_responses_keep_the_order_of_the_requests(stub, engine_factory):
+    engine = engine_factory(max_workers=8)
+    stub.latency = 0.01
+    offsets = list(range(20))[::-1]
+
+    responses = engine.get_many([{"url": f"{stub.url}/search-news",
+                                  "params": {"offset": offset, "number": 1}}
+                                 for offset in offsets])
+    assert [response.json()["offset"] for response in responses] == offsets
+
+
+def test_newsapi_skips_the_failed_responses(stub, engine_factory):
+    news_api = NewsORGAPI(base_url=stub.url,
+                          fetch_engine=engine_factory(max_retries=0))
+    stub.fail_next(1, status=500)
+
+    df = news_api.retrieve_real_time_data(categories=["general"])
+    assert df.empty
+    assert news_api.retrieve_real_time_data(categories=["general"]).shape[0] == 10
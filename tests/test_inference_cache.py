@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from datamanagement.datapreprocessing.inference_cache import InferenceCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = InferenceCache(str(tmp_path / "cache.db"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def n_rows(cache):
+    return cache.conn.execute("SELECT COUNT(*) FROM ModelLabel").fetchone()[0]
+
+
+def test_hits_and_misses_are_counted(cache):
+    cache.put_many("model", "main", ["a", "b"], ["LABEL_0", "LABEL_1"])
+
+    # Whitespace differences hit the same label
+    assert cache.get_many("model", "main", ["a", " b ", "c"]) == ["LABEL_0", "LABEL_1", None]
+    assert cache.get_many("model", "other-revision", ["a"]) == [None]
+    statistics = cache.statistics()
+    assert (statistics["hits"], statistics["misses"], statistics["entries"]) == (2, 2, 2)
+    assert statistics["hit_rate"] == 0.5
+
+
+def test_the_least_recently_used_labels_are_evicted(cache):
+    for text in ["a", "b", "c"]:
+        cache.put_many("model", "main", [text], [f"label {text}"])
+        time.sleep(0.01)
+    # Reading "a" makes "b" the least recently used label
+    cache.get_many("model", "main", ["a"])
+    time.sleep(0.01)
+    # A label replaced is not counted twice
+    cache.put_many("model", "main", ["c", "d"], ["new label c", "label d"])
+
+    assert cache.get_many("model", "main", ["a", "b", "c", "d"]) == \
+        ["label a", None, "new label c", "label d"]
+    assert cache.statistics()["entries"] == n_rows(cache) == 3
+
+
+def test_the_labels_of_a_replaced_model_are_invalidated(cache):
+    cache.register_model("title_sentiment", "model-a")
+    cache.register_model("description_sentiment", "model-a")
+    cache.put_many("model-a", "main", ["a"], ["LABEL_0"])
+
+    # Still used by the description
+    cache.register_model("title_sentiment", "model-b")
+    assert cache.get_many("model-a", "main", ["a"]) == ["LABEL_0"]
+
+    cache.register_model("description_sentiment", "model-b")
+    assert cache.get_many("model-a", "main", ["a"]) == [None]
+    assert cache.statistics()["entries"] == n_rows(cache) == 0
+
+
+def test_the_labels_are_counted_when_the_cache_is_reopened(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = InferenceCache(path)
+    cache.put_many("model", "main", ["a", "b"], ["LABEL_0", "LABEL_1"])
+    cache.close()
+
+    reopened = InferenceCache(path)
+    assert reopened.statistics()["entries"] == 2
+    reopened.close()
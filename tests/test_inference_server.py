@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from datamanagement.datapreprocessing.data_transforming import create_features_from_pretrained_models
+from datamanagement.datapreprocessing.inference_server import InferenceClient, InferenceServer
+
+MODEL_CONFIGURATION = {"length": {"task": "text-classification", "model": "not-downloaded",
+                                  "device": 0, "batch_size": 8}}
+
+
+def classify_by_length(key, texts):
+    return [f"LABEL_{len(text or '')}" for text in texts]
+
+
+@pytest.fixture
+def client():
+    server = InferenceServer(MODEL_CONFIGURATION, max_latency_ms=1, classify=classify_by_length)
+    host, port = server.start_in_thread()
+    with InferenceClient(host=host, port=port) as client:
+        yield client
+    server.stop()
+
+
+def test_features_from_the_server_need_no_local_model(client):
+    df = pd.DataFrame({"article_title": ["a", "bb", "a", None]})
+
+    df = create_features_from_pretrained_models(MODEL_CONFIGURATION, df, ["article_title"],
+                                                inference_pool=client)
+
+    assert df["article_title_length"].tolist() == ["LABEL_1", "LABEL_2", "LABEL_1", "LABEL_0"]
+
+
+def test_a_failing_feature_keeps_none_labels(client):
+    df = pd.DataFrame({"article_title": ["a"]})
+    model_configuration = {"missing": {"model": "m"}, **MODEL_CONFIGURATION}
+
+    df = create_features_from_pretrained_models(model_configuration, df, ["article_title"],
+                                                inference_pool=client)
+    # The other features are still generated
+    assert df["article_title_missing"].tolist() == ["None"]
+    assert df["article_title_length"].tolist() == ["LABEL_1"]
+
+
+def test_a_failing_feature_fails_the_chunk(client):
+    df = pd.DataFrame({"article_title": ["a"]})
+
+    with pytest.raises(RuntimeError, match="Unknown model"):
+        create_features_from_pretrained_models({"missing": {"model": "m"}}, df,
+                                               ["article_title"], inference_pool=client,
+                                               raise_errors=True)
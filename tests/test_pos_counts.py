@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from datamanagement.benchmarks.pipeline_benchmark import synthetic_pos_counts
+from datamanagement.benchmarks.synthetic_corpus import generate_corpus
+from datamanagement.database.db_load import UPOS_TAGS, create_and_insert_to_db
+
+
+@pytest.fixture
+def corpus():
+    corpus = synthetic_pos_counts(generate_corpus(20, seed=0, duplicate_rate=0.0))
+    corpus["article_title_pos_counts"] = [{"NOUN": 2}] * corpus.shape[0]
+    return corpus
+
+
+def title_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('''SELECT DISTINCT noun_count, verb_count
+                               FROM DimArticleTitleCounts''').fetchall()
+    finally:
+        conn.close()
+
+
+def test_an_absent_tag_is_null(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    assert create_and_insert_to_db(corpus, db_name=db_name, mode="upsert")
+
+    assert title_counts(f"{db_name}.db") == [(2, None)]
+
+
+def test_the_zero_counts_of_an_older_database_become_null(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    assert create_and_insert_to_db(corpus.copy(), db_name=db_name, mode="upsert")
+    # The tag columns of the previous loads were NOT NULL DEFAULT 0
+    conn = sqlite3.connect(f"{db_name}.db")
+    tags = ", ".join(f"{tag} INTEGER NOT NULL DEFAULT 0" for tag in UPOS_TAGS)
+    conn.executescript(f'''
+        CREATE TABLE TextPosCountsLegacy (text_id TEXT PRIMARY KEY, {tags},
+                                          change_seq INTEGER NOT NULL DEFAULT 0);
+        INSERT INTO TextPosCountsLegacy (text_id, NOUN) SELECT text_id, NOUN FROM TextPosCounts;
+        DROP VIEW DimArticleTitleCounts;
+        DROP VIEW DimArticleDescriptionCounts;
+        DROP VIEW DimArticleContentCounts;
+        DROP TABLE TextPosCounts;
+        ALTER TABLE TextPosCountsLegacy RENAME TO TextPosCounts;
+    ''')
+    assert conn.execute("SELECT DISTINCT VERB FROM TextPosCounts").fetchall() == [(0,)]
+    conn.close()
+
+    assert create_and_insert_to_db(corpus.iloc[:1].copy(), db_name=db_name, mode="upsert")
+    assert title_counts(f"{db_name}.db") == [(2, None)]
+    conn = sqlite3.connect(f"{db_name}.db")
+    # The rebuilt rows are exported again
+    assert conn.execute("SELECT DISTINCT change_seq FROM TextPosCounts").fetchall() == [(2,)]
+    conn.close()
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+from datamanagement.benchmarks.pipeline_benchmark import synthetic_pos_counts
+from datamanagement.benchmarks.synthetic_corpus import generate_corpus
+from datamanagement.database.db_load import create_and_insert_to_db
+from datamanagement.database.queries import articles_in_time_range, explain_articles_in_time_range
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return synthetic_pos_counts(generate_corpus(2000, seed=0, duplicate_rate=0.0))
+
+
+def uses_published_at_index(conn):
+    plan = explain_articles_in_time_range(conn, "2024-10-01", "2024-10-02")
+    return any("idx_dimarticle_publishedat" in line for line in plan)
+
+
+def test_the_time_range_query_searches_the_publish_time_index(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    assert create_and_insert_to_db(corpus.copy(), db_name=db_name, mode="replace")
+
+    with sqlite3.connect(f"{db_name}.db") as conn:
+        assert uses_published_at_index(conn)
+        start = corpus["article_publishedAt"].min()
+        assert articles_in_time_range(conn, start, "9999-12-31").shape[0] == corpus.shape[0]
+
+
+def test_upserts_keep_the_index_without_a_full_analyze(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    for start in range(0, corpus.shape[0], 500):
+        chunk = corpus.iloc[start:start + 500].copy()
+        assert create_and_insert_to_db(chunk, db_name=db_name, mode="upsert")
+
+    with sqlite3.connect(f"{db_name}.db") as conn:
+        assert uses_published_at_index(conn)
@@ -0,0 +1,50 @@
+import time
+
+import pandas as pd
+
+from datamanagement.pipeline.realtime import RealtimeIngestor, SeenArticles
+
+ARTICLES = pd.DataFrame({
+    "source_name": ["wire", "wire", "daily"],
+    "article_title": ["Storm", "Elections", "Storm"],
+    "article_publishedAt": ["2024-01-01 10:00:00"] * 3,
+})
+
+
+def test_articles_are_seen_only_once_committed():
+    seen = SeenArticles()
+    keys = seen.article_keys(ARTICLES)
+
+    assert seen.filter_new(ARTICLES).shape[0] == 3
+    # In flight, the articles are not queued a second time
+    assert seen.filter_new(ARTICLES).empty
+    seen.release(keys[:1])
+    assert seen.filter_new(ARTICLES).shape[0] == 1
+    seen.mark_seen(keys)
+    assert seen.filter_new(ARTICLES).empty
+
+
+def test_a_failed_micro_batch_is_ingested_on_the_next_poll():
+    loaded = []
+
+    def sink(df):
+        if not loaded:
+            loaded.append(None)
+            raise RuntimeError("database is locked")
+        loaded.append(df)
+
+    def poller():
+        # The second poll waits for the first micro-batch to fail
+        deadline = time.monotonic() + 10
+        while ingestor.report()["polls"] and not ingestor.report()["failed_batches"] \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return ARTICLES.copy()
+
+    ingestor = RealtimeIngestor([poller], [("identity", lambda df: df)], sink,
+                                poll_interval=0)
+    report = ingestor.run(max_polls=3)
+
+    assert report["failed_batches"] == 1
+    assert report["rows_loaded"] == 3
+    assert pd.concat(loaded[1:])["article_title"].tolist() == ["Storm", "Elections", "Storm"]
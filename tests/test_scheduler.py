@@ -0,0 +1,41 @@
+import pandas as pd
+
+from datamanagement.benchmarks.synthetic_corpus import generate_corpus
+from datamanagement.datapreprocessing.inference_cache import InferenceCache
+from datamanagement.pipeline import PipelineRunner
+from datamanagement.pipeline.stages import enrichment_scheduler, news_pipeline_stages
+
+
+def test_overlapped_model_features_use_the_cache_from_the_torch_thread(
+        tmp_path, counting_pool, length_model_configuration):
+    cache = InferenceCache(str(tmp_path / "cache.db"))
+    df = pd.DataFrame({"article_title": ["a", "bb", "ccc", "a"]})
+    expected = ["LABEL_1", "LABEL_2", "LABEL_3", "LABEL_1"]
+
+    with enrichment_scheduler(length_model_configuration, ["article_title"], [],
+                              cache=cache, inference_pool=counting_pool) as scheduler:
+        first = scheduler.run(df)
+        second = scheduler.run(df)
+
+    assert first["article_title_length"].tolist() == expected
+    assert second["article_title_length"].tolist() == expected
+    # The second chunk is served from the cache filled by the first one
+    assert counting_pool.n_texts == 3
+    assert cache.statistics()["hits"] == 4
+    cache.close()
+
+
+def test_the_runner_shuts_the_overlapped_enrichment_down(counting_pool,
+                                                         length_model_configuration):
+    stages = news_pipeline_stages(length_model_configuration, feature_columns=["article_title"],
+                                  pos_columns=[], inference_pool=counting_pool, overlap=True)
+    scheduler = dict(stages)["enrich"]
+    chunks = []
+
+    with PipelineRunner(stages, chunks.append, chunk_size=10) as runner:
+        runner.run([generate_corpus(20, seed=0)])
+        # The pools are kept between the chunks
+        assert scheduler.executors
+
+    assert sum(chunk.shape[0] for chunk in chunks) > 0
+    assert scheduler.executors == {}
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from datamanagement.staging import iter_staging, read_staging, write_staging
+
+NEWSAPI_ARTICLES = pd.DataFrame({
+    "source_name": ["wire"],
+    "article_title": ["Storm"],
+    "article_description": ["A storm"],
+    "article_publishedAt": ["2024-01-01 10:00:00"],
+    "article_content": ["The storm hit the coast"],
+})
+
+WORLDNEWSAPI_ARTICLES = pd.DataFrame({
+    "source_name": ["daily"],
+    "article_title": ["Elections"],
+    "article_description": ["The elections"],
+    "article_publishedAt": ["2024-01-02 10:00:00"],
+    "article_content": ["Votes were counted"],
+    "article_category": ["politics"],
+    "article_title_pos_counts": [{"NOUN": 1}],
+})
+
+
+def test_the_columns_of_every_source_are_read(tmp_path):
+    root = str(tmp_path / "staging")
+    write_staging(NEWSAPI_ARTICLES, root, source_api="newsapi")
+    write_staging(WORLDNEWSAPI_ARTICLES, root, source_api="worldnewsapi")
+
+    articles = read_staging(root).sort_values("article_publishedAt", ignore_index=True)
+    assert articles["source_api"].tolist() == ["newsapi", "worldnewsapi"]
+    assert articles["article_category"].tolist() == [None, "politics"]
+    assert articles["article_title_pos_counts"].tolist() == [None, {"NOUN": 1}]
+
+    # Also when the filter selects the source written last only
+    articles = read_staging(root, start_date="2024-01-02")
+    assert articles["article_category"].tolist() == ["politics"]
+    batches = list(iter_staging(root, source_api="worldnewsapi"))
+    assert batches[0]["article_title_pos_counts"].tolist() == [{"NOUN": 1}]
@@ -0,0 +1,130 @@
+import pandas as pd
+import pytest
+
+from datamanagement.benchmarks.pipeline_benchmark import synthetic_pos_counts
+from datamanagement.benchmarks.synthetic_corpus import generate_corpus
+from datamanagement.database.db_load import create_and_insert_to_db
+from datamanagement.datawarehouse.data_load import BigQuerySink, ParquetSink, export_sqlite
+
+
+@pytest.fixture
+def corpus():
+    return synthetic_pos_counts(generate_corpus(200, seed=0, duplicate_rate=0.0))
+
+
+def exported(directory, table_name):
+    return pd.read_parquet(directory / table_name)
+
+
+def test_upserted_changes_are_merged_into_the_warehouse(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    sink = ParquetSink(str(tmp_path / "warehouse"))
+    corpus["article_urlToImage"] = "old"
+    assert create_and_insert_to_db(corpus.copy(), db_name=db_name, mode="upsert")
+    assert export_sqlite(f"{db_name}.db", sink)["DimArticle"] == 200
+
+    changed = corpus.iloc[:10].copy()
+    changed["article_urlToImage"] = "new"
+    assert create_and_insert_to_db(changed, db_name=db_name, mode="upsert")
+    n_rows = export_sqlite(f"{db_name}.db", sink)
+
+    # Only the changed articles are exported again
+    assert n_rows["DimArticle"] == 10
+    assert n_rows["DimArticleTitle"] == 0
+    dim_article = exported(tmp_path / "warehouse", "DimArticle")
+    assert dim_article.shape[0] == 200
+    assert dim_article["article_id"].is_unique
+    assert (dim_article["article_urlToImage"] == "new").sum() == 10
+
+
+def test_a_replace_load_refreshes_the_warehouse(tmp_path, corpus):
+    db_name = str(tmp_path / "news")
+    sink = ParquetSink(str(tmp_path / "warehouse"))
+    assert create_and_insert_to_db(corpus.iloc[:50].copy(), db_name=db_name, mode="replace")
+    export_sqlite(f"{db_name}.db", sink)
+
+    # The reload has more rows than the export saw, still none of them is stale
+    assert create_and_insert_to_db(corpus.copy(), db_name=db_name, mode="replace")
+    assert export_sqlite(f"{db_name}.db", sink)["DimArticle"] == 200
+
+    dim_article = exported(tmp_path / "warehouse", "DimArticle")
+    assert dim_article.shape[0] == 200
+    assert dim_article["article_id"].is_unique
+
+
+def test_a_merge_rewrites_only_the_parts_with_changed_keys(tmp_path):
+    sink = ParquetSink(str(tmp_path / "warehouse"))
+    sink.write("DimArticle", pd.DataFrame({"article_id": [1, 2], "title": ["a", "b"]}), replace=True)
+    sink.write("DimArticle", pd.DataFrame({"article_id": [3, 4], "title": ["c", "d"]}), replace=False)
+    table_directory = tmp_path / "warehouse" / "DimArticle"
+    parts = {path.name: path.read_bytes() for path in table_directory.iterdir()}
+
+    sink.merge("DimArticle", pd.DataFrame({"article_id": [2, 5], "title": ["B", "e"]}),
+               ["article_id"])
+
+    unchanged = [name for name, data in parts.items()
+                 if (table_directory / name).read_bytes() == data]
+    assert len(unchanged) == 1
+    dim_article = exported(tmp_path / "warehouse", "DimArticle").sort_values("article_id")
+    assert dim_article["title"].tolist() == ["a", "B", "c", "d", "e"]
+
+
+class FakeJob:
+    def result(self):
+        return self
+
+
+class FakeBigQueryClient:
+    """ Stands for a bigquery.Client, recording the jobs it is given """
+
+    def __init__(self):
+        self.loads = []
+        self.queries = []
+        self.deleted = []
+
+    def load_table_from_dataframe(self, df, table, job_config):
+        self.loads.append((table, job_config["write_disposition"], df.shape[0]))
+        return FakeJob()
+
+    def query(self, sql):
+        self.queries.append(sql)
+        return FakeJob()
+
+    def delete_table(self, table, not_found_ok=False):
+        self.deleted.append(table)
+
+
+def test_bigquery_replaces_then_merges_the_changed_rows(tmp_path, corpus):
+    client = FakeBigQueryClient()
+    sink = BigQuerySink("news", client=client,
+                        job_config_factory=lambda disposition: {"write_disposition": disposition})
+    db_name = str(tmp_path / "news")
+    assert create_and_insert_to_db(corpus.copy(), db_name=db_name, mode="upsert")
+    export_sqlite(f"{db_name}.db", sink, tables=["DimArticle"])
+    assert client.loads == [("news.DimArticle", "WRITE_TRUNCATE", 200)]
+
+    changed = corpus.iloc[:10].copy()
+    changed["article_urlToImage"] = "new"
+    assert create_and_insert_to_db(changed, db_name=db_name, mode="upsert")
+    export_sqlite(f"{db_name}.db", sink, tables=["DimArticle"])
+
+    staging_table, disposition, n_rows = client.loads[-1]
+    assert staging_table.startswith("news.DimArticle_merge_")
+    assert (disposition, n_rows) == ("WRITE_TRUNCATE", 10)
+    assert "MERGE `news.DimArticle` AS target" in client.queries[0]
+    assert "ON target.article_id = source.article_id" in client.queries[0]
+    assert client.deleted == [staging_table]
+
+
+def test_bigquery_drops_the_staging_table_of_a_failed_merge():
+    class FailingClient(FakeBigQueryClient):
+        def query(self, sql):
+            raise RuntimeError("quota exceeded")
+
+    client = FailingClient()
+    sink = BigQuerySink("news", client=client,
+                        job_config_factory=lambda disposition: {"write_disposition": disposition})
+    with pytest.raises(RuntimeError):
+        sink.merge("DimArticle", pd.DataFrame({"article_id": [1], "title": ["a"]}),
+                   ["article_id"])
+    assert client.deleted == [client.loads[0][0]]